@@ -1,25 +1,50 @@
+import time
+STARTED_AT = time.perf_counter()  # diambil sebelum impor lain agar waktu impor ikut terukur
+
 import asyncio
 import os
 import logging
-import sys
 from typing import Callable, Awaitable, Any, Dict
 from dotenv import load_dotenv
 
 from aiogram import Bot, Dispatcher
-from aiogram.fsm.storage.memory import MemoryStorage # <-- Impor baru
 from aiogram.types import TelegramObject
 from aiogram.enums import ParseMode
 from aiogram.client.default import DefaultBotProperties
 
 from modules.bot_handlers import router as main_router
 from modules.vision_handler import router as vision_router
-from modules.supabase_handler import init_supabase_client, get_user_language
+from modules.supabase_handler import get_user_language
+from modules.storage import init_storage
 from modules.translator import translator_instance
 from modules.group_handler import router as group_router # <-- PERUBAHAN: Impor baru
 from modules.inline_handler import router as inline_router
 from modules.membership_middleware import MembershipMiddleware # <-- PERUBAHAN 1: Impor baru
 from modules.image_generator import router as image_router # <-- PERUBAHAN 1: Impor baru
 from modules.business_handler import router as business_router # <-- Impor baru
+from modules.send_scheduler import send_scheduler
+from modules.webhook_server import run_webhook
+from modules.state_backend import get_state_backend
+from modules.log_shipper import log_shipper
+from modules.message_writer import message_writer
+from modules.summarizer import summarizer
+from modules.retention import retention_job
+from modules.request_context import deadline_scope, update_deadline, correlation_scope
+from modules.metrics import registry, start_metrics_server, UpdateMetricsMiddleware, TimedMiddleware
+from modules.answer_cache import answer_cache
+from modules.llm_scheduler import llm_scheduler
+from modules.circuit_breaker import model_breakers
+from modules.groq_handler import hedge_budget
+from modules.model_router import model_router
+from modules.coalescer import conversation_coalescer
+from modules.loop_monitor import loop_monitor
+from modules.usage_ledger import usage_ledger
+from modules.log_pipeline import log_pipeline
+from modules.startup import startup_timeline
+from modules.update_poller import update_poller
+
+startup_timeline.begin(STARTED_AT)
+startup_timeline.record("imports", time.perf_counter() - STARTED_AT)
 
 
 
@@ -45,29 +70,44 @@ class LanguageMiddleware:
         data["translator"] = translator_instance
         return await handler(event, data)
 
-async def main():
-    load_dotenv()
-    
-    bot_token = os.getenv("TELEGRAM_BOT_TOKEN")
-    if not bot_token:
-        logging.error("TELEGRAM_BOT_TOKEN not found in .env file. Bot cannot start.")
-        return
+class CorrelationMiddleware:
+    """Tags every log line written while handling an update with its update_id."""
 
-    supabase_client = init_supabase_client()
-    if not supabase_client:
-        logging.error("Failed to initialize Supabase client. Bot cannot start.")
-        return
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        with correlation_scope(f"upd-{event.update_id}"):
+            return await handler(event, data)
 
-    storage = MemoryStorage()
-    bot = Bot(token=bot_token, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+class DeadlineMiddleware:
+    """Starts the request deadline for every update, inherited by everything the handlers call."""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        with deadline_scope(update_deadline(event.event_type)):
+            return await handler(event, data)
+
+def create_dispatcher() -> Dispatcher:
+    # FSM disimpan di state backend bersama agar beberapa worker bisa berbagi token bot
+    storage = get_state_backend().fsm_storage()
     dp = Dispatcher(storage=storage)
+    dp.update.outer_middleware.register(CorrelationMiddleware())
+    dp.update.outer_middleware.register(UpdateMetricsMiddleware())
+    dp.update.outer_middleware.register(DeadlineMiddleware())
     
-    membership_checker = MembershipMiddleware()
+    membership_checker = TimedMiddleware("membership", MembershipMiddleware())
     dp.message.outer_middleware.register(membership_checker)
     dp.callback_query.outer_middleware.register(membership_checker)
 
 
-    dp.update.middleware.register(LanguageMiddleware())
+    dp.update.middleware.register(TimedMiddleware("language", LanguageMiddleware()))
     
     dp.include_router(main_router)
     dp.include_router(vision_router)
@@ -76,16 +116,83 @@ async def main():
     dp.include_router(image_router) # <-- PERUBAHAN 2: Daftarkan router gambar
     dp.include_router(business_router) # <-- Daftarkan router bisnis
 
+    # Layanan latar belakang yang hidup selama bot berjalan
+    dp.startup.register(loop_monitor.start)
+    dp.startup.register(log_shipper.start)
+    dp.startup.register(message_writer.start)
+    dp.startup.register(retention_job.start)
+    dp.startup.register(usage_ledger.start)
+    dp.startup.register(startup_timeline.start)  # terakhir: menandai bot siap, pemanasan berjalan di latar
+    dp.shutdown.register(startup_timeline.stop)
+    dp.shutdown.register(log_shipper.stop)
+    dp.shutdown.register(retention_job.stop)
+    dp.shutdown.register(summarizer.stop)
+    dp.shutdown.register(usage_ledger.stop)
+    dp.shutdown.register(message_writer.stop)
+    dp.shutdown.register(loop_monitor.stop)
+    return dp
+
+def register_stats_metrics():
+    """Exports the stats() of long-lived components on /metrics."""
+    registry.register_stats("send_scheduler", send_scheduler.stats)
+    registry.register_stats("answer_cache", answer_cache.stats)
+    registry.register_stats("log_shipper", log_shipper.stats)
+    registry.register_stats("message_writer", message_writer.stats)
+    registry.register_stats("llm_scheduler", llm_scheduler.stats)
+    registry.register_stats("llm_hedging", hedge_budget.stats)
+    registry.register_stats("model_router", lambda: {"decisions": model_router.stats()["decisions"]})
+    registry.register_stats("circuit_breaker", lambda: {
+        "fallbacks": model_breakers.stats()["fallbacks"],
+        "open": {model: int(state["state"] != "closed") for model, state in model_breakers.stats()["models"].items()},
+    })
+    registry.register_stats("coalescer", conversation_coalescer.stats)
+    registry.register_stats("event_loop", loop_monitor.stats)
+    registry.register_stats("summarizer", lambda: {"summaries_written": summarizer.summaries_written})
+    registry.register_stats("usage_ledger", usage_ledger.stats)
+    registry.register_stats("logging", log_pipeline.stats)
+    registry.register_stats("startup", startup_timeline.stats)
+    registry.register_stats("update_poller", update_poller.stats)
 
+async def main():
+    load_dotenv()
+    
+    bot_token = os.getenv("TELEGRAM_BOT_TOKEN")
+    if not bot_token:
+        logging.error("TELEGRAM_BOT_TOKEN not found in .env file. Bot cannot start.")
+        return
 
+    # STORAGE_BACKEND=supabase (default) atau sqlite
+    supabase_client = init_storage()
+    if not supabase_client:
+        logging.error("Failed to initialize storage backend. Bot cannot start.")
+        return
 
+    bot = Bot(token=bot_token, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+    bot.session.middleware(send_scheduler) # Semua kirim/edit/balas lewat penjadwal
+    dp = create_dispatcher()
 
-    await bot.delete_webhook(drop_pending_updates=True)
-    await dp.start_polling(bot, supabase=supabase_client)
+    register_stats_metrics()
+    metrics_runner = await start_metrics_server()
+    try:
+        # BOT_MODE=polling (default) atau webhook
+        bot_mode = os.getenv("BOT_MODE", "polling").strip().lower()
+        if bot_mode == "webhook":
+            await run_webhook(dp, bot, supabase=supabase_client)
+            return
+
+        # Melanjutkan dari journal update; update yang masuk selama restart tidak dibuang
+        await update_poller.run(dp, bot, supabase=supabase_client)
+    finally:
+        if metrics_runner:
+            await metrics_runner.cleanup()
+        await supabase_client.close()
 
 if __name__ == "__main__":
-    logging.basicConfig(level=logging.INFO, stream=sys.stdout)
+    # Semua log lewat antrean ke thread penulis agar stdout yang lambat tidak menahan event loop
+    log_pipeline.start()
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
-        print("Bot stopped manually.")
+        logging.info("Bot stopped manually.")
+    finally:
+        log_pipeline.stop()
@@ -0,0 +1,116 @@
+import hashlib
+import json
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from modules.state_backend import LocalStateBackend, get_state_backend
+from modules.metrics import CACHE_LOOKUPS
+
+# --- Konfigurasi Cache Jawaban ---
+ANSWER_CACHE_MAX_BYTES = int(os.getenv("ANSWER_CACHE_MAX_BYTES", 32 * 1024 * 1024))
+ANSWER_CACHE_TTL = int(os.getenv("ANSWER_CACHE_TTL", 600))
+
+# Mode pemakaian cache oleh get_groq_response
+CACHE_ALWAYS = "always"        # inline: jawaban dipakai ulang tanpa melihat riwayat
+CACHE_STATELESS = "stateless"  # chat pribadi: hanya jika belum ada riwayat percakapan
+
+_TRAILING_PUNCTUATION = re.compile(r"[\s?!.,;:]+$")
+
+def normalize_query(query: str) -> str:
+    """Collapses whitespace, ignores case and trailing punctuation."""
+    normalized = " ".join(query.split()).casefold()
+    return _TRAILING_PUNCTUATION.sub("", normalized)
+
+
+class AnswerCache:
+    """
+    LRU + TTL cache of LLM answers bounded by the total size of the stored
+    answers. Keys combine the normalized query, model, language and custom
+    prompt. When a shared state backend is configured it is used as a
+    second level so every worker benefits from the same answers.
+    """
+
+    def __init__(self, max_bytes: int, ttl: int):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(query: str, model: str, lang_code: str, custom_prompt: Optional[str] = None) -> str:
+        digest = hashlib.sha1(normalize_query(query).encode("utf-8"))
+        if custom_prompt:
+            digest.update(b"\x00" + custom_prompt.encode("utf-8"))
+        return f"{model}:{lang_code}:{digest.hexdigest()}"
+
+    def _shared_backend(self):
+        backend = get_state_backend()
+        return None if isinstance(backend, LocalStateBackend) else backend
+
+    def _remove(self, key: str):
+        _, size, _ = self._entries.pop(key)
+        self.current_bytes -= size
+
+    def _store_local(self, key: str, payload: str, expires_at: float):
+        size = len(payload.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (expires_at, size, payload)
+        self.current_bytes += size
+        while self.current_bytes > self.max_bytes:
+            oldest_key = next(iter(self._entries))
+            self._remove(oldest_key)
+            self.evictions += 1
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, _, payload = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                CACHE_LOOKUPS.inc(result="hit_local")
+                return json.loads(payload)
+            self._remove(key)
+
+        shared = self._shared_backend()
+        if shared:
+            payload = await shared.get(f"answer:{key}")
+            if payload:
+                self._store_local(key, payload, time.monotonic() + self.ttl)
+                self.hits += 1
+                CACHE_LOOKUPS.inc(result="hit_shared")
+                return json.loads(payload)
+
+        self.misses += 1
+        CACHE_LOOKUPS.inc(result="miss")
+        return None
+
+    async def set(self, key: str, value: Dict[str, Any]):
+        payload = json.dumps(value, ensure_ascii=False)
+        self._store_local(key, payload, time.monotonic() + self.ttl)
+        shared = self._shared_backend()
+        if shared:
+            await shared.set(f"answer:{key}", payload, ttl=self.ttl)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.current_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+        }
+
+answer_cache = AnswerCache(ANSWER_CACHE_MAX_BYTES, ANSWER_CACHE_TTL)
@@ -1,29 +1,39 @@
+import logging
+import math
 import os
 from datetime import datetime, timedelta
 import pytz
 
 from aiogram import Router, F
-from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, User
+from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, User, BufferedInputFile
 from aiogram.filters import CommandStart, Command, CommandObject
 from aiogram.utils.keyboard import InlineKeyboardBuilder
-from supabase import Client
+from modules.storage import Storage
 from modules.groq_handler import get_rag_response
 
 from modules.supabase_handler import (
     get_or_create_user, delete_user_messages,
     update_user_language, update_user_model, get_reasoning_text,
-    get_user_chat_info, get_user_model, get_user_prompt, update_user_prompt, delete_user_prompt, save_message
+    get_user_chat_info, get_user_model, get_user_prompt, update_user_prompt, delete_user_prompt
 )
 from modules.translator import Translator
 from modules.html_parser import process_telegram_html, escape_html
 from modules.core_logic import process_text_message
-from modules.utils import send_long_message, load_models
+from modules.coalescer import conversation_coalescer
+from modules.utils import send_long_message, load_models, is_admin, format_bytes
 from modules.limit_handler import check_and_handle_limit, increment_chat_count
+from modules.message_writer import message_writer
+from modules.summarizer import summarizer
+from modules.retention import retention_job
+from modules.profiler import profiler, ProfilerBusy, PROFILE_MAX_SECONDS, PROFILE_TOP_N
+from modules.usage_ledger import usage_ledger
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from supabase import Client
+from modules.storage import Storage
 from modules.groq_handler import get_rag_response # <-- Impor ini ditambahkan
 
+logger = logging.getLogger(__name__)
+
 
 
 
@@ -33,7 +43,7 @@ class PromptStates(StatesGroup):
     waiting_for_prompt = State()
 
 
-async def get_start_menu(user: User, supabase: Client, translator: Translator, lang_code: str):
+async def get_start_menu(user: User, supabase: Storage, translator: Translator, lang_code: str):
     await get_or_create_user(supabase, user.id, user.username or "N/A")
     
     start_text = translator.get_text("start_message", lang_code).format(username=escape_html(user.username or user.first_name))
@@ -48,23 +58,23 @@ async def get_start_menu(user: User, supabase: Client, translator: Translator, l
     return start_text, builder.as_markup()
 
 @router.message(CommandStart())
-async def handle_start(message: Message, supabase: Client, translator: Translator, lang_code: str):
+async def handle_start(message: Message, supabase: Storage, translator: Translator, lang_code: str):
     start_text, start_markup = await get_start_menu(message.from_user, supabase, translator, lang_code)
     await message.answer(start_text, reply_markup=start_markup)
 
 # --- HANDLER UNTUK TOMBOL-TOMBOL DARI MENU START ---
 @router.callback_query(F.data == "start_newchat")
-async def handle_start_newchat_callback(callback: CallbackQuery, supabase: Client, translator: Translator, lang_code: str):
+async def handle_start_newchat_callback(callback: CallbackQuery, supabase: Storage, translator: Translator, lang_code: str):
     await callback.answer()
     await handle_newchat(callback, supabase, translator, lang_code)
 
 @router.callback_query(F.data == "start_settings")
-async def handle_start_settings_callback(callback: CallbackQuery, supabase: Client, translator: Translator, lang_code: str):
+async def handle_start_settings_callback(callback: CallbackQuery, supabase: Storage, translator: Translator, lang_code: str):
     await callback.answer()
     await handle_settings(callback, supabase, translator, lang_code)
 
 @router.callback_query(F.data == "start_status")
-async def handle_start_status_callback(callback: CallbackQuery, supabase: Client, translator: Translator, lang_code: str):
+async def handle_start_status_callback(callback: CallbackQuery, supabase: Storage, translator: Translator, lang_code: str):
     await callback.answer()
     await handle_status(callback, supabase, translator, lang_code)
 
@@ -74,7 +84,7 @@ async def handle_start_lang_callback(callback: CallbackQuery, translator: Transl
     await handle_lang(callback, translator, lang_code)
 
 @router.callback_query(F.data == "back_to_start")
-async def handle_back_to_start_callback(callback: CallbackQuery, supabase: Client, translator: Translator, lang_code: str):
+async def handle_back_to_start_callback(callback: CallbackQuery, supabase: Storage, translator: Translator, lang_code: str):
     start_text, start_markup = await get_start_menu(callback.from_user, supabase, translator, lang_code)
     await callback.message.edit_text(start_text, reply_markup=start_markup)
     await callback.answer()
@@ -118,8 +128,10 @@ async def handle_help_category_callback(callback: CallbackQuery, translator: Tra
 
 # --- FUNGSI-FUNGSI UTAMA YANG TELAH DIPERBAIKI ---
 @router.message(Command("newchat"))
-async def handle_newchat(event: Message | CallbackQuery, supabase: Client, translator: Translator, lang_code: str):
+async def handle_newchat(event: Message | CallbackQuery, supabase: Storage, translator: Translator, lang_code: str):
     user_id = event.from_user.id
+    # delete_user_messages menghapus semua percakapan pengguna, jadi baris yang belum ditulis juga dibuang
+    await message_writer.discard_for(user_id, every_conversation=True)
     success = await delete_user_messages(supabase, user_id)
     response_text = translator.get_text("newchat_success" if success else "newchat_fail", lang_code)
     
@@ -129,7 +141,7 @@ async def handle_newchat(event: Message | CallbackQuery, supabase: Client, trans
         await event.message.edit_text(response_text)
 
 @router.message(Command("status", "info"))
-async def handle_status(event: Message | CallbackQuery, supabase: Client, translator: Translator, lang_code: str):
+async def handle_status(event: Message | CallbackQuery, supabase: Storage, translator: Translator, lang_code: str):
     user_id = event.from_user.id
     try: limit = int(os.environ.get("DAILY_CHAT_LIMIT", 20))
     except (ValueError, TypeError): limit = 20
@@ -164,7 +176,7 @@ async def handle_lang(event: Message | CallbackQuery, translator: Translator, la
         await event.message.edit_text(lang_text, reply_markup=builder.as_markup())
 
 @router.callback_query(F.data.startswith("lang_"))
-async def handle_lang_callback(callback: CallbackQuery, supabase: Client, translator: Translator):
+async def handle_lang_callback(callback: CallbackQuery, supabase: Storage, translator: Translator):
     new_lang_code, user_id = callback.data.split("_")[1], callback.from_user.id
     await update_user_language(supabase, user_id, new_lang_code)
     confirmation_message = translator.get_text(f"lang_updated_{new_lang_code}", new_lang_code)
@@ -175,7 +187,7 @@ async def handle_lang_callback(callback: CallbackQuery, supabase: Client, transl
     await callback.answer()
 
 @router.message(Command("settings"))
-async def handle_settings(event: Message | CallbackQuery, supabase: Client, translator: Translator, lang_code: str):
+async def handle_settings(event: Message | CallbackQuery, supabase: Storage, translator: Translator, lang_code: str):
     user_id = event.from_user.id
     active_model_id = await get_user_model(supabase, user_id)
     models = load_models()
@@ -195,7 +207,7 @@ async def handle_settings(event: Message | CallbackQuery, supabase: Client, tran
         await event.message.edit_text(settings_text, reply_markup=builder.as_markup())
 
 @router.callback_query(F.data == "show_prompt_menu")
-async def show_prompt_menu(callback: CallbackQuery, supabase: Client, translator: Translator, lang_code: str):
+async def show_prompt_menu(callback: CallbackQuery, supabase: Storage, translator: Translator, lang_code: str):
     user_id = callback.from_user.id
     custom_prompt = await get_user_prompt(supabase, user_id)
 
@@ -226,7 +238,7 @@ async def handle_set_prompt_request(callback: CallbackQuery, state: FSMContext,
     await callback.answer()
 
 @router.message(PromptStates.waiting_for_prompt)
-async def handle_new_prompt_message(message: Message, state: FSMContext, supabase: Client, translator: Translator, lang_code: str):
+async def handle_new_prompt_message(message: Message, state: FSMContext, supabase: Storage, translator: Translator, lang_code: str):
     await state.clear()
     await update_user_prompt(supabase, message.from_user.id, message.text)
     
@@ -236,7 +248,7 @@ async def handle_new_prompt_message(message: Message, state: FSMContext, supabas
     await message.answer(confirmation_text, reply_markup=builder.as_markup())
 
 @router.callback_query(F.data == "delete_prompt")
-async def handle_delete_prompt(callback: CallbackQuery, supabase: Client, translator: Translator, lang_code: str):
+async def handle_delete_prompt(callback: CallbackQuery, supabase: Storage, translator: Translator, lang_code: str):
     success = await delete_user_prompt(supabase, callback.from_user.id)
     if success:
         await callback.answer(translator.get_text("prompt_deleted_success", lang_code), show_alert=True)
@@ -259,7 +271,7 @@ async def show_models_callback(callback: CallbackQuery, translator: Translator,
     await callback.answer()
 
 @router.callback_query(F.data.startswith("setmodel_"))
-async def set_model_callback(callback: CallbackQuery, supabase: Client, translator: Translator, lang_code: str):
+async def set_model_callback(callback: CallbackQuery, supabase: Storage, translator: Translator, lang_code: str):
     model_value, user_id = callback.data.split("_")[1], callback.from_user.id
     await update_user_model(supabase, user_id, model_value)
     models = load_models()
@@ -273,7 +285,7 @@ async def set_model_callback(callback: CallbackQuery, supabase: Client, translat
 
 
 @router.callback_query(F.data.startswith("show_reasoning_"))
-async def show_reasoning_callback(callback: CallbackQuery, supabase: Client, translator: Translator, lang_code: str):
+async def show_reasoning_callback(callback: CallbackQuery, supabase: Storage, translator: Translator, lang_code: str):
     message_id = callback.data.split("_")[2]
     reasoning_text = await get_reasoning_text(supabase, message_id)
     
@@ -295,12 +307,15 @@ async def show_reasoning_callback(callback: CallbackQuery, supabase: Client, tra
     await callback.answer()
 
 @router.message(F.text & ~F.text.startswith('/'), F.chat.type == "private")
-async def handle_message(message: Message, supabase: Client, translator: Translator, lang_code: str):
-    # <-- PERUBAHAN: Seluruh isi fungsi diganti dengan satu baris panggilan ini
-    await process_text_message(message, message.text, supabase, translator, lang_code)
+async def handle_message(message: Message, supabase: Storage, translator: Translator, lang_code: str):
+    # Pesan beruntun dari satu pengguna digabung dan diproses berurutan
+    await conversation_coalescer.submit(
+        message,
+        lambda msg, text, count: process_text_message(msg, text, supabase, translator, lang_code, message_count=count),
+    )
 
 @router.callback_query(F.data.startswith("check_membership"))
-async def handle_check_membership_callback(callback: CallbackQuery, supabase: Client, translator: Translator, lang_code: str):
+async def handle_check_membership_callback(callback: CallbackQuery, supabase: Storage, translator: Translator, lang_code: str):
     """
     Handles the 'Try Again' button after a user joins the required channels.
     """
@@ -315,7 +330,7 @@ async def handle_check_membership_callback(callback: CallbackQuery, supabase: Cl
     await handle_start(callback.message, supabase, translator, lang_code)
 
 @router.message(Command("web", "i"))
-async def handle_web_command(message: Message, command: CommandObject, supabase: Client, translator: Translator, lang_code: str):
+async def handle_web_command(message: Message, command: CommandObject, supabase: Storage, translator: Translator, lang_code: str):
     if not command.args:
         await message.reply("Please enter your question after the command. Example: `/web what is AI?`")
         return
@@ -333,7 +348,7 @@ async def handle_web_command(message: Message, command: CommandObject, supabase:
     thinking_message = await message.reply("🔎 Searching for information on the internet...")
 
     try:
-        rag_data = await get_rag_response(query, translator, lang_code)
+        rag_data = await get_rag_response(query, translator, lang_code, user_id=user_id)
         
         await thinking_message.edit_text("📚 Summarizing the findings...")
         
@@ -341,8 +356,8 @@ async def handle_web_command(message: Message, command: CommandObject, supabase:
         sources = rag_data.get("sources", [])
         
         if final_text and final_text.strip():
-            await save_message(supabase, user_id, 'user', f"[Web] {query}")
-            await save_message(supabase, user_id, 'assistant', final_text)
+            await message_writer.save(supabase, user_id, 'user', f"[Web] {query}")
+            await message_writer.save(supabase, user_id, 'assistant', final_text)
 
             parsed_response = process_telegram_html(final_text)
 
@@ -358,9 +373,112 @@ async def handle_web_command(message: Message, command: CommandObject, supabase:
             await thinking_message.delete()
             await send_long_message(message, parsed_response)
             await increment_chat_count(supabase, user_id)
+            summarizer.schedule(supabase, user_id)
         else:
             await thinking_message.edit_text("Maaf, terjadi kesalahan saat memproses permintaan Anda.")
 
     except Exception as e:
-        print(f"Error in handle_web_command: {e}")
-        await thinking_message.edit_text(translator.get_text("stream_error", lang_code))
\ No newline at end of file
+        logger.error("Error in handle_web_command: %s", e)
+        await thinking_message.edit_text(translator.get_text("stream_error", lang_code))
+
+@router.message(Command("dbstats"))
+async def handle_dbstats_command(message: Message, supabase: Storage):
+    if not is_admin(message.from_user.id):
+        return
+
+    report = await retention_job.report(supabase)
+    rows_in_table = report["rows_in_table"]
+    saved = report["raw_bytes"] - report["compressed_bytes"]
+    ratio = report["raw_bytes"] / report["compressed_bytes"] if report["compressed_bytes"] else 0
+
+    text = (
+        "<b>🗄️ Messages Table</b>\n\n"
+        f"<b>Rows in table:</b> {rows_in_table if rows_in_table is not None else 'unknown'}\n"
+        f"<b>Retention:</b> conversations idle for {report['retention_days']} days\n\n"
+        "<b>📦 Archive</b>\n"
+        f"<b>Conversations archived:</b> {report['conversations_archived']} ({report['rows_archived']} messages)\n"
+        f"<b>Archived data (uncompressed JSON):</b> {format_bytes(report['raw_bytes'])}\n"
+        f"<b>Archive files on disk:</b> {format_bytes(report['compressed_bytes'])} (x{ratio:.1f} compression, {format_bytes(max(saved, 0))} smaller than uncompressed)\n"
+        f"<b>Files:</b> {len(report['files'])}\n"
+        f"<b>Last run:</b> {escape_html(report['last_run'] or 'never')}"
+    )
+    await message.answer(text)
+
+@router.message(Command("profile"))
+async def handle_profile_command(message: Message, command: CommandObject):
+    if not is_admin(message.from_user.id):
+        return
+
+    try:
+        seconds = float(command.args) if command.args else 10.0
+    except ValueError:
+        seconds = math.nan
+    if not math.isfinite(seconds):
+        await message.answer("Usage: <code>/profile &lt;seconds&gt;</code>")
+        return
+    seconds = min(max(seconds, 1.0), PROFILE_MAX_SECONDS)
+
+    status_message = await message.answer(f"🔬 Profiling for {seconds:.0f}s...")
+    try:
+        # Hanya handler ini yang menunggu; update lain tetap diproses selama sampling
+        result = await profiler.profile(seconds)
+    except ProfilerBusy:
+        await status_message.edit_text("A profile is already running.")
+        return
+
+    busy = result.busy_samples
+    rows = [f"{'self%':>6} {'total%':>6}  function"]
+    for name, self_count, total_count in result.top(PROFILE_TOP_N):
+        rows.append(f"{self_count / busy * 100:6.1f} {total_count / busy * 100:6.1f}  {name}")
+    tasks = ", ".join(f"{escape_html(name)} {count / busy * 100:.0f}%" for name, count in result.task_counts.most_common(5))
+    idle = result.idle_samples / result.samples * 100 if result.samples else 0
+
+    text = (
+        "<b>🔬 Profile</b>\n\n"
+        f"<b>Window:</b> {result.seconds:.0f}s, {result.samples} samples, {idle:.0f}% idle\n"
+        f"<b>Busy tasks:</b> {tasks or 'none'}\n\n"
+        f"<pre>{escape_html(chr(10).join(rows)) if busy else 'Event loop was idle.'}</pre>"
+    )
+    await status_message.edit_text(text)
+
+    filename = f"profile-{datetime.now().strftime('%Y%m%d-%H%M%S')}.folded"
+    await message.answer_document(
+        BufferedInputFile(result.folded().encode("utf-8"), filename=filename),
+        caption="Collapsed stacks for flamegraph.pl / speedscope.app",
+    )
+
+@router.message(Command("usage"))
+async def handle_usage_command(message: Message):
+    if not is_admin(message.from_user.id):
+        return
+
+    if not usage_ledger.by_model:
+        await message.answer("No LLM usage recorded since the last restart.")
+        return
+
+    # Kecepatan tok/s memakai waktu generasi dari Groq, bukan waktu tunggu
+    models = [f"{'model':<24} {'req':>5} {'prompt':>8} {'compl':>7} {'tok/s':>6} {'queue':>6}"]
+    for model, totals in sorted(usage_ledger.by_model.items(), key=lambda item: item[1].tokens, reverse=True):
+        avg_queue = totals.queue_time / totals.requests
+        models.append(f"{model[-24:]:<24} {totals.requests:>5} {totals.prompt_tokens:>8} {totals.completion_tokens:>7} "
+                      f"{totals.tokens_per_second:>6.0f} {avg_queue:>5.2f}s")
+    features = [f"{'feature':<10} {'req':>5} {'tokens':>9}"]
+    for feature, totals in sorted(usage_ledger.by_feature.items(), key=lambda item: item[1].tokens, reverse=True):
+        features.append(f"{feature:<10} {totals.requests:>5} {totals.tokens:>9}")
+    users = [f"{'user':<14} {'req':>5} {'tokens':>9}"]
+    for user_id, totals in usage_ledger.top_users(10):
+        users.append(f"{user_id:<14} {totals.requests:>5} {totals.tokens:>9}")
+    keys = ", ".join(f"{key} {totals.tokens}" for key, totals in sorted(usage_ledger.by_key.items()))
+
+    total_tokens = sum(totals.tokens for totals in usage_ledger.by_model.values())
+    total_requests = sum(totals.requests for totals in usage_ledger.by_model.values())
+    text = (
+        "<b>📈 LLM Usage</b>\n\n"
+        f"<b>Since:</b> {usage_ledger.started_at.strftime('%Y-%m-%d %H:%M UTC')}\n"
+        f"<b>Requests:</b> {total_requests}, <b>tokens:</b> {total_tokens}\n"
+        f"<b>Per key:</b> {escape_html(keys)}\n\n"
+        f"<b>Models</b>\n<pre>{escape_html(chr(10).join(models))}</pre>\n"
+        f"<b>Features</b>\n<pre>{escape_html(chr(10).join(features))}</pre>\n"
+        f"<b>Top users</b>\n<pre>{escape_html(chr(10).join(users))}</pre>"
+    )
+    await message.answer(text)
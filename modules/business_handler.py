@@ -1,48 +1,47 @@
+import logging
 from aiogram import Router, F, Bot
 from aiogram.types import Message, BusinessConnection
-from supabase import Client
+from modules.storage import Storage
 
 from modules.translator import Translator
+from modules.supabase_handler import save_business_connection, deactivate_business_connection
 from modules.core_logic import process_text_message
-from modules.supabase_handler import save_message
+from modules.coalescer import conversation_coalescer
+from modules.message_writer import message_writer
+
+logger = logging.getLogger(__name__)
 
 router = Router()
 
 # Handler untuk saat pengguna menautkan atau memutuskan tautan dengan bot
 @router.business_connection()
-async def handle_business_connection(connection: BusinessConnection, supabase: Client):
+async def handle_business_connection(connection: BusinessConnection, supabase: Storage):
     user_id = connection.user.id
     connection_id = connection.id
     is_enabled = connection.is_enabled
 
-    try:
-        if is_enabled:
-            print(f"User {user_id} has enabled business connection: {connection_id}")
-            # Anda bisa menyimpan koneksi ini ke database jika perlu
-            supabase.table('business_connections').upsert({
-                'id': connection_id,
-                'user_id': user_id,
-                'is_active': True
-            }).execute()
-        else:
-            print(f"User {user_id} has disabled business connection: {connection_id}")
-            supabase.table('business_connections').update(
-                {'is_active': False}
-            ).eq('id', connection_id).execute()
-    except Exception as e:
-        print(f"Error handling business connection: {e}")
+    if is_enabled:
+        logger.info("User %s has enabled business connection: %s", user_id, connection_id)
+        # Koneksi disimpan agar pengaturan pemilik dipakai untuk pesan bisnis
+        await save_business_connection(supabase, connection_id, user_id)
+    else:
+        logger.info("User %s has disabled business connection: %s", user_id, connection_id)
+        await deactivate_business_connection(supabase, connection_id)
 
 # Handler untuk pesan yang masuk ke akun pengguna Premium
 @router.business_message(F.text)
-async def handle_business_message(message: Message, supabase: Client, translator: Translator, lang_code: str):
+async def handle_business_message(message: Message, supabase: Storage, translator: Translator, lang_code: str):
     business_connection_id = message.business_connection_id
     user_id = message.chat.id # ID pengguna yang mengirim pesan ke akun Premium
     
-    print(f"Received business message from {user_id} via connection {business_connection_id}")
+    logger.info("Received business message from %s via connection %s", user_id, business_connection_id)
 
     # Simpan pesan masuk ke database dengan konteks koneksi bisnis
-    await save_message(supabase, user_id, 'user', message.text, business_connection_id)
+    await message_writer.save(supabase, user_id, 'user', message.text, business_connection_id)
     
     # Untuk saat ini, kita akan langsung membalas menggunakan logika AI standar.
     # Di masa depan, ini bisa dikembangkan dengan prompt atau model khusus bisnis.
-    await process_text_message(message, message.text, supabase, translator, lang_code, is_business=True)
\ No newline at end of file
+    await conversation_coalescer.submit(
+        message,
+        lambda msg, text, count: process_text_message(msg, text, supabase, translator, lang_code, is_business=True, message_count=count),
+    )
\ No newline at end of file
@@ -0,0 +1,89 @@
+import os
+import time
+from typing import Any, Dict
+
+# --- Konfigurasi Circuit Breaker ---
+CB_FAILURE_THRESHOLD = int(os.getenv("CB_FAILURE_THRESHOLD", 5))  # kegagalan beruntun sebelum sirkuit terbuka
+CB_OPEN_SECONDS = float(os.getenv("CB_OPEN_SECONDS", 60))        # jeda sebelum probe half-open
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Tracks the health of a single model. After CB_FAILURE_THRESHOLD failed
+    requests in a row the circuit opens and the model is skipped. Once
+    CB_OPEN_SECONDS have passed, one request is let through as a probe:
+    success closes the circuit, failure opens it again.
+    """
+
+    def __init__(self, failure_threshold: int, open_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probe_started_at = 0.0
+        self.times_opened = 0
+
+    def is_open(self, now: float = None) -> bool:
+        """Whether the model should be avoided, without claiming the probe slot."""
+        now = time.monotonic() if now is None else now
+        if self.state == CLOSED:
+            return False
+        if self.state == OPEN:
+            return now - self.opened_at < self.open_seconds
+        # Probe yang tidak pernah melapor (misalnya dibatalkan) tidak boleh mengunci sirkuit
+        return now - self.probe_started_at < self.open_seconds
+
+    def allow(self) -> bool:
+        """Whether a request may use the model; claims the probe slot when half-open."""
+        now = time.monotonic()
+        if self.is_open(now):
+            return False
+        if self.state != CLOSED:
+            self.state = HALF_OPEN
+            self.probe_started_at = now
+        return True
+
+    def record_success(self):
+        self.state = CLOSED
+        self.failures = 0
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != OPEN:
+                self.times_opened += 1
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+
+
+class ModelBreakers:
+    """Lazily creates one CircuitBreaker per model id."""
+
+    def __init__(self, failure_threshold: int, open_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self.fallbacks = 0
+
+    def get(self, model: str) -> CircuitBreaker:
+        breaker = self._breakers.get(model)
+        if breaker is None:
+            breaker = CircuitBreaker(self.failure_threshold, self.open_seconds)
+            self._breakers[model] = breaker
+        return breaker
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "fallbacks": self.fallbacks,
+            "models": {
+                model: {"state": breaker.state, "failures": breaker.failures, "times_opened": breaker.times_opened}
+                for model, breaker in self._breakers.items()
+            },
+        }
+
+model_breakers = ModelBreakers(CB_FAILURE_THRESHOLD, CB_OPEN_SECONDS)
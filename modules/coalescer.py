@@ -0,0 +1,102 @@
+import asyncio
+import logging
+import os
+from typing import Awaitable, Callable, List
+
+from aiogram.types import Message
+
+from modules.request_context import deadline_scope, REPLY_DEADLINE
+from modules.state_backend import get_state_backend
+from modules.supabase_handler import conversation_key
+
+logger = logging.getLogger(__name__)
+
+# --- Konfigurasi Penggabungan Pesan ---
+COALESCE_WINDOW = float(os.getenv("COALESCE_WINDOW", 1.5))  # detik menunggu pesan susulan
+COALESCE_PROBE = float(os.getenv("COALESCE_PROBE", 0.3))    # jika belum ada susulan setelah ini, pesan langsung diproses
+COALESCE_TTL = 180  # batas aman jika pemimpin mati di tengah proses
+
+ProcessFn = Callable[[Message, str, int], Awaitable[None]]
+
+
+class ConversationCoalescer:
+    """
+    Serializes text turns per conversation. The first handler to see a
+    message becomes the leader: it waits COALESCE_PROBE and, only if a
+    follow-up has already arrived, the rest of COALESCE_WINDOW; then it
+    processes every queued message as one merged prompt, and keeps going
+    until the queue is empty. Messages that arrive while a reply is being generated
+    are merged into the next turn instead of starting their own pipeline.
+    Each merged message still counts as one chat toward the daily limit.
+    """
+
+    def __init__(self, window: float, probe: float):
+        self.window = window
+        self.probe = min(probe, window)
+
+        # --- Metrik ---
+        self.turns = 0
+        self.messages_merged = 0
+        self.full_waits = 0
+
+    async def submit(self, message: Message, process: ProcessFn):
+        state = get_state_backend()
+        key = f"coalesce:{conversation_key(message.chat.id, message.business_connection_id)}"
+        leader_key = f"{key}:leader"
+
+        await state.rpush(key, message.model_dump_json(exclude_none=True), ttl=COALESCE_TTL)
+        if not await state.set_nx(leader_key, str(message.message_id), ttl=COALESCE_TTL):
+            return  # pemimpin lain akan memproses pesan ini
+
+        pending: List[str] = []
+        while True:
+            try:
+                while True:
+                    await asyncio.sleep(self.probe)
+                    pending += await state.pop_all(key)
+                    if len(pending) > 1 and self.window > self.probe:
+                        # Pengguna sedang mengirim beruntun: tunggu sisa jendela untuk susulan berikutnya
+                        self.full_waits += 1
+                        await asyncio.sleep(self.window - self.probe)
+                        pending += await state.pop_all(key)
+                    if not pending:
+                        break
+                    burst = self._load(pending, message)
+                    pending = []
+                    await state.set(leader_key, str(message.message_id), ttl=COALESCE_TTL)
+                    await self._process_burst(burst, process)
+            finally:
+                await state.delete(leader_key)
+
+            # Pesan yang masuk tepat setelah antrean kosong tidak boleh tertinggal
+            pending = await state.pop_all(key)
+            if not pending:
+                return
+            if not await state.set_nx(leader_key, str(message.message_id), ttl=COALESCE_TTL):
+                for raw in pending:
+                    await state.rpush(key, raw, ttl=COALESCE_TTL)
+                return
+
+    def _load(self, raw_messages: List[str], origin: Message) -> List[Message]:
+        messages = {}
+        for raw in raw_messages:
+            queued = Message.model_validate_json(raw, context={"bot": origin.bot})
+            messages[queued.message_id] = queued
+        return [messages[message_id] for message_id in sorted(messages)]
+
+    async def _process_burst(self, burst: List[Message], process: ProcessFn):
+        self.turns += 1
+        self.messages_merged += len(burst) - 1
+        text_prompt = "\n\n".join(queued.text for queued in burst if queued.text)
+        try:
+            # Setiap giliran mendapat tenggat baru; pemimpin bisa memproses beberapa giliran berturut-turut
+            with deadline_scope(REPLY_DEADLINE, inherit=False):
+                # Balasan ditujukan ke pesan terakhir dalam rentetan
+                await process(burst[-1], text_prompt, len(burst))
+        except Exception as e:
+            logger.error("Error processing coalesced turn: %s", e)
+
+    def stats(self):
+        return {"turns": self.turns, "messages_merged": self.messages_merged, "full_waits": self.full_waits}
+
+conversation_coalescer = ConversationCoalescer(COALESCE_WINDOW, COALESCE_PROBE)
@@ -1,23 +1,46 @@
-import base64
+import logging
 from typing import List, Dict, Any
 import os
 
 from aiogram import Bot
 from aiogram.types import Message
-from supabase import Client
+from modules.storage import Storage
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
-from modules.groq_handler import get_groq_response, get_groq_vision_response
-from modules.utils import send_long_message, load_models, send_long_business_message
-from modules.supabase_handler import save_message, get_business_owner_id, get_user_model
+from modules.groq_handler import get_groq_response, get_groq_vision_response, get_model_name
+from modules.utils import send_long_message, load_models, send_long_business_message, encode_image_base64
+from modules.supabase_handler import get_business_owner_id, get_user_model
 from modules.html_parser import process_telegram_html, escape_html
 from modules.translator import Translator
-from modules.limit_handler import check_and_handle_limit, increment_chat_count
+from modules.limit_handler import check_and_handle_limit, get_remaining_chats, increment_chat_count
+from modules.answer_cache import CACHE_ALWAYS, CACHE_STATELESS
+from modules.message_writer import message_writer
+from modules.summarizer import summarizer
+from modules.llm_scheduler import FEATURE_INLINE, FEATURE_PRIVATE, FEATURE_BUSINESS, FEATURE_GROUP
+
+logger = logging.getLogger(__name__)
 
 MAX_IMAGES = 3
 
-async def generate_ai_response(user_id: int, text_prompt: str, supabase: Client, translator: Translator, lang_code: str) -> Dict[str, Any]:
-    response_data = await get_groq_response(user_id, text_prompt, supabase, translator, lang_code)
+def chat_feature(message: Message, is_business: bool = False) -> str:
+    """Maps where a message came from to its LLM priority class."""
+    if is_business:
+        return FEATURE_BUSINESS
+    if message.chat.type in ("group", "supergroup"):
+        return FEATURE_GROUP
+    return FEATURE_PRIVATE
+
+def fallback_note(response_data: Dict[str, Any], translator: Translator, lang_code: str) -> str:
+    """Tells the user when their model was swapped out because its circuit is open."""
+    if not response_data.get("fallback_to"):
+        return ""
+    return "\n\n" + translator.get_text("model_fallback_note", lang_code).format(
+        model=escape_html(get_model_name(response_data["fallback_from"])),
+        fallback=escape_html(get_model_name(response_data["fallback_to"])),
+    )
+
+async def generate_ai_response(user_id: int, text_prompt: str, supabase: Storage, translator: Translator, lang_code: str) -> Dict[str, Any]:
+    response_data = await get_groq_response(user_id, text_prompt, supabase, translator, lang_code, cache_mode=CACHE_ALWAYS, feature=FEATURE_INLINE)
     
     full_response = response_data.get("content", "")
     reasoning_text = response_data.get("reasoning")
@@ -32,32 +55,34 @@ async def generate_ai_response(user_id: int, text_prompt: str, supabase: Client,
             for i, source in enumerate(sources[:5]):
                 sources_text += f"{i+1}. <a href=\"{source.url}\">{escape_html(source.title)}</a>\n"
             parsed_response += sources_text
-        final_text = parsed_response
+        final_text = parsed_response + fallback_note(response_data, translator, lang_code)
 
     return {
         "final_text": final_text,
         "original_content": full_response,
         "reasoning": reasoning_text,
-        "sources_found": bool(sources)
+        "sources_found": bool(sources),
+        "cached": response_data.get("cached", False)
     }
 
-async def process_text_message(message: Message, text_prompt: str, supabase: Client, translator: Translator, lang_code: str, is_business: bool = False):
+async def process_text_message(message: Message, text_prompt: str, supabase: Storage, translator: Translator, lang_code: str, is_business: bool = False, message_count: int = 1):
     user_id = message.chat.id
     connection_id = message.business_connection_id if is_business else None
 
     limit_user_id = user_id
     if is_business:
         if not connection_id:
-            print("Error: is_business is True but business_connection_id is missing.")
+            logger.error("is_business is True but business_connection_id is missing.")
             return
         owner_id = await get_business_owner_id(supabase, connection_id)
         if not owner_id:
-            print(f"Could not find owner for business connection {connection_id}. Aborting.")
+            logger.error("Could not find owner for business connection %s. Aborting.", connection_id)
             return
         limit_user_id = owner_id
 
-    is_limited = await check_and_handle_limit(supabase, limit_user_id)
-    if is_limited:
+    # Rentetan yang digabung tetap dijawab selama masih ada sisa kuota; yang dibebankan paling banyak sisanya
+    remaining = await get_remaining_chats(supabase, limit_user_id)
+    if remaining == 0:
         limit_text = translator.get_text("limit_reached", lang_code).format(limit=os.getenv("DAILY_CHAT_LIMIT", 20))
         if is_business:
             await message.bot.send_message(user_id, limit_text, business_connection_id=connection_id)
@@ -66,12 +91,12 @@ async def process_text_message(message: Message, text_prompt: str, supabase: Cli
         return
 
     try:
-        response_data = await get_groq_response(user_id, text_prompt, supabase, translator, lang_code, connection_id)
+        response_data = await get_groq_response(user_id, text_prompt, supabase, translator, lang_code, connection_id, cache_mode=CACHE_STATELESS, feature=chat_feature(message, is_business))
         full_response = response_data.get("content", "")
 
         if full_response and full_response.strip():
-            await save_message(supabase, user_id, 'assistant', full_response, connection_id)
-            parsed_response = process_telegram_html(full_response)
+            await message_writer.save(supabase, user_id, 'assistant', full_response, connection_id)
+            parsed_response = process_telegram_html(full_response) + fallback_note(response_data, translator, lang_code)
             
             if is_business:
                 await send_long_business_message(message.bot, user_id, connection_id, parsed_response)
@@ -79,7 +104,9 @@ async def process_text_message(message: Message, text_prompt: str, supabase: Cli
                 # --- PERUBAIKAN ---
                 await send_long_message(message, parsed_response)
             
-            await increment_chat_count(supabase, limit_user_id)
+            # Pesan yang digabung tetap dihitung satu per satu terhadap batas harian
+            await increment_chat_count(supabase, limit_user_id, message_count if remaining is None else min(message_count, remaining))
+            summarizer.schedule(supabase, user_id, connection_id)
         else:
             error_text = translator.get_text("no_response", lang_code)
             if is_business:
@@ -88,7 +115,7 @@ async def process_text_message(message: Message, text_prompt: str, supabase: Cli
                 await message.answer(error_text)
             
     except Exception as e:
-        print(f"Error in process_text_message: {e}")
+        logger.error("Error in process_text_message: %s", e)
         error_text = translator.get_text("stream_error", lang_code)
         try:
             if is_business:
@@ -97,10 +124,10 @@ async def process_text_message(message: Message, text_prompt: str, supabase: Cli
                 await message.answer(error_text)
         except Exception as final_e:
             # --- PERBAIKAN TYPO ---
-            print(f"Failed to send final error message: {final_e}")
+            logger.error("Failed to send final error message: %s", final_e)
 
 
-async def process_photo_message(message: Message, photo_messages: List[Message], prompt_text: str, bot: Bot, supabase: Client, translator: Translator, lang_code: str):
+async def process_photo_message(message: Message, photo_messages: List[Message], prompt_text: str, bot: Bot, supabase: Storage, translator: Translator, lang_code: str):
     user_id = message.from_user.id
     is_limited = await check_and_handle_limit(supabase, user_id)
     if is_limited:
@@ -110,7 +137,8 @@ async def process_photo_message(message: Message, photo_messages: List[Message],
         return
 
     models = load_models()
-    vision_models = [model['value'] for model in models if model.get("vision")]
+    # Mode "auto" memilih model vision sendiri saat ada gambar
+    vision_models = [model['value'] for model in models if model.get("vision") or model.get("auto")]
     active_model = await get_user_model(supabase, user_id)
 
     if active_model not in vision_models:
@@ -129,21 +157,22 @@ async def process_photo_message(message: Message, photo_messages: List[Message],
         file_info = await bot.get_file(photo.file_id)
         image_bytes_io = await bot.download_file(file_info.file_path)
         image_bytes_io.seek(0)
-        base64_images.append(base64.b64encode(image_bytes_io.read()).decode('utf-8'))
+        base64_images.append(encode_image_base64(image_bytes_io.read()))
 
     try:
-        response_data = await get_groq_vision_response(user_id, prompt, base64_images, supabase, translator, lang_code)
+        response_data = await get_groq_vision_response(user_id, prompt, base64_images, supabase, translator, lang_code, feature=chat_feature(message))
         await thinking_message.delete()
 
         full_response = response_data["content"]
         if full_response and full_response.strip():
-            await save_message(supabase, user_id, 'user', f"[Image Analysis] {prompt}")
-            await save_message(supabase, user_id, 'assistant', full_response)
-            parsed_response = process_telegram_html(full_response)
+            await message_writer.save(supabase, user_id, 'user', f"[Image Analysis] {prompt}")
+            await message_writer.save(supabase, user_id, 'assistant', full_response)
+            parsed_response = process_telegram_html(full_response) + fallback_note(response_data, translator, lang_code)
             await send_long_message(message, parsed_response)
             await increment_chat_count(supabase, user_id)
+            summarizer.schedule(supabase, user_id)
         else:
             await message.reply(translator.get_text("no_response", lang_code))
     except Exception as e:
-        print(f"Error in process_photo_message: {e}")
+        logger.error("Error in process_photo_message: %s", e)
         await thinking_message.edit_text(translator.get_text("stream_error", lang_code))
@@ -1,26 +1,45 @@
 import os
+import asyncio
 import itertools
 import json
-import requests
-import fitz 
+import time
+import logging
+from collections import deque
+from typing import TYPE_CHECKING
 from bs4 import BeautifulSoup
-from groq import AsyncGroq, RateLimitError
-from serpapi import GoogleSearch
 
-from modules.supabase_handler import get_user_messages, get_user_model, get_user_prompt
+from modules.supabase_handler import get_user_messages, get_user_model, get_user_prompt, get_conversation_summary, DEFAULT_MODEL
 from modules.translator import Translator
+from modules.answer_cache import answer_cache, CACHE_ALWAYS, CACHE_STATELESS
+from modules.message_writer import message_writer, merge_pending
+from modules.model_stats import model_stats
+from modules.circuit_breaker import model_breakers
+from modules.model_router import model_router, AUTO_MODEL
+from modules.llm_scheduler import llm_scheduler, LLMOverloaded, FEATURE_PRIVATE, FEATURE_WEB, FEATURE_SUMMARY
+from modules.request_context import run_with_deadline, time_left, DeadlineExceeded
+from modules.metrics import LLM_SECONDS, LLM_ERRORS, SCRAPE_SECONDS, SEARCH_SECONDS
+from modules.usage_ledger import usage_ledger
+
+if TYPE_CHECKING:
+    from groq import AsyncGroq
+
+logger = logging.getLogger(__name__)
 
 # --- Konfigurasi Kunci API dan Model ---
 # Rotasi untuk Groq API
 groq_api_keys_str = os.environ.get("GROQ_API_KEYS", "")
 groq_api_keys = [key.strip() for key in groq_api_keys_str.split(',') if key.strip()]
 groq_key_cycler = itertools.cycle(groq_api_keys)
+llm_scheduler.set_key_pool(len(groq_api_keys))
 
 # Rotasi untuk SerpApi
 serpapi_keys_str = os.environ.get("SERPAPI_API_KEYS", "")
 serpapi_keys = [key.strip() for key in serpapi_keys_str.split(',') if key.strip()]
 serpapi_key_cycler = itertools.cycle(serpapi_keys)
 
+# Endpoint SerpApi bisa diarahkan ke server lain (misalnya layanan tiruan tools/loadtest)
+SERPAPI_BASE_URL = os.environ.get("SERPAPI_BASE_URL", "").rstrip("/")
+
 def load_models_config():
     try:
         with open("models.json", "r") as f:
@@ -28,43 +47,317 @@ def load_models_config():
     except FileNotFoundError:
         return {}
 
-models_config = load_models_config()
+_models_config = None
+
+def get_models_config() -> dict:
+    """models.json keyed by model value, read on first use."""
+    global _models_config
+    if _models_config is None:
+        _models_config = load_models_config()
+    return _models_config
+
+# --- Impor Malas ---
+# groq, requests, serpapi dan fitz (PyMuPDF) baru dimuat saat pertama dipakai
+# atau saat pemanasan startup, sehingga impor main.py tetap ringan
+def preload_scraper_modules():
+    """Imports the web search and scraping dependencies ahead of the first /web request."""
+    import fitz
+    import requests
+    import serpapi
+
+def _google_search(params: dict):
+    from serpapi import GoogleSearch
+    if SERPAPI_BASE_URL:
+        GoogleSearch.BACKEND = SERPAPI_BASE_URL
+    return GoogleSearch(params)
+
+def _is_rate_limit(error: Exception) -> bool:
+    from groq import RateLimitError  # SDK sudah dimuat jika panggilan sempat dibuat
+    return isinstance(error, RateLimitError)
+
+# Jumlah pesan terakhir yang dikirim utuh; yang lebih lama diwakili ringkasan
+HISTORY_WINDOW = 10
+RAG_MODEL = "openai/gpt-oss-120b"
+
+# --- Tenggat per Tahap ---
+SEARCH_TIMEOUT = 10.0
+SCRAPE_TIMEOUT = 15.0
+LLM_TOKENS_PER_SECOND = float(os.environ.get("LLM_TOKENS_PER_SECOND", 250))  # perkiraan kecepatan keluaran
+MIN_MAX_TOKENS = 256
+
+# --- Pemanggilan LLM Terpusat ---
+# Hedging: jika percobaan pertama melewati p95 latensi model, kirim percobaan kedua di kunci lain
+LLM_HEDGING = os.environ.get("LLM_HEDGING", "0") == "1"
+HEDGE_MAX_RATIO = float(os.environ.get("HEDGE_MAX_RATIO", 0.1))
+
+class LLMUnavailable(Exception):
+    """Raised when no Groq key produced a completion."""
+
+class HedgeBudget:
+    """Caps hedged attempts to a fraction of recent requests so quota use stays bounded."""
+
+    def __init__(self, max_ratio: float, window: int = 200):
+        self.max_ratio = max_ratio
+        self._recent = deque(maxlen=window)
+        self.hedges_sent = 0
+        self.hedges_won = 0
+        self.hedges_no_slot = 0
+
+    def record_request(self):
+        self._recent.append(False)
+
+    def try_hedge(self) -> bool:
+        hedged = self._recent.count(True)
+        if (hedged + 1) / (len(self._recent) + 1) > self.max_ratio:
+            return False
+        self._recent.append(True)
+        self.hedges_sent += 1
+        return True
+
+    def stats(self) -> dict:
+        return {"hedges_sent": self.hedges_sent, "hedges_won": self.hedges_won, "hedges_no_slot": self.hedges_no_slot}
+
+hedge_budget = HedgeBudget(HEDGE_MAX_RATIO)
+_groq_clients = {}
+
+def get_groq_client(api_key: str) -> "AsyncGroq":
+    """Reuses one client per key so HTTP connections stay warm."""
+    client = _groq_clients.get(api_key)
+    if client is None:
+        from groq import AsyncGroq
+        client = AsyncGroq(api_key=api_key)
+        _groq_clients[api_key] = client
+    return client
+
+async def warm_groq_clients():
+    """Creates the client for every key and opens its connection with a cheap models listing."""
+    # Klien pertama memuat SDK groq; dibuat di thread agar event loop tidak tertahan
+    clients = [await asyncio.to_thread(get_groq_client, api_key) for api_key in groq_api_keys]
+    await asyncio.gather(*(client.models.list() for client in clients))
+
+def _key_label(api_key: str) -> str:
+    # Kunci API tidak boleh muncul di metrik; cukup posisinya dalam rotasi
+    return f"key{groq_api_keys.index(api_key)}" if api_key in groq_api_keys else "key?"
+
+async def _timed_completion(api_key: str, messages: list, model: str, api_params: dict):
+    started = time.monotonic()
+    try:
+        response = await get_groq_client(api_key).chat.completions.create(messages=messages, model=model, **api_params)
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        model_stats.record_failure(model)
+        reason = "rate_limit" if _is_rate_limit(e) else type(e).__name__
+        LLM_ERRORS.inc(model=model, key=_key_label(api_key), reason=reason)
+        raise
+    elapsed = time.monotonic() - started
+    model_stats.record_success(model, elapsed)
+    LLM_SECONDS.observe(elapsed, model=model, key=_key_label(api_key))
+    return response, api_key
+
+def _estimate_prompt_tokens(messages: list) -> int:
+    # Sekitar 4 karakter per token; cukup untuk mencatat percobaan yang dibatalkan sebelum ada usage
+    return sum(len(message["content"]) for message in messages if isinstance(message.get("content"), str)) // 4
+
+def _start_hedge(messages: list, model: str, api_params: dict, feature: str):
+    """
+    Starts a hedge attempt in its own scheduler slot and returns (task, key),
+    or None when no slot is free or the budget is spent.
+    """
+    # Hedge tidak pernah mengantre; tanpa slot kosong ia akan melampaui batas konkurensi
+    if not llm_scheduler.try_acquire(feature):
+        hedge_budget.hedges_no_slot += 1
+        return None
+    if not hedge_budget.try_hedge():
+        llm_scheduler.release()
+        return None
+    api_key = next(groq_key_cycler)
+    task = asyncio.create_task(_timed_completion(api_key, messages, model, api_params))
+    # Callback tetap jalan walau task dibatalkan sebelum sempat mulai
+    task.add_done_callback(lambda _: llm_scheduler.release())
+    return task, api_key
+
+def _record_hedge_losers(launched: dict, winner: asyncio.Task, messages: list, model: str, feature: str, user_id: int):
+    """Puts the attempts that lost a hedged race in the usage ledger; they used quota too."""
+    now = time.monotonic()
+    for task, (api_key, started) in launched.items():
+        if task is winner:
+            continue
+        if not task.done():
+            # Baru saja dibatalkan di tengah jalan: prompt sudah terkirim, usage tidak pernah datang
+            usage_ledger.record_hedge(model, _key_label(api_key), feature, user_id, None, _estimate_prompt_tokens(messages), now - started)
+        elif not task.cancelled() and task.exception() is None:
+            response, _ = task.result()
+            usage_ledger.record_hedge(model, _key_label(api_key), feature, user_id, response.usage, 0, now - started)
+
+async def _hedged_completion(messages: list, model: str, api_params: dict, feature: str, user_id: int = None):
+    hedge_budget.record_request()
+    api_key = next(groq_key_cycler)
+    primary = asyncio.create_task(_timed_completion(api_key, messages, model, api_params))
+    launched = {primary: (api_key, time.monotonic())}
+    attempts = {primary}
+    winner = None
+    try:
+        threshold = model_stats.p95(model)
+        if LLM_HEDGING and threshold and len(groq_api_keys) > 1:
+            done, _ = await asyncio.wait(attempts, timeout=threshold)
+            hedge = None if done else _start_hedge(messages, model, api_params, feature)
+            if hedge is not None:
+                task, hedge_key = hedge
+                launched[task] = (hedge_key, time.monotonic())
+                attempts.add(task)
+
+        # Hasil sukses pertama yang menang; jika satu gagal, tunggu yang lain
+        error = None
+        while attempts:
+            done, attempts = await asyncio.wait(attempts, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is not primary:
+                        hedge_budget.hedges_won += 1
+                    winner = task
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in attempts:
+            task.cancel()
+        if winner is not None and len(launched) > 1:
+            _record_hedge_losers(launched, winner, messages, model, feature, user_id)
+
+def select_model(model_id: str, require_vision: bool = False):
+    """
+    Returns (model_to_use, fell_back). While a model's circuit is open the
+    fastest healthy model with the same capabilities is used instead.
+    """
+    requested = get_models_config().get(model_id)
+    if requested and model_breakers.get(model_id).allow():
+        return model_id, False
+
+    needs_vision = require_vision or bool(requested and requested.get("vision"))
+    needs_reasoning = bool(requested and requested.get("reasoning"))
+    candidates = [
+        candidate_id for candidate_id, info in get_models_config().items()
+        if candidate_id != model_id
+        and not info.get("auto")
+        and (info.get("vision") or not needs_vision)
+        and (info.get("reasoning") or not needs_reasoning)
+        and not model_breakers.get(candidate_id).is_open()
+    ]
+    if not candidates:
+        return model_id, False
+
+    # Model tanpa data latensi diletakkan setelah model yang sudah terukur; DEFAULT_MODEL menang jika seri
+    candidates.sort(key=lambda candidate_id: (model_stats.p50(candidate_id) or float("inf"), candidate_id != DEFAULT_MODEL))
+    model_breakers.fallbacks += 1
+    return candidates[0], True
+
+def get_model_name(model_id: str) -> str:
+    return get_models_config().get(model_id, {}).get("name", model_id)
+
+async def create_chat_completion(messages: list, model: str, feature: str = FEATURE_PRIVATE, user_id: int = None, **api_params):
+    """
+    Runs a chat completion through the LLM admission queue, with key
+    rotation and optional hedging, and records its token usage for
+    `user_id`. Raises LLMUnavailable when the request is shed or every
+    key fails.
+    """
+    started = time.monotonic()
+    try:
+        async with llm_scheduler.slot(feature):
+            queue_time = time.monotonic() - started
+            api_params = fit_max_tokens(api_params)
+            response, api_key = await run_with_deadline(_complete_with_rotation(messages, model, api_params, feature, user_id), stage="LLM call")
+    except LLMOverloaded as e:
+        logger.warning("Shedding LLM request: %s", e)
+        raise LLMUnavailable(str(e)) from e
+    except DeadlineExceeded as e:
+        logger.warning("Abandoning LLM request: %s", e)
+        raise LLMUnavailable(str(e)) from e
+
+    usage_ledger.record(model, _key_label(api_key), feature, user_id, response.usage, queue_time, time.monotonic() - started)
+    return response
+
+def fit_max_tokens(api_params: dict) -> dict:
+    """Shrinks max_tokens so the answer can finish before the request deadline."""
+    left = time_left()
+    if left is None or "max_tokens" not in api_params:
+        return api_params
+    budget = max(MIN_MAX_TOKENS, int(left * LLM_TOKENS_PER_SECOND))
+    if budget >= api_params["max_tokens"]:
+        return api_params
+    return {**api_params, "max_tokens": budget}
+
+async def _complete_with_rotation(messages: list, model: str, api_params: dict, feature: str, user_id: int = None):
+    breaker = model_breakers.get(model)
+    last_error = None
+    for _ in range(len(groq_api_keys)):
+        try:
+            response, api_key = await _hedged_completion(messages, model, api_params, feature, user_id)
+            breaker.record_success()
+            return response, api_key
+        except Exception as e:
+            if not _is_rate_limit(e):
+                logger.error("An unexpected error occurred: %s", e)
+            last_error = e
+            continue
+    breaker.record_failure()
+    raise LLMUnavailable(str(last_error) if last_error else "No Groq API keys configured")
+
+def split_reasoning(full_response: str):
+    """Separates a <think>...</think> block from the final answer."""
+    start_tag, end_tag = "<think>", "</think>"
+    start_index = full_response.find(start_tag)
+    end_index = full_response.find(end_tag)
+    if start_index != -1 and end_index != -1:
+        reasoning_text = full_response[start_index + len(start_tag):end_index].strip()
+        final_content = full_response[end_index + len(end_tag):].strip()
+        return reasoning_text, final_content
+    return None, full_response
 
 def scrape_url_content(url: str) -> str:
     """
     Mengambil konten dari URL, mendukung HTML dan PDF.
     """
+    import fitz
+    import requests
+
     try:
         headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'}
+        started = time.perf_counter()
         response = requests.get(url, headers=headers, timeout=15)
         response.raise_for_status()
 
         content_type = response.headers.get('content-type', '').lower()
+        kind = "pdf" if 'application/pdf' in content_type else "html" if 'text/html' in content_type else "other"
+        SCRAPE_SECONDS.observe(time.perf_counter() - started, stage="fetch", content_type=kind)
 
         # Jika konten adalah PDF
-        if 'application/pdf' in content_type:
-            with fitz.open(stream=response.content, filetype="pdf") as doc:
-                text = "".join(page.get_text() for page in doc)
+        if kind == "pdf":
+            with SCRAPE_SECONDS.time(stage="parse", content_type=kind):
+                with fitz.open(stream=response.content, filetype="pdf") as doc:
+                    text = "".join(page.get_text() for page in doc)
             return text
         
         # Jika konten adalah HTML
-        elif 'text/html' in content_type:
-            soup = BeautifulSoup(response.content, 'lxml')
-            for script_or_style in soup(['script', 'style', 'nav', 'footer', 'header', 'aside']):
-                script_or_style.decompose()
-            return soup.get_text(separator='\n', strip=True)
+        elif kind == "html":
+            with SCRAPE_SECONDS.time(stage="parse", content_type=kind):
+                soup = BeautifulSoup(response.content, 'lxml')
+                for script_or_style in soup(['script', 'style', 'nav', 'footer', 'header', 'aside']):
+                    script_or_style.decompose()
+                return soup.get_text(separator='\n', strip=True)
         
         # Abaikan tipe konten lain
         else:
-            print(f"Skipping unsupported content type '{content_type}' for URL {url}")
+            logger.warning("Skipping unsupported content type '%s' for URL %s", content_type, url)
             return None
 
     except Exception as e:
-        print(f"Error scraping content from {url}: {e}")
+        logger.error("Error scraping content from %s: %s", url, e)
         return None
 
 
-async def get_groq_response(user_id: int, user_message: str, supabase_client, translator: Translator, lang_code: str, business_connection_id: str = None):
+async def get_groq_response(user_id: int, user_message: str, supabase_client, translator: Translator, lang_code: str, business_connection_id: str = None, cache_mode: str = None, feature: str = FEATURE_PRIVATE):
     if not groq_api_keys:
         return {"content": translator.get_text("api_key_not_configured", lang_code), "reasoning": None}
     
@@ -75,8 +368,12 @@ async def get_groq_response(user_id: int, user_message: str, supabase_client, tr
         if owner_id:
             owner_id_for_settings = owner_id
 
-    active_model_id = await get_user_model(supabase_client, owner_id_for_settings)
-    model_info = models_config.get(active_model_id, {})
+    selected_model_id = await get_user_model(supabase_client, owner_id_for_settings)
+    if selected_model_id == AUTO_MODEL:
+        selected_model_id = model_router.route(get_models_config(), user_message)
+    active_model_id, fell_back = select_model(selected_model_id)
+    fallback = {"fallback_from": selected_model_id, "fallback_to": active_model_id} if fell_back else {}
+    model_info = get_models_config().get(active_model_id, {})
     supports_reasoning = model_info.get("reasoning", False)
 
     api_params = { "temperature": 0.7, "max_tokens": 2000 }
@@ -89,43 +386,103 @@ async def get_groq_response(user_id: int, user_message: str, supabase_client, tr
     if custom_prompt:
         final_system_prompt = f"{custom_prompt}\n\n[SYSTEM RULE]:\n{base_system_prompt}"
 
-    conversation_history = await get_user_messages(supabase_client, user_id, business_connection_id)
+    cache_key = None
+    if cache_mode and not business_connection_id:
+        cache_key = answer_cache.make_key(user_message, active_model_id, lang_code, custom_prompt)
+    if cache_key and cache_mode == CACHE_ALWAYS:
+        cached = await answer_cache.get(cache_key)
+        if cached:
+            return {**cached, "sources": [], "cached": True, **fallback}
+
+    # Pesan yang masih di antrean penulis belum ada di database
+    pending_messages = message_writer.pending_for(user_id, business_connection_id)
+    # Riwayat dan ringkasan dibaca bersamaan: satu round trip database, bukan dua berurutan
+    conversation_history, summary = await asyncio.gather(
+        get_user_messages(supabase_client, user_id, business_connection_id, limit=HISTORY_WINDOW),
+        get_conversation_summary(supabase_client, user_id, business_connection_id),
+    )
+    conversation_history = merge_pending(conversation_history, pending_messages)
+
+    # Pertanyaan tanpa riwayat bersifat stateless, jadi jawabannya bisa dipakai ulang
+    if cache_key and cache_mode == CACHE_STATELESS:
+        if conversation_history:
+            cache_key = None
+        else:
+            cached = await answer_cache.get(cache_key)
+            if cached:
+                return {**cached, "sources": [], "cached": True, **fallback}
     
-    conversation_history = conversation_history[-10:]
+    conversation_history = conversation_history[-HISTORY_WINDOW:]
+
+    if summary and summary.get("summary"):
+        final_system_prompt += f"\n\n[CONVERSATION SUMMARY SO FAR]:\n{summary['summary']}"
 
     messages = [{"role": "system", "content": final_system_prompt}]
     for message in conversation_history:
         messages.append({"role": message['role'], "content": message['content']})
     messages.append({"role": "user", "content": user_message})
 
-    for _ in range(len(groq_api_keys)):
-        current_key = next(groq_key_cycler)
-        client = AsyncGroq(api_key=current_key)
-        try:
-            response = await client.chat.completions.create(messages=messages, model=active_model_id, **api_params)
-            full_response = response.choices[0].message.content
-            
-            reasoning_text, final_content = None, full_response
-            if supports_reasoning and "<think>" in full_response and "</think>" in full_response:
-                start_tag, end_tag = "<think>", "</think>"
-                start_index = full_response.find(start_tag)
-                end_index = full_response.find(end_tag)
-                if start_index != -1 and end_index != -1:
-                    reasoning_text = full_response[start_index + len(start_tag):end_index].strip()
-                    final_content = full_response[end_index + len(end_tag):].strip()
-
-            return {"content": final_content, "reasoning": reasoning_text, "sources": []}
-        except RateLimitError:
-            continue
-        except Exception as e:
-            print(f"An unexpected error occurred: {e}")
-            continue
-    
-    return {"content": translator.get_text("all_services_busy", lang_code), "reasoning": None, "sources": []}
+    try:
+        # Pemakaian akun bisnis dicatat atas nama pemiliknya
+        response = await create_chat_completion(messages, active_model_id, feature, owner_id_for_settings, **api_params)
+    except LLMUnavailable:
+        return {"content": translator.get_text("all_services_busy", lang_code), "reasoning": None, "sources": []}
+
+    full_response = response.choices[0].message.content or ""
+    reasoning_text, final_content = None, full_response
+    if supports_reasoning:
+        reasoning_text, final_content = split_reasoning(full_response)
+
+    if cache_key and final_content and final_content.strip():
+        await answer_cache.set(cache_key, {"content": final_content, "reasoning": reasoning_text})
+    return {"content": final_content, "reasoning": reasoning_text, "sources": [], **fallback}
 # -------------------------
 
 
-async def get_rag_response(query: str, translator: Translator, lang_code: str):
+def get_summarizer_model() -> str:
+    override = os.environ.get("SUMMARY_MODEL")
+    if override:
+        return override
+    return next((model_id for model_id, info in get_models_config().items() if info.get("summarizer")), "llama-3.3-70b-versatile")
+
+async def summarize_conversation(previous_summary: str, new_messages: list, user_id: int = None) -> str | None:
+    """Folds older conversation turns into the rolling summary using a cheap model."""
+    if not groq_api_keys:
+        return None
+
+    transcript = "\n".join(f"{m['role'].upper()}: {m['content']}" for m in new_messages)
+    prompt = (
+        "You maintain a rolling memory of a chat between a user and an AI assistant.\n"
+        "Update the existing summary with the new messages. Keep facts about the user, their goals, "
+        "decisions made and open questions. Drop small talk. Write in the language of the conversation, "
+        "as plain text, at most 1200 characters.\n\n"
+        f"--- EXISTING SUMMARY ---\n{previous_summary or '(none)'}\n\n"
+        f"--- NEW MESSAGES ---\n{transcript}"
+    )
+
+    try:
+        response = await create_chat_completion(
+            [{"role": "user", "content": prompt}],
+            get_summarizer_model(),
+            FEATURE_SUMMARY,
+            user_id,
+            temperature=0.2,
+            max_tokens=600,
+        )
+    except LLMUnavailable as e:
+        logger.error("Error summarizing conversation: %s", e)
+        return None
+    return (response.choices[0].message.content or "").strip() or None
+
+
+async def _scrape_with_deadline(url: str):
+    try:
+        return await run_with_deadline(asyncio.to_thread(scrape_url_content, url), cap=SCRAPE_TIMEOUT, stage=f"scraping {url}")
+    except DeadlineExceeded as e:
+        logger.warning("Skipping source: %s", e)
+        return None
+
+async def get_rag_response(query: str, translator: Translator, lang_code: str, feature: str = FEATURE_WEB, user_id: int = None):
     if not groq_api_keys or not serpapi_keys:
         return {"content": translator.get_text("api_key_not_configured", lang_code), "sources": []}
 
@@ -135,8 +492,9 @@ async def get_rag_response(query: str, translator: Translator, lang_code: str):
             "q": query,
             "api_key": next(serpapi_key_cycler)
         }
-        search = GoogleSearch(search_params)
-        search_results = search.get_dict()
+        search = _google_search(search_params)
+        with SEARCH_SECONDS.time():
+            search_results = await run_with_deadline(asyncio.to_thread(search.get_dict), cap=SEARCH_TIMEOUT, stage="web search")
         organic_results = search_results.get("organic_results", [])
         
         if not organic_results:
@@ -149,8 +507,8 @@ async def get_rag_response(query: str, translator: Translator, lang_code: str):
         sources = []
         
         max_chars_per_source = 7500 // len(top_results)
-        for result in top_results:
-            content = scrape_url_content(result['link'])
+        contents = await asyncio.gather(*(_scrape_with_deadline(result['link']) for result in top_results))
+        for result, content in zip(top_results, contents):
             if content:
                 # Teks dipotong di sini, sebelum digabungkan
                 scraped_content.append(f"--- Content from {result['link']} ---\n{content[:max_chars_per_source]}")
@@ -175,24 +533,31 @@ async def get_rag_response(query: str, translator: Translator, lang_code: str):
         )
         
         # 4. Penghasilan Jawaban (Generation)
-        client = AsyncGroq(api_key=next(groq_key_cycler))
-        response = await client.chat.completions.create(
-            messages=[{"role": "user", "content": rag_prompt}],
-            model="openai/gpt-oss-120b",
+        response = await create_chat_completion(
+            [{"role": "user", "content": rag_prompt}],
+            RAG_MODEL,
+            feature,
+            user_id,
             temperature=0.5,
         )
         final_answer = response.choices[0].message.content
         return {"content": final_answer, "sources": sources}
 
+    except LLMUnavailable:
+        return {"content": translator.get_text("all_services_busy", lang_code), "sources": []}
     except Exception as e:
-        print(f"Error in RAG process: {e}")
+        logger.error("Error in RAG process: %s", e)
         return {"content": translator.get_text("stream_error", lang_code), "sources": []}
 
-async def get_groq_vision_response(user_id: int, prompt_text: str, base64_images: list, supabase_client, translator: Translator, lang_code: str):
+async def get_groq_vision_response(user_id: int, prompt_text: str, base64_images: list, supabase_client, translator: Translator, lang_code: str, feature: str = FEATURE_PRIVATE):
     if not groq_api_keys:
         return {"content": translator.get_text("api_key_not_configured", lang_code)}
     
-    active_model_id = await get_user_model(supabase_client, user_id)
+    selected_model_id = await get_user_model(supabase_client, user_id)
+    if selected_model_id == AUTO_MODEL:
+        selected_model_id = model_router.route(get_models_config(), prompt_text, has_images=True)
+    active_model_id, fell_back = select_model(selected_model_id, require_vision=True)
+    fallback = {"fallback_from": selected_model_id, "fallback_to": active_model_id} if fell_back else {}
     content_parts = [{"type": "text", "text": prompt_text}]
     for b64_img in base64_images:
         content_parts.append({
@@ -201,16 +566,8 @@ async def get_groq_vision_response(user_id: int, prompt_text: str, base64_images
         })
     messages = [{"role": "user", "content": content_parts}]
     api_params = { "temperature": 0.5, "max_tokens": 4096 }
-    for _ in range(len(groq_api_keys)):
-        current_key = next(groq_key_cycler)
-        client = AsyncGroq(api_key=current_key)
-        try:
-            completion = await client.chat.completions.create(messages=messages, model=active_model_id, **api_params)
-            return {"content": completion.choices[0].message.content}
-        except RateLimitError:
-            continue
-        except Exception as e:
-            print(f"An unexpected error occurred: {e}")
-            return {"content": translator.get_text("stream_error", lang_code)}
-            
-    return {"content": translator.get_text("all_services_busy", lang_code)}
\ No newline at end of file
+    try:
+        completion = await create_chat_completion(messages, active_model_id, feature, user_id, **api_params)
+    except LLMUnavailable:
+        return {"content": translator.get_text("all_services_busy", lang_code)}
+    return {"content": completion.choices[0].message.content, **fallback}
\ No newline at end of file
@@ -1,7 +1,7 @@
 from aiogram import Router, F, Bot
 from aiogram.types import Message
 from aiogram.filters import Command, CommandObject
-from supabase import Client
+from modules.storage import Storage
 
 from modules.translator import Translator
 from modules.core_logic import process_text_message, process_photo_message
@@ -9,7 +9,7 @@ from modules.core_logic import process_text_message, process_photo_message
 router = Router()
 
 @router.message(Command("ai", "chat", "ask"))
-async def handle_group_command(message: Message, command: CommandObject, supabase: Client, translator: Translator, lang_code: str):
+async def handle_group_command(message: Message, command: CommandObject, supabase: Storage, translator: Translator, lang_code: str):
     
     # Menangani Teks
     if command.args:
@@ -32,7 +32,7 @@ async def handle_group_command(message: Message, command: CommandObject, supabas
     F.reply_to_message, # Filter: Hanya aktif jika ini adalah balasan
     F.chat.type.in_({'group', 'supergroup'}) # Filter: Hanya di grup
 )
-async def handle_group_reply(message: Message, bot: Bot, supabase: Client, translator: Translator, lang_code: str):
+async def handle_group_reply(message: Message, bot: Bot, supabase: Storage, translator: Translator, lang_code: str):
     # Periksa apakah pesan yang dibalas adalah pesan dari bot itu sendiri
     if message.reply_to_message.from_user.id == bot.id:
         
@@ -1,6 +1,8 @@
 import re
 from bs4 import BeautifulSoup
 
+from modules.metrics import HTML_SECONDS
+
 ALLOWED_TAGS = [
     "b", "strong", "i", "em", "u", "ins", "s", "strike", "del",
     "span", "tg-spoiler", "a", "tg-emoji", "code", "pre", "blockquote"
@@ -68,7 +70,8 @@ def sanitize_html_v2(html_content: str) -> str:
 def process_telegram_html(text: str) -> str:
     if not text:
         return ""
-    markdown_converted = convert_common_markdown_to_html(text)
-    code_converted = convert_markdown_code_to_html(markdown_converted)
-    sanitized = sanitize_html_v2(code_converted)
+    with HTML_SECONDS.time():
+        markdown_converted = convert_common_markdown_to_html(text)
+        code_converted = convert_markdown_code_to_html(markdown_converted)
+        sanitized = sanitize_html_v2(code_converted)
     return sanitized
\ No newline at end of file
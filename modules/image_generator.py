@@ -1,14 +1,16 @@
 import os
 import itertools
-import requests
+import logging
 from aiogram import Router
 from aiogram.types import Message
 from aiogram.filters import Command, CommandObject
-from supabase import Client
+from modules.storage import Storage
 
 from modules.translator import Translator
 from modules.limit_handler import check_and_handle_limit, increment_chat_count
 
+logger = logging.getLogger(__name__)
+
 # --- Konfigurasi Rotasi Kunci API ---
 glif_api_keys_str = os.environ.get("GLIF_API_KEYS", "")
 glif_api_keys = [key.strip() for key in glif_api_keys_str.split(',') if key.strip()]
@@ -18,6 +20,8 @@ router = Router()
 
 def generate_image_with_glif(prompt: str):
     """Memanggil Glif Simple API untuk membuat gambar."""
+    import requests  # dimuat saat pertama dipakai, bukan saat startup
+
     if not glif_api_keys:
         return {"error": "API keys for Glif are not configured."}
 
@@ -46,14 +50,14 @@ def generate_image_with_glif(prompt: str):
         return {"url": image_url}
         
     except requests.RequestException as e:
-        print(f"Error calling Glif API: {e}")
+        logger.error("Error calling Glif API: %s", e)
         return {"error": "Failed to connect to the image generation service."}
     except Exception as e:
-        print(f"An unexpected error occurred in generate_image_with_glif: {e}")
+        logger.error("An unexpected error occurred in generate_image_with_glif: %s", e)
         return {"error": "An unexpected error occurred."}
 
 @router.message(Command("img", "imagine"))
-async def handle_image_generation(message: Message, command: CommandObject, supabase: Client, translator: Translator, lang_code: str):
+async def handle_image_generation(message: Message, command: CommandObject, supabase: Storage, translator: Translator, lang_code: str):
     if not command.args:
         await message.reply(translator.get_text("img_prompt_required", lang_code))
         return
@@ -85,5 +89,5 @@ async def handle_image_generation(message: Message, command: CommandObject, supa
         await thinking_message.delete()
         await increment_chat_count(supabase, user_id)
     except Exception as e:
-        print(f"Error sending photo: {e}")
+        logger.error("Error sending photo: %s", e)
         await thinking_message.edit_text(translator.get_text("img_send_error", lang_code))
\ No newline at end of file
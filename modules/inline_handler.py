@@ -1,77 +1,116 @@
 import os
 import uuid
 import asyncio
+import logging
 from aiogram import Router, F, Bot
 from aiogram.types import (
     InlineQuery, ChosenInlineResult, InlineQueryResultArticle, InputTextMessageContent, User
 )
-from supabase import Client
+from modules.storage import Storage
 from cachetools import TTLCache
 
 from modules.translator import Translator
 from modules.limit_handler import check_and_handle_limit, increment_chat_count
 from modules.core_logic import generate_ai_response
 from modules.html_parser import escape_html
+from modules.state_backend import get_state_backend
+from modules.log_shipper import log_shipper
+
+logger = logging.getLogger(__name__)
 
 router = Router()
 
-# --- Caching & Debouncing Setup ---
-CACHE = TTLCache(maxsize=100, ttl=600)
+# --- Debouncing Setup ---
+# Penanda query terbaru disimpan di state backend bersama, sehingga query
+# lama di worker lain berhenti sendiri. Jawaban di-cache oleh answer_cache.
 DEBOUNCE_TASKS = {}
-DEBOUNCE_DELAY = 5.0
 
-async def send_log_to_channel(bot: Bot, user: User, query: str, answer: str):
-    log_channel_id_str = os.getenv("LOG_CHANNEL_ID")
-    if not log_channel_id_str:
+# Jeda debounce menyesuaikan ritme mengetik tiap pengguna
+DEBOUNCE_MIN = float(os.getenv("INLINE_DEBOUNCE_MIN", 0.6))
+DEBOUNCE_MAX = float(os.getenv("INLINE_DEBOUNCE_MAX", 3.0))
+DEBOUNCE_FACTOR = 1.5
+TYPING_CADENCE = TTLCache(maxsize=10000, ttl=300)  # user_id -> (waktu query terakhir, rata-rata jeda)
+
+# Telegram menolak jawaban untuk query inline yang sudah terlalu lama
+INLINE_ANSWER_BUDGET = float(os.getenv("INLINE_ANSWER_BUDGET", 9.0))
+SUPERSEDE_POLL_INTERVAL = 0.5
+
+def _latest_query_key(user_id: int) -> str:
+    return f"inline:latest:{user_id}"
+
+def get_debounce_delay(user_id: int, now: float) -> float:
+    """Updates the user's typing cadence and returns the debounce delay for this keystroke."""
+    last_seen, average_gap = TYPING_CADENCE.get(user_id, (None, DEBOUNCE_MAX / DEBOUNCE_FACTOR))
+    if last_seen is not None:
+        gap = now - last_seen
+        # Jeda panjang berarti pengguna mulai mengetik query baru, bukan ritme mengetik
+        if gap < DEBOUNCE_MAX:
+            average_gap = 0.7 * average_gap + 0.3 * gap
+    TYPING_CADENCE[user_id] = (now, average_gap)
+    return min(DEBOUNCE_MAX, max(DEBOUNCE_MIN, average_gap * DEBOUNCE_FACTOR))
+
+async def _is_superseded(user_id: int, inline_query_id: str) -> bool:
+    latest_query_id = await get_state_backend().get(_latest_query_key(user_id))
+    return bool(latest_query_id) and latest_query_id != inline_query_id
+
+async def _cancel_when_superseded(task: asyncio.Task, user_id: int, inline_query_id: str):
+    """Cancels an in-flight generation as soon as a newer query from the same user is recorded."""
+    while not task.done():
+        await asyncio.sleep(SUPERSEDE_POLL_INTERVAL)
+        if await _is_superseded(user_id, inline_query_id):
+            task.cancel()
+            return
+
+def _forget_task(user_id: int, task: asyncio.Task):
+    if DEBOUNCE_TASKS.get(user_id) is task:
+        del DEBOUNCE_TASKS[user_id]
+
+def send_log_to_channel(user: User, query: str, answer: str):
+    """Queues an inline log entry; the log shipper sends it later as part of a digest."""
+    if not os.getenv("LOG_CHANNEL_ID"):
         return # Jangan lakukan apa-apa jika LOG_CHANNEL_ID tidak diatur
 
-    try:
-        log_channel_id = int(log_channel_id_str)
-        user_info = f"{escape_html(user.full_name)} (<code>{user.id}</code>)"
-        answer_snippet = (answer[:200] + '...') if len(answer) > 200 else answer
-        
-        log_message = (
-            f"<b>✅ Inline Query Success</b>\n\n"
-            f"👤 <b>User:</b> {user_info}\n"
-            f"📝 <b>Query:</b> <pre>{escape_html(query)}</pre>\n"
-            f"🤖 <b>Answer Snippet:</b>\n<pre>{escape_html(answer_snippet)}</pre>"
-        )
-        
-        await bot.send_message(log_channel_id, log_message)
-    except (ValueError, TypeError):
-        print(f"Error: LOG_CHANNEL_ID '{log_channel_id_str}' is not a valid integer.")
-    except Exception as e:
-        print(f"Error sending log to channel: {e}")
+    user_info = f"{escape_html(user.full_name)} (<code>{user.id}</code>)"
+    answer_snippet = (answer[:200] + '...') if len(answer) > 200 else answer
+    log_shipper.ship(
+        f"<b>✅ Inline Query Success</b>\n"
+        f"👤 <b>User:</b> {user_info}\n"
+        f"📝 <b>Query:</b> <pre>{escape_html(query)}</pre>\n"
+        f"🤖 <b>Answer Snippet:</b>\n<pre>{escape_html(answer_snippet)}</pre>"
+    )
 
 @router.inline_query()
-async def handle_inline_query(inline_query: InlineQuery, supabase: Client, translator: Translator, lang_code: str):
+async def handle_inline_query(inline_query: InlineQuery, supabase: Storage, translator: Translator, lang_code: str):
     query = inline_query.query.strip()
     user_id = inline_query.from_user.id
+    received_at = asyncio.get_running_loop().time()
+    delay = get_debounce_delay(user_id, received_at)
 
     if user_id in DEBOUNCE_TASKS:
         DEBOUNCE_TASKS[user_id].cancel()
 
+    # Tandai query ini sebagai yang terbaru, query lama di worker lain akan berhenti sendiri
+    await get_state_backend().set(_latest_query_key(user_id), inline_query.id, ttl=60)
+
     if len(query) < 4:
         await inline_query.answer([], cache_time=0)
         return
 
     task = asyncio.create_task(
-        process_debounced_query(inline_query, supabase, translator, lang_code)
+        process_debounced_query(inline_query, supabase, translator, lang_code, received_at, delay)
     )
     DEBOUNCE_TASKS[user_id] = task
+    task.add_done_callback(lambda finished: _forget_task(user_id, finished))
 
-async def process_debounced_query(inline_query: InlineQuery, supabase: Client, translator: Translator, lang_code: str):
+async def process_debounced_query(inline_query: InlineQuery, supabase: Storage, translator: Translator, lang_code: str, received_at: float, delay: float):
+    generation = None
     try:
-        await asyncio.sleep(DEBOUNCE_DELAY)
+        await asyncio.sleep(delay)
         
-        bot = inline_query.bot
         query = inline_query.query.strip()
         user = inline_query.from_user
 
-        if query in CACHE:
-            cached_results = CACHE[query]
-            await inline_query.answer(cached_results, cache_time=0, is_personal=True)
-            await send_log_to_channel(bot, user, query, "(from cache)")
+        if await _is_superseded(user.id, inline_query.id):
             return
 
         is_limited = await check_and_handle_limit(supabase, user.id)
@@ -89,7 +128,31 @@ async def process_debounced_query(inline_query: InlineQuery, supabase: Client, t
             await inline_query.answer(limit_result, cache_time=0, is_personal=True)
             return
 
-        response_data = await generate_ai_response(user.id, query, supabase, translator, lang_code)
+        generation = asyncio.create_task(generate_ai_response(user.id, query, supabase, translator, lang_code))
+        watcher = asyncio.create_task(_cancel_when_superseded(generation, user.id, inline_query.id))
+        try:
+            remaining = INLINE_ANSWER_BUDGET - (asyncio.get_running_loop().time() - received_at)
+            done, _ = await asyncio.wait({generation}, timeout=max(0.0, remaining))
+        finally:
+            watcher.cancel()
+
+        if not done:
+            timeout_result = [
+                InlineQueryResultArticle(
+                    id=str(uuid.uuid4()),
+                    title=translator.get_text("inline_timeout_title", lang_code),
+                    input_message_content=InputTextMessageContent(
+                        message_text=translator.get_text("inline_timeout_text", lang_code)
+                    ),
+                    description=query[:60]
+                )
+            ]
+            await inline_query.answer(timeout_result, cache_time=0, is_personal=True)
+            # Biarkan generasi selesai agar jawabannya masuk cache untuk query yang sama berikutnya
+            await generation
+            return
+
+        response_data = generation.result()
         final_text = response_data.get("final_text")
 
         results = []
@@ -109,8 +172,11 @@ async def process_debounced_query(inline_query: InlineQuery, supabase: Client, t
                     description=f"Jawaban untuk: \"{query}\". Klik untuk mengirim."
                 )
             )
-            await increment_chat_count(supabase, user.id)
-            await send_log_to_channel(bot, user, query, final_text)
+            if response_data.get("cached"):
+                send_log_to_channel(user, query, "(from cache)")
+            else:
+                await increment_chat_count(supabase, user.id)
+                send_log_to_channel(user, query, final_text)
         else:
             results.append(
                  InlineQueryResultArticle(
@@ -123,13 +189,15 @@ async def process_debounced_query(inline_query: InlineQuery, supabase: Client, t
                 )
             )
         
-        CACHE[query] = results
         await inline_query.answer(results, cache_time=0, is_personal=True)
 
     except asyncio.CancelledError:
         pass
     except Exception as e:
-        print(f"Error in process_debounced_query: {e}")
+        logger.error("Error in process_debounced_query: %s", e)
+    finally:
+        if generation and not generation.done():
+            generation.cancel()
 
 @router.chosen_inline_result()
 async def handle_chosen_inline_result(chosen_inline_result: ChosenInlineResult):
@@ -1,14 +1,15 @@
 import os
 from datetime import datetime
+from typing import Optional
 import pytz
-from supabase import Client
+from modules.storage import Storage
 from modules.supabase_handler import get_user_chat_info, reset_user_chat_count, increment_user_chat_count
 
-async def check_and_handle_limit(supabase: Client, user_id: int) -> bool:
+async def get_remaining_chats(supabase: Storage, user_id: int) -> Optional[int]:
     """
-    Checks if the user is over their daily limit.
-    Resets the count if it's a new day.
-    Returns True if the user is over the limit, False otherwise.
+    Returns how many messages the user can still send today (0 when the
+    limit is reached), or None when the user is unknown. Resets the count
+    if it's a new day.
     """
     try:
         limit = int(os.environ.get("DAILY_CHAT_LIMIT", 20))
@@ -17,7 +18,7 @@ async def check_and_handle_limit(supabase: Client, user_id: int) -> bool:
 
     user_info = await get_user_chat_info(supabase, user_id)
     if not user_info:
-        return False
+        return None
 
     today_utc = datetime.now(pytz.utc).date()
     last_chat_date_str = user_info.get('last_chat_date')
@@ -31,11 +32,19 @@ async def check_and_handle_limit(supabase: Client, user_id: int) -> bool:
 
     if last_chat_date is None or last_chat_date < today_utc:
         await reset_user_chat_count(supabase, user_id, today_utc)
-        return False
+        return limit
 
     chat_count = user_info.get('chat_count', 0)
-    return chat_count >= limit
+    return max(0, limit - chat_count)
+
+async def check_and_handle_limit(supabase: Storage, user_id: int) -> bool:
+    """
+    Checks if the user is over their daily limit.
+    Resets the count if it's a new day.
+    Returns True if the user is over the limit, False otherwise.
+    """
+    return await get_remaining_chats(supabase, user_id) == 0
 
-async def increment_chat_count(supabase: Client, user_id: int):
-    """Increments the user's chat count for the day."""
-    await increment_user_chat_count(supabase, user_id)
+async def increment_chat_count(supabase: Storage, user_id: int, amount: int = 1):
+    """Increments the user's chat count for the day by the number of messages answered."""
+    await increment_user_chat_count(supabase, user_id, amount)
@@ -0,0 +1,162 @@
+import asyncio
+import heapq
+import itertools
+import os
+import time
+from collections import Counter, deque
+from contextlib import asynccontextmanager
+from typing import Any, Dict
+
+from modules.request_context import stage_timeout
+
+# --- Konfigurasi Antrean LLM ---
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except (ValueError, TypeError):
+        return default
+
+LLM_CONCURRENCY_PER_KEY = int(_env_float("LLM_CONCURRENCY_PER_KEY", 4))  # panggilan bersamaan per kunci Groq
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_GROUP = 1
+PRIORITY_BACKGROUND = 2
+
+# Batas waktu tunggu di antrean per kelas prioritas (detik)
+QUEUE_DEADLINES = {
+    PRIORITY_INTERACTIVE: _env_float("LLM_QUEUE_DEADLINE_INTERACTIVE", 6.0),
+    PRIORITY_GROUP: _env_float("LLM_QUEUE_DEADLINE_GROUP", 15.0),
+    PRIORITY_BACKGROUND: _env_float("LLM_QUEUE_DEADLINE_BACKGROUND", 120.0),
+}
+
+# Fitur pemanggil LLM dan kelas prioritasnya
+FEATURE_INLINE = "inline"
+FEATURE_PRIVATE = "private"
+FEATURE_BUSINESS = "business"
+FEATURE_WEB = "web"
+FEATURE_GROUP = "group"
+FEATURE_SUMMARY = "summary"
+
+FEATURE_PRIORITY = {
+    FEATURE_INLINE: PRIORITY_INTERACTIVE,
+    FEATURE_PRIVATE: PRIORITY_INTERACTIVE,
+    FEATURE_BUSINESS: PRIORITY_INTERACTIVE,
+    FEATURE_WEB: PRIORITY_INTERACTIVE,
+    FEATURE_GROUP: PRIORITY_GROUP,
+    FEATURE_SUMMARY: PRIORITY_BACKGROUND,
+}
+
+
+class LLMOverloaded(Exception):
+    """Raised when a request is shed instead of waiting past its queue deadline."""
+
+
+class LLMScheduler:
+    """
+    Bounds concurrent LLM calls across every feature. Requests beyond the
+    limit wait in a priority queue (interactive before groups before
+    background jobs). A request is shed up front when its estimated wait
+    already exceeds its class deadline, and dropped if it is still queued
+    when the deadline passes.
+    """
+
+    def __init__(self, concurrency_per_key: int, deadlines: Dict[int, float]):
+        self.concurrency_per_key = concurrency_per_key
+        self.max_concurrency = max(1, concurrency_per_key)
+        self.deadlines = deadlines
+        self._active = 0
+        self._waiters = []
+        self._counter = itertools.count()
+        self._service_time = 2.0  # EWMA lama satu panggilan, untuk memperkirakan waktu tunggu
+
+        # --- Metrik ---
+        self.admitted = Counter()
+        self.shed = Counter()
+        self._wait_times = deque(maxlen=1000)
+
+    def set_key_pool(self, key_count: int):
+        """Scales the concurrency limit with the number of API keys in rotation."""
+        self.max_concurrency = max(1, self.concurrency_per_key * max(1, key_count))
+
+    def _queued_ahead(self, priority: int) -> int:
+        return sum(1 for waiter_priority, _, future in self._waiters if waiter_priority <= priority and not future.done())
+
+    def _queue_depth(self) -> int:
+        # Penunggu yang sudah timeout/dibatalkan tetap di heap sampai dilewati _release
+        return sum(1 for _, _, future in self._waiters if not future.done())
+
+    def estimated_wait(self, priority: int) -> float:
+        if self._active < self.max_concurrency and not self._queue_depth():
+            return 0.0
+        return (self._queued_ahead(priority) + 1) * self._service_time / self.max_concurrency
+
+    def _release(self):
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)  # slot diteruskan langsung ke penunggu
+                return
+        self._active -= 1
+
+    async def _acquire(self, feature: str):
+        priority = FEATURE_PRIORITY.get(feature, PRIORITY_INTERACTIVE)
+        if self._active < self.max_concurrency and not self._queue_depth():
+            self._active += 1
+            return
+
+        # Tenggat antrean tidak boleh melewati tenggat permintaan itu sendiri
+        deadline = stage_timeout(self.deadlines.get(priority, QUEUE_DEADLINES[PRIORITY_INTERACTIVE]))
+        if deadline <= 0 or self.estimated_wait(priority) > deadline:
+            self.shed[feature] += 1
+            raise LLMOverloaded(f"LLM queue for '{feature}' would exceed its {deadline:.0f}s deadline")
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._counter), future))
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(future, timeout=deadline)
+        except asyncio.TimeoutError:
+            self.shed[feature] += 1
+            raise LLMOverloaded(f"LLM request for '{feature}' waited past its {deadline:.0f}s deadline")
+        except asyncio.CancelledError:
+            # Slot yang sudah diberikan harus dikembalikan walau pemanggil dibatalkan
+            if future.done() and not future.cancelled():
+                self._release()
+            raise
+        self._wait_times.append(time.monotonic() - started)
+
+    def try_acquire(self, feature: str) -> bool:
+        """Takes a free slot without queueing (for optional extra calls such as hedges); pair with release()."""
+        if self._active < self.max_concurrency and not self._queue_depth():
+            self._active += 1
+            self.admitted[feature] += 1
+            return True
+        return False
+
+    def release(self):
+        self._release()
+
+    @asynccontextmanager
+    async def slot(self, feature: str):
+        await self._acquire(feature)
+        self.admitted[feature] += 1
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self._service_time = 0.8 * self._service_time + 0.2 * (time.monotonic() - started)
+            self._release()
+
+    def stats(self) -> Dict[str, Any]:
+        waits = sorted(self._wait_times)
+        return {
+            "active": self._active,
+            "max_concurrency": self.max_concurrency,
+            "queue_depth": self._queue_depth(),
+            "service_time": self._service_time,
+            "admitted": dict(self.admitted),
+            "shed": dict(self.shed),
+            "wait_time_p95": waits[int(len(waits) * 0.95)] if waits else 0.0,
+        }
+
+llm_scheduler = LLMScheduler(LLM_CONCURRENCY_PER_KEY, QUEUE_DEADLINES)
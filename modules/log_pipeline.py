@@ -0,0 +1,198 @@
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from modules.request_context import current_correlation_id
+
+logger = logging.getLogger(__name__)
+
+# --- Konfigurasi Logging ---
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_LEVELS = os.getenv("LOG_LEVELS", "")        # per modul, misalnya "modules.groq_handler=DEBUG,aiogram.event=WARNING"
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")    # json atau text
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10000))
+LOG_SAMPLE_WINDOW = float(os.getenv("LOG_SAMPLE_WINDOW", 60.0))  # detik per jendela sampling
+LOG_SAMPLE_BURST = int(os.getenv("LOG_SAMPLE_BURST", 5))          # baris identik yang lolos per jendela
+MAX_SAMPLER_KEYS = 2000
+
+TEXT_FORMAT = "%(asctime)s %(levelname)s %(name)s [%(correlation_id)s] %(message)s"
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, ready for a log collector."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if record.correlation_id != "-":
+            entry["correlation_id"] = record.correlation_id
+        if record.suppressed:
+            entry["suppressed"] = record.suppressed
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        if record.stack_info:
+            entry["stack"] = record.stack_info
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        if record.suppressed:
+            line += f" (+{record.suppressed} similar suppressed)"
+        return line
+
+
+class RepeatSampler(logging.Filter):
+    """
+    Lets the first `burst` copies of a WARNING-or-worse line through per
+    `window` seconds and counts the rest; the count is attached to the
+    first copy of the next window. Lines are compared by logger, level and
+    message template, so arguments must be passed lazily (%s), not formatted in.
+    """
+
+    def __init__(self, window: float, burst: int):
+        super().__init__()
+        self.window = window
+        self.burst = max(1, burst)
+        self._seen: Dict[tuple, list] = {}  # kunci -> [awal jendela, jumlah]
+        self._lock = threading.Lock()
+        self.suppressed = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.suppressed = 0
+        if record.levelno < logging.WARNING:
+            return True
+
+        key = (record.name, record.levelno, str(record.msg))
+        now = time.monotonic()
+        with self._lock:
+            state = self._seen.get(key)
+            if state is None or now - state[0] >= self.window:
+                if state is not None:
+                    record.suppressed = max(0, state[1] - self.burst)
+                elif len(self._seen) >= MAX_SAMPLER_KEYS:
+                    self._seen = {k: v for k, v in self._seen.items() if now - v[0] < self.window}
+                self._seen[key] = [now, 1]
+                return True
+            state[1] += 1
+            if state[1] <= self.burst:
+                return True
+            self.suppressed += 1
+            return False
+
+
+class LogQueueHandler(logging.handlers.QueueHandler):
+    """
+    Hands records to the writer thread without blocking the caller. The
+    message, traceback and correlation ID are resolved here, in the calling
+    thread; when the queue is full the record is dropped and counted.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        record.correlation_id = current_correlation_id() or "-"
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class LogPipeline:
+    """
+    Routes all `logging` output through a bounded queue to a background
+    thread that writes to stdout, so a slow stdout pipe never stalls the
+    event loop.
+    """
+
+    def __init__(self, queue_size: int, sample_window: float, sample_burst: int):
+        self._queue: queue.Queue = queue.Queue(queue_size)
+        self.handler = LogQueueHandler(self._queue)
+        self.sampler = RepeatSampler(sample_window, sample_burst)
+        self.handler.addFilter(self.sampler)
+        self._listener: Optional[logging.handlers.QueueListener] = None
+
+    def start(self, level: str = LOG_LEVEL, levels: str = LOG_LEVELS, log_format: str = LOG_FORMAT):
+        if self._listener is not None:
+            return
+        stream = logging.StreamHandler(sys.stdout)
+        stream.setFormatter(JsonFormatter() if log_format == "json" else TextFormatter(TEXT_FORMAT))
+
+        # Konfigurasi disusun dulu; level yang salah ketik tidak boleh menggagalkan start di tengah jalan
+        invalid = []
+        root_level = level.strip().upper()
+        if not is_level(root_level):
+            invalid.append(f"LOG_LEVEL={level}")
+            root_level = "INFO"
+        module_levels = parse_levels(levels, invalid)
+
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(self.handler)
+        root.setLevel(root_level)
+        for name, module_level in module_levels.items():
+            logging.getLogger(name).setLevel(module_level)
+
+        self._listener = logging.handlers.QueueListener(self._queue, stream)
+        self._listener.start()
+        if invalid:
+            logger.warning("Ignoring unknown log levels: %s", ", ".join(invalid))
+
+    def stop(self):
+        """Writes what is still queued and stops the writer thread."""
+        if self._listener is None:
+            return
+        self._listener.stop()
+        self._listener = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": self._queue.qsize(),
+            "dropped": self.handler.dropped,
+            "suppressed": self.sampler.suppressed,
+        }
+
+
+def is_level(level: str) -> bool:
+    """True for a level name the logging module knows (DEBUG, INFO, ... or a registered custom name)."""
+    return isinstance(logging.getLevelName(level), int)
+
+def parse_levels(spec: str, invalid: Optional[List[str]] = None) -> Dict[str, str]:
+    """
+    Parses "logger=LEVEL,logger=LEVEL" into a dict, skipping malformed
+    entries and unknown levels; skipped items are appended to `invalid`.
+    """
+    levels = {}
+    for item in spec.split(","):
+        name, _, level = item.partition("=")
+        name, level = name.strip(), level.strip().upper()
+        if name and level and is_level(level):
+            levels[name] = level
+        elif item.strip() and invalid is not None:
+            invalid.append(item.strip())
+    return levels
+
+log_pipeline = LogPipeline(LOG_QUEUE_SIZE, LOG_SAMPLE_WINDOW, LOG_SAMPLE_BURST)
@@ -0,0 +1,140 @@
+import asyncio
+import logging
+import os
+from collections import deque
+from typing import Any, Dict, Optional
+
+from aiogram import Bot
+
+logger = logging.getLogger(__name__)
+
+# --- Konfigurasi Pengiriman Log ---
+LOG_FLUSH_INTERVAL = float(os.getenv("LOG_FLUSH_INTERVAL", 10.0))
+LOG_MAX_QUEUE = int(os.getenv("LOG_MAX_QUEUE", 500))
+LOG_SAMPLE_EVERY = int(os.getenv("LOG_SAMPLE_EVERY", 5))  # saat antrean setengah penuh, simpan 1 dari N event
+MAX_DIGEST_LENGTH = 3800  # sisakan ruang dari batas 4096 karakter Telegram
+
+
+class LogShipper:
+    """
+    Buffers log-channel events and sends them as combined digest messages
+    on a size or time trigger. Shipping never blocks the caller: under
+    backpressure events are sampled and, when the buffer is full, dropped.
+    """
+
+    def __init__(self, flush_interval: float, max_queue: int, sample_every: int):
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.sample_every = max(1, sample_every)
+        self._queue = deque()
+        self._queued_chars = 0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._bot: Optional[Bot] = None
+        self._sample_counter = 0
+        self._reported_losses = 0
+
+        # --- Metrik ---
+        self.shipped = 0
+        self.dropped = 0
+        self.sampled_out = 0
+        self.digests_sent = 0
+        self.send_failures = 0
+
+    def ship(self, entry: str):
+        """Queues a pre-formatted HTML log entry without waiting."""
+        depth = len(self._queue)
+        if depth >= self.max_queue:
+            self.dropped += 1
+            return
+        if depth >= self.max_queue // 2:
+            self._sample_counter += 1
+            if self._sample_counter % self.sample_every:
+                self.sampled_out += 1
+                return
+
+        self._queue.append(entry)
+        self._queued_chars += len(entry)
+        self.shipped += 1
+        if self._queued_chars >= MAX_DIGEST_LENGTH and self._wakeup:
+            self._wakeup.set()
+
+    def _take_digest(self) -> str:
+        entries = []
+        length = 0
+        while self._queue:
+            entry = self._queue[0]
+            if entries and length + len(entry) + 2 > MAX_DIGEST_LENGTH:
+                break
+            self._queue.popleft()
+            self._queued_chars -= len(entry)
+            entries.append(entry[:MAX_DIGEST_LENGTH])
+            length += len(entry) + 2
+
+        header = f"<b>📋 Log Digest</b> ({len(entries)} events"
+        losses = self.dropped + self.sampled_out
+        if losses > self._reported_losses:
+            header += f", {losses - self._reported_losses} skipped under load"
+            self._reported_losses = losses
+        header += ")"
+        return header + "\n\n" + "\n\n".join(entries)
+
+    async def flush(self):
+        log_channel_id_str = os.getenv("LOG_CHANNEL_ID")
+        if not log_channel_id_str or not self._bot:
+            self._queue.clear()
+            self._queued_chars = 0
+            return
+
+        try:
+            log_channel_id = int(log_channel_id_str)
+        except (ValueError, TypeError):
+            logger.error("LOG_CHANNEL_ID '%s' is not a valid integer.", log_channel_id_str)
+            self._queue.clear()
+            self._queued_chars = 0
+            return
+
+        while self._queue:
+            digest = self._take_digest()
+            try:
+                await self._bot.send_message(log_channel_id, digest, disable_web_page_preview=True)
+                self.digests_sent += 1
+            except Exception as e:
+                self.send_failures += 1
+                logger.error("Error sending log digest to channel: %s", e)
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def start(self, bot: Bot):
+        self._bot = bot
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queue_depth": len(self._queue),
+            "shipped": self.shipped,
+            "dropped": self.dropped,
+            "sampled_out": self.sampled_out,
+            "digests_sent": self.digests_sent,
+            "send_failures": self.send_failures,
+        }
+
+log_shipper = LogShipper(LOG_FLUSH_INTERVAL, LOG_MAX_QUEUE, LOG_SAMPLE_EVERY)
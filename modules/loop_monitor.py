@@ -0,0 +1,130 @@
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import Counter, deque
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from modules.metrics import LOOP_LAG_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# --- Konfigurasi Pemantau Event Loop ---
+LOOP_LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL", 0.1))     # jarak detak heartbeat (detik)
+LOOP_LAG_THRESHOLD = float(os.getenv("LOOP_LAG_THRESHOLD", 0.25))  # lag di atas ini dianggap pemblokiran
+LOOP_LAG_STRICT = os.getenv("LOOP_LAG_STRICT", "0") == "1"         # mode CI: gagal saat berhenti jika ada pemblokiran
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+
+class LoopBlockedError(AssertionError):
+    """Raised in strict mode when the event loop was blocked during the run."""
+
+
+class LoopLagMonitor:
+    """
+    Measures event-loop lag with a heartbeat task. A watchdog thread
+    notices when the heartbeat stalls past LOOP_LAG_THRESHOLD, samples
+    the loop thread's stack and records the project call site that is
+    blocking it, so synchronous calls hidden in async code show up.
+    """
+
+    def __init__(self, interval: float, threshold: float, strict: bool):
+        self.interval = interval
+        self.threshold = threshold
+        self.strict = strict
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        self._loop_thread_id: Optional[int] = None
+        self._last_beat = time.monotonic()
+        self._stall_captured = False
+
+        # --- Metrik ---
+        self.lags = deque(maxlen=2000)
+        self.blocking_sites = Counter()
+        self.last_stacks: Dict[str, str] = {}
+        self.stalls = 0
+
+    async def _heartbeat(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(0.0, now - expected)
+            self.lags.append(lag)
+            LOOP_LAG_SECONDS.observe(lag)
+            self._last_beat = now
+            self._stall_captured = False
+
+    def _watchdog(self):
+        while not self._stopping.wait(self.interval / 2):
+            stalled_for = time.monotonic() - self._last_beat - self.interval
+            if stalled_for > self.threshold and not self._stall_captured:
+                self._stall_captured = True
+                self._capture(stalled_for)
+
+    def _capture(self, stalled_for: float):
+        frame = sys._current_frames().get(self._loop_thread_id)
+        if frame is None:
+            return
+        stack = traceback.extract_stack(frame)
+        site = self._blocking_site(stack)
+        self.stalls += 1
+        self.blocking_sites[site] += 1
+        self.last_stacks[site] = "".join(traceback.format_list(stack[-12:]))
+        logger.warning("Event loop blocked for %.2fs+ at %s\n%s", stalled_for, site, self.last_stacks[site])
+
+    def _blocking_site(self, stack: List[traceback.FrameSummary]) -> str:
+        # Frame proyek terdalam adalah pemanggil yang perlu diperbaiki, bukan pustakanya
+        for frame in reversed(stack):
+            path = Path(frame.filename).resolve()
+            if PROJECT_ROOT in path.parents and path != Path(__file__).resolve():
+                return f"{path.relative_to(PROJECT_ROOT)}:{frame.lineno} in {frame.name}"
+        innermost = stack[-1]
+        return f"{innermost.filename}:{innermost.lineno} in {innermost.name}"
+
+    async def start(self):
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stopping.clear()
+        self._task = asyncio.create_task(self._heartbeat())
+        self._thread = threading.Thread(target=self._watchdog, name="loop-lag-watchdog", daemon=True)
+        self._thread.start()
+
+    async def stop(self):
+        self._stopping.set()
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self.strict:
+            self.assert_no_blocking()
+
+    def assert_no_blocking(self):
+        if self.blocking_sites:
+            sites = "\n".join(f"  {count}x {site}" for site, count in self.blocking_sites.most_common())
+            raise LoopBlockedError(f"Event loop was blocked {self.stalls} time(s):\n{sites}")
+
+    def _quantile(self, q: float) -> float:
+        ordered = sorted(self.lags)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * q))] if ordered else 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "lag_p50": self._quantile(0.50),
+            "lag_p95": self._quantile(0.95),
+            "lag_p99": self._quantile(0.99),
+            "lag_max": max(self.lags, default=0.0),
+            "stalls": self.stalls,
+            "blocking_sites": dict(self.blocking_sites),
+        }
+
+loop_monitor = LoopLagMonitor(LOOP_LAG_INTERVAL, LOOP_LAG_THRESHOLD, LOOP_LAG_STRICT)
@@ -1,3 +1,4 @@
+import logging
 import os
 from typing import Callable, Awaitable, Dict, Any
 
@@ -7,6 +8,8 @@ from aiogram.utils.keyboard import InlineKeyboardBuilder
 from aiogram.enums import ChatMemberStatus
 from modules.translator import Translator # <-- Impor baru
 
+logger = logging.getLogger(__name__)
+
 class MembershipMiddleware(BaseMiddleware):
     async def __call__(
         self,
@@ -43,7 +46,7 @@ class MembershipMiddleware(BaseMiddleware):
                     not_joined_channels.append(channel)
             except Exception:
                 not_joined_channels.append(channel)
-                print(f"Warning: Bot could not access channel '{channel}'. Make sure it is an admin.")
+                logger.warning("Bot could not access channel '%s'. Make sure it is an admin.", channel)
 
         if not_joined_channels:
             builder = InlineKeyboardBuilder()
@@ -0,0 +1,185 @@
+import asyncio
+import logging
+import os
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Set
+
+from modules.storage import Storage
+
+from modules.supabase_handler import insert_messages
+
+logger = logging.getLogger(__name__)
+
+# --- Konfigurasi Penulisan Latar Belakang ---
+WRITER_MAX_QUEUE = int(os.getenv("WRITER_MAX_QUEUE", 5000))
+WRITER_BATCH_SIZE = int(os.getenv("WRITER_BATCH_SIZE", 200))
+WRITER_FLUSH_INTERVAL = float(os.getenv("WRITER_FLUSH_INTERVAL", 0.5))
+WRITER_MAX_RETRIES = int(os.getenv("WRITER_MAX_RETRIES", 5))
+
+
+class MessageWriter:
+    """
+    Persists conversation messages in the background. Rows from all chats
+    are batched into bulk inserts, failed batches are retried with backoff
+    and everything still queued is flushed on shutdown. Rows that are not
+    yet written can be read back with pending_for() so the next turn still
+    sees them in its history.
+    """
+
+    def __init__(self, max_queue: int, batch_size: int, flush_interval: float, max_retries: int):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self._pending: List[Dict[str, Any]] = []
+        self._supabase: Optional[Storage] = None
+        self._task: Optional[asyncio.Task] = None
+        self._discarded: Set[int] = set()  # id() baris antrean yang tidak boleh ditulis lagi
+        self._write_lock = asyncio.Lock()   # dipegang selama satu percobaan insert berjalan
+
+        # --- Metrik ---
+        self.written = 0
+        self.failed = 0
+        self.retries = 0
+        self.batches = 0
+        self.discarded = 0
+
+    async def save(self, supabase: Storage, user_id: int, role: str, content: str, business_connection_id: str = None, reasoning: str = None):
+        """Same arguments as save_message, but returns as soon as the row is queued."""
+        row = {
+            'user_id': user_id,
+            'role': role,
+            'content': content,
+            'reasoning_text': reasoning,
+            'business_connection_id': business_connection_id,
+            # Waktu ditetapkan saat diantrekan agar urutan tetap benar dalam satu batch
+            'created_at': datetime.now(timezone.utc).isoformat(),
+        }
+        if self._task is None:
+            await asyncio.to_thread(insert_messages, supabase, [row])
+            return
+
+        self._pending.append(row)
+        await self._queue.put(row)
+
+    def pending_for(self, user_id: int, business_connection_id: str = None) -> List[Dict[str, Any]]:
+        return [
+            {'role': row['role'], 'content': row['content']}
+            for row in self._pending
+            if row['user_id'] == user_id and row['business_connection_id'] == business_connection_id
+        ]
+
+    async def discard_for(self, user_id: int, business_connection_id: str = None, every_conversation: bool = False):
+        """
+        Drops the not-yet-written rows of a conversation (or, with
+        every_conversation, of all the user's conversations) so clearing the
+        history is not undone by a later insert. Waits for an insert that is
+        already running; once this returns, nothing of it reaches the table.
+        """
+        def matches(row: Dict[str, Any]) -> bool:
+            return row['user_id'] == user_id and (every_conversation or row['business_connection_id'] == business_connection_id)
+
+        dropped = [row for row in self._pending if matches(row)]
+        if not dropped:
+            return
+        self._discarded.update(id(row) for row in dropped)
+        self._pending = [row for row in self._pending if not matches(row)]
+        self.discarded += len(dropped)
+        async with self._write_lock:
+            pass
+
+    async def _collect_batch(self) -> List[Dict[str, Any]]:
+        batch = [await self._queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.flush_interval
+        while len(batch) < self.batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout=timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _write_batch(self, batch: List[Dict[str, Any]]):
+        delay = 0.5
+        for attempt in range(self.max_retries + 1):
+            async with self._write_lock:
+                rows = [row for row in batch if id(row) not in self._discarded]
+                if not rows:
+                    break
+                written = await asyncio.to_thread(insert_messages, self._supabase, rows)
+            if written:
+                self.written += len(rows)
+                self.batches += 1
+                break
+            if attempt == self.max_retries:
+                self.failed += len(rows)
+                logger.error("Dropping %s messages after %s failed write retries.", len(rows), self.max_retries)
+                break
+            self.retries += 1
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30)
+
+        written_ids = {id(row) for row in batch}
+        self._pending = [row for row in self._pending if id(row) not in written_ids]
+        self._discarded -= written_ids
+        for _ in batch:
+            self._queue.task_done()
+
+    async def _run(self):
+        while True:
+            batch = await self._collect_batch()
+            await self._write_batch(batch)
+
+    async def start(self, supabase: Storage):
+        self._supabase = supabase
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self, timeout: float = 30.0):
+        """Flushes queued messages, then stops the writer."""
+        if self._task is None:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Message writer shutdown timed out with %s messages unsaved.", self._queue.qsize())
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queue_depth": self._queue.qsize(),
+            "pending": len(self._pending),
+            "written": self.written,
+            "failed": self.failed,
+            "retries": self.retries,
+            "batches": self.batches,
+            "discarded": self.discarded,
+        }
+
+
+def merge_pending(history: List[Dict[str, Any]], pending: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Appends not-yet-written messages to history loaded from the database.
+    `pending` must be captured before the database read; rows that were
+    written in the meantime are already at the end of `history`.
+    """
+    if not pending:
+        return history
+    tail = [(m['role'], m['content']) for m in history[-len(pending):]]
+    merged = list(history)
+    for message in pending:
+        key = (message['role'], message['content'])
+        if key in tail:
+            tail.remove(key)
+        else:
+            merged.append(message)
+    return merged
+
+message_writer = MessageWriter(WRITER_MAX_QUEUE, WRITER_BATCH_SIZE, WRITER_FLUSH_INTERVAL, WRITER_MAX_RETRIES)
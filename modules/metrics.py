@@ -0,0 +1,248 @@
+import logging
+import os
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+# --- Konfigurasi Metrik ---
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", 0) or 0)  # 0 = endpoint /metrics nonaktif
+METRIC_PREFIX = "askcapy_"
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[Any, ...], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric(ABC):
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = METRIC_PREFIX + name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    @abstractmethod
+    def render(self) -> List[str]:
+        ...
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        super().__init__(name + "_total", documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in self._values.items()
+        ]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[str, ...], List[float]] = {}  # [hitungan per bucket..., sum, count]
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        series = self._series.get(key)
+        if series is None:
+            series = [0] * len(self.buckets) + [0.0, 0]
+            self._series[key] = series
+        index = bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            series[index] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def means(self) -> Dict[Tuple[str, ...], Tuple[int, float]]:
+        """(count, mean) per label set, for reports outside Prometheus."""
+        return {key: (series[-1], series[-2] / series[-1]) for key, series in self._series.items() if series[-1]}
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for key, series in self._series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                bucket_labels = _format_labels(self.labelnames, key, 'le="%s"' % bound)
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            bucket_labels = _format_labels(self.labelnames, key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{bucket_labels} {series[-1]}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(series[-2])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {series[-1]}")
+        return lines
+
+
+class StatsCollector:
+    """Exports the numeric fields of a component's stats() dict as gauges."""
+
+    def __init__(self, component: str, stats_fn: Callable[[], Dict[str, Any]]):
+        self.component = component
+        self.stats_fn = stats_fn
+
+    def render(self) -> List[str]:
+        try:
+            stats = self.stats_fn()
+        except Exception as e:
+            logger.error("Error collecting metrics from %s: %s", self.component, e)
+            return []
+
+        lines = []
+        for field, value in stats.items():
+            name = f"{METRIC_PREFIX}{self.component}_{field}"
+            if isinstance(value, bool) or value is None:
+                continue
+            if isinstance(value, (int, float)):
+                lines += [f"# TYPE {name} gauge", f"{name} {_format_value(value)}"]
+            elif isinstance(value, dict) and all(isinstance(v, (int, float)) for v in value.values()):
+                # Statistik bertingkat satu level (misalnya per fitur) menjadi label "key"
+                lines.append(f"# TYPE {name} gauge")
+                lines += [f'{name}{{key="{_escape(k)}"}} {_format_value(v)}' for k, v in value.items()]
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[Any] = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def register_stats(self, component: str, stats_fn: Callable[[], Dict[str, Any]]):
+        self.register(StatsCollector(component, stats_fn))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines += metric.render()
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+# --- Metrik Per Tahap ---
+UPDATE_SECONDS = registry.histogram("update_seconds", "Time to handle one Telegram update.", ("event_type",))
+UPDATE_ERRORS = registry.counter("update_errors", "Updates whose handler raised.", ("event_type",))
+MIDDLEWARE_SECONDS = registry.histogram("middleware_seconds", "Time spent inside a middleware before the handler.", ("middleware",))
+SUPABASE_SECONDS = registry.histogram("supabase_seconds", "Supabase query time.", ("table", "method"))
+SUPABASE_ERRORS = registry.counter("supabase_errors", "Failed or timed out Supabase queries.", ("table", "method"))
+SQLITE_SECONDS = registry.histogram("sqlite_seconds", "Embedded SQLite storage time per operation.", ("op",),
+                                    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.05, 0.25))
+LLM_SECONDS = registry.histogram("llm_seconds", "Groq completion time per model and key.", ("model", "key"))
+LLM_ERRORS = registry.counter("llm_errors", "Failed Groq requests.", ("model", "key", "reason"))
+LLM_TOKENS = registry.counter("llm_tokens", "Tokens used by Groq completions.", ("model", "kind"))
+SCRAPE_SECONDS = registry.histogram("scrape_seconds", "Fetch or parse time of one web source.", ("stage", "content_type"))
+SEARCH_SECONDS = registry.histogram("search_seconds", "SerpApi search time.")
+HTML_SECONDS = registry.histogram("html_render_seconds", "Markdown to Telegram HTML conversion time.",
+                                  buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25))
+TELEGRAM_SECONDS = registry.histogram("telegram_request_seconds", "Telegram Bot API request time.", ("method",))
+TELEGRAM_RETRY_AFTER = registry.counter("telegram_retry_after", "Telegram flood-control responses.", ("method",))
+LOOP_LAG_SECONDS = registry.histogram("event_loop_lag_seconds", "Delay of the event-loop heartbeat past its schedule.",
+                                      buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0))
+CACHE_LOOKUPS = registry.counter("cache_lookups", "Answer cache lookups.", ("result",))
+
+
+class UpdateMetricsMiddleware:
+    """Outermost update middleware: total handling time and handler errors per update type."""
+
+    async def __call__(self, handler, event, data):
+        event_type = getattr(event, "event_type", "unknown")
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            UPDATE_ERRORS.inc(event_type=event_type)
+            raise
+        finally:
+            UPDATE_SECONDS.observe(time.perf_counter() - started, event_type=event_type)
+
+
+class TimedMiddleware:
+    """Wraps a middleware and records the time it spends before calling the next handler."""
+
+    def __init__(self, name: str, middleware):
+        self.name = name
+        self.middleware = middleware
+
+    async def __call__(self, handler, event, data):
+        started = time.perf_counter()
+        reached_handler = False
+
+        async def timed_handler(event, data):
+            nonlocal reached_handler
+            reached_handler = True
+            MIDDLEWARE_SECONDS.observe(time.perf_counter() - started, middleware=self.name)
+            return await handler(event, data)
+
+        try:
+            return await self.middleware(timed_handler, event, data)
+        finally:
+            # Middleware yang menghentikan update (misalnya belum join channel) tetap diukur
+            if not reached_handler:
+                MIDDLEWARE_SECONDS.observe(time.perf_counter() - started, middleware=self.name)
+
+
+async def handle_metrics(request: web.Request) -> web.Response:
+    return web.Response(text=registry.render(), headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+async def start_metrics_server(host: str = METRICS_HOST, port: int = METRICS_PORT) -> Optional[web.AppRunner]:
+    """Serves /metrics in Prometheus text format; returns None when METRICS_PORT is unset."""
+    if not port:
+        return None
+    app = web.Application()
+    app.router.add_get("/metrics", handle_metrics)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info("Metrics available at http://%s:%s/metrics", host, port)
+    return runner
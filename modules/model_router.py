@@ -0,0 +1,110 @@
+import logging
+import os
+import re
+from collections import Counter, deque
+from typing import Any, Dict, List
+
+from modules.model_stats import model_stats
+from modules.circuit_breaker import model_breakers
+
+logger = logging.getLogger(__name__)
+
+AUTO_MODEL = "auto"
+
+# --- Konfigurasi Router ---
+ROUTER_SHORT_PROMPT = int(os.getenv("ROUTER_SHORT_PROMPT", 280))  # karakter; di bawah ini cukup model tier 1
+ROUTER_LONG_PROMPT = int(os.getenv("ROUTER_LONG_PROMPT", 1500))   # karakter; di atas ini butuh model tier 3
+ROUTER_LOG_DECISIONS = os.getenv("ROUTER_LOG_DECISIONS", "1") == "1"
+
+# Perkiraan latensi (detik) per tier sebelum ada data langsung
+TIER_BASE_LATENCY = {1: 1.0, 2: 2.0, 3: 4.0}
+TIER_OVERSHOOT_PENALTY = 0.5  # biaya relatif tiap tier di atas yang dibutuhkan
+ERROR_RATE_PENALTY = 5.0
+REASONING_CHAT_PENALTY = 0.5  # model reasoning menulis <think> panjang; kurang cocok untuk obrolan biasa
+
+# Hanya struktur kode (fence, baris def/import, traceback), bukan kata lepas seperti "python" atau "exception"
+CODE_PATTERN = re.compile(
+    r"```|^\s*(async\s+)?def\s+\w+\s*\(|^\s*class\s+\w+\s*[(:{]"
+    r"|^\s*import\s+[\w.]+(\s+as\s+\w+)?(\s*,\s*[\w.]+)*;?\s*$|^\s*from\s+[\w.]+\s+import\s+[\w*(]"
+    r"|^\s*(function\s+\w+\s*\(|(const|let|var)\s+\w+\s*=|public\s+(static\s+)?[\w<>\[\]]+\s+\w+\s*\(|#include\s*[<\"])"
+    r"|Traceback \(most recent call last\)|^\s*File \".+\", line \d+|^\s*at [\w.$<>]+\(.*:\d+\)|^\s*\w*(Error|Exception): "
+    r"|console\.log\(|\bSELECT\s+.+\s+FROM\s+\w+",
+    re.MULTILINE,
+)
+# Operator harus berspasi atau diikuti "=", agar tanggal (2024-10-19) dan nomor telepon (555-1234) tidak terhitung
+MATH_PATTERN = re.compile(
+    r"\d\s+[\+\-\*/\^×÷]\s+\(?\d|\d\s*[\*\^×÷]\s*\(?\d|\d\s*[\+\-/]\s*\d+\s*=\s*(\?|\d|$)|[∫∑√π≤≥≠±]"
+    r"|\b(solve|solving|integral|integrate|derivative|equation|theorem|probability|calculate|calculation)s?\b|\bprove that\b"
+    r"|\b(hitung|persamaan|turunan|peluang|buktikan)\w*|уравнени|интеграл|производн|докаж|вычисл",
+    re.IGNORECASE | re.MULTILINE,
+)
+
+
+def classify_prompt(prompt: str, has_images: bool = False) -> Dict[str, Any]:
+    """Extracts the routing features of a single request."""
+    length = len(prompt or "")
+    if CODE_PATTERN.search(prompt or ""):
+        intent = "code"
+    elif MATH_PATTERN.search(prompt or ""):
+        intent = "math"
+    else:
+        intent = "chat"
+
+    if intent == "code" or length > ROUTER_LONG_PROMPT:
+        min_tier = 3
+    elif intent == "math" or length > ROUTER_SHORT_PROMPT:
+        min_tier = 2
+    else:
+        min_tier = 1
+    return {"length": length, "intent": intent, "images": has_images, "min_tier": min_tier}
+
+
+class ModelRouter:
+    """
+    Resolves the "auto" model to a concrete one per request. The smallest
+    adequate tier is preferred, weighted by each model's live p50 latency
+    and error rate, so simple turns land on the fastest model.
+    """
+
+    def __init__(self, log_decisions: bool):
+        self.log_decisions = log_decisions
+        self.decisions = Counter()
+        self.recent = deque(maxlen=100)
+
+    def _score(self, model_id: str, info: Dict[str, Any], features: Dict[str, Any]) -> float:
+        tier = info.get("tier", 2)
+        latency = model_stats.p50(model_id) or TIER_BASE_LATENCY.get(tier, 2.0)
+        penalty = 1 + max(0, tier - features["min_tier"]) * TIER_OVERSHOOT_PENALTY
+        if info.get("reasoning") and features["intent"] == "chat":
+            penalty += REASONING_CHAT_PENALTY
+        return latency * penalty * (1 + ERROR_RATE_PENALTY * model_stats.error_rate(model_id))
+
+    def route(self, models_config: Dict[str, Dict[str, Any]], prompt: str, has_images: bool = False) -> str:
+        features = classify_prompt(prompt, has_images)
+        pool: List[str] = [
+            model_id for model_id, info in models_config.items()
+            if not info.get("auto")
+            and (info.get("vision") or not has_images)
+            and not model_breakers.get(model_id).is_open()
+        ]
+        if features["intent"] == "math":
+            pool = [model_id for model_id in pool if models_config[model_id].get("reasoning")] or pool
+        if not pool:
+            return next((model_id for model_id, info in models_config.items() if not info.get("auto")), AUTO_MODEL)
+
+        eligible = [model_id for model_id in pool if models_config[model_id].get("tier", 2) >= features["min_tier"]] or pool
+        scores = {model_id: self._score(model_id, models_config[model_id], features) for model_id in eligible}
+        chosen = min(scores, key=scores.get)
+
+        self.decisions[chosen] += 1
+        self.recent.append({**features, "model": chosen})
+        if self.log_decisions:
+            ranked = ", ".join(f"{model_id}={score:.2f}" for model_id, score in sorted(scores.items(), key=lambda item: item[1]))
+            logger.info("Router: len=%s intent=%s images=%s min_tier=%s -> %s [%s]",
+                        features['length'], features['intent'], has_images, features['min_tier'], chosen, ranked)
+        return chosen
+
+    def stats(self) -> Dict[str, Any]:
+        return {"decisions": dict(self.decisions), "recent": list(self.recent)[-10:]}
+
+model_router = ModelRouter(ROUTER_LOG_DECISIONS)
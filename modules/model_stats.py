@@ -0,0 +1,60 @@
+from collections import deque
+from typing import Dict, Optional
+
+LATENCY_WINDOW = 200   # jumlah sampel latensi terakhir per model
+OUTCOME_WINDOW = 50    # jumlah hasil (sukses/gagal) terakhir untuk tingkat error
+MIN_SAMPLES = 20       # kuantil belum dipercaya sebelum sampel cukup
+
+
+class ModelStats:
+    """Online latency and error statistics per model, learned from live traffic."""
+
+    def __init__(self):
+        self._latencies: Dict[str, deque] = {}
+        self._outcomes: Dict[str, deque] = {}
+
+    def _series(self, store: Dict[str, deque], model: str, size: int) -> deque:
+        series = store.get(model)
+        if series is None:
+            series = deque(maxlen=size)
+            store[model] = series
+        return series
+
+    def record_success(self, model: str, latency: float):
+        self._series(self._latencies, model, LATENCY_WINDOW).append(latency)
+        self._series(self._outcomes, model, OUTCOME_WINDOW).append(True)
+
+    def record_failure(self, model: str):
+        self._series(self._outcomes, model, OUTCOME_WINDOW).append(False)
+
+    def quantile(self, model: str, q: float) -> Optional[float]:
+        samples = self._latencies.get(model)
+        if not samples or len(samples) < MIN_SAMPLES:
+            return None
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+    def p50(self, model: str) -> Optional[float]:
+        return self.quantile(model, 0.50)
+
+    def p95(self, model: str) -> Optional[float]:
+        return self.quantile(model, 0.95)
+
+    def error_rate(self, model: str) -> float:
+        outcomes = self._outcomes.get(model)
+        if not outcomes:
+            return 0.0
+        return outcomes.count(False) / len(outcomes)
+
+    def snapshot(self) -> Dict[str, Dict[str, Optional[float]]]:
+        return {
+            model: {
+                "p50": self.p50(model),
+                "p95": self.p95(model),
+                "error_rate": self.error_rate(model),
+                "samples": len(self._latencies.get(model, ())),
+            }
+            for model in set(self._latencies) | set(self._outcomes)
+        }
+
+model_stats = ModelStats()
@@ -0,0 +1,218 @@
+import asyncio
+import math
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from collections.abc import Coroutine
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import List, Tuple
+
+# --- Konfigurasi Profiler ---
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", 0.005))        # jarak antar sampel (detik)
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", 120))     # batas atas jendela /profile
+PROFILE_TOP_N = int(os.getenv("PROFILE_TOP_N", 15))
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+IDLE_FRAME = "<idle>"
+
+# Frame terdalam yang berarti loop sedang menunggu I/O, bukan bekerja
+_IDLE_FUNCTIONS = {("selectors.py", "select"), ("selectors.py", "poll"), ("threading.py", "wait")}
+
+
+class ProfilerBusy(Exception):
+    """Raised when a profile is requested while another one is running."""
+
+
+@dataclass
+class ProfileResult:
+    seconds: float
+    samples: int = 0
+    idle_samples: int = 0
+    self_counts: Counter = field(default_factory=Counter)
+    total_counts: Counter = field(default_factory=Counter)
+    task_counts: Counter = field(default_factory=Counter)
+    stacks: Counter = field(default_factory=Counter)
+
+    @property
+    def busy_samples(self) -> int:
+        return self.samples - self.idle_samples
+
+    def top(self, n: int = PROFILE_TOP_N) -> List[Tuple[str, int, int]]:
+        """(function, self samples, total samples) of the hottest functions on the loop thread."""
+        return [(name, count, self.total_counts[name]) for name, count in self.self_counts.most_common(n)]
+
+    def folded(self) -> str:
+        """Collapsed stacks ("root;caller;callee count"), readable by flamegraph.pl and speedscope."""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+def _label(code) -> str:
+    path = Path(code.co_filename)
+    try:
+        resolved = path.resolve()
+        if PROJECT_ROOT in resolved.parents:
+            return f"{resolved.relative_to(PROJECT_ROOT)}:{code.co_name}"
+    except (OSError, ValueError):
+        pass
+    # Pustaka cukup ditandai dengan nama paket dan berkasnya
+    parts = path.parts
+    if "site-packages" in parts:
+        parts = parts[parts.index("site-packages") + 1:]
+    else:
+        parts = parts[-1:]
+    return f"{'/'.join(parts)}:{code.co_name}"
+
+
+class _TrackedCoroutine(Coroutine):
+    """Wraps a task's coroutine and publishes the task's name while one of its steps runs on the loop."""
+
+    __slots__ = ("_coro", "_profiler", "name")
+
+    def __init__(self, coro, profiler: "SamplingProfiler"):
+        self._coro = coro
+        self._profiler = profiler
+        self.name = getattr(coro, "__qualname__", None) or type(coro).__name__
+
+    def send(self, value):
+        self._profiler._current_task = self.name
+        try:
+            return self._coro.send(value)
+        finally:
+            self._profiler._current_task = None
+
+    def throw(self, *args):
+        self._profiler._current_task = self.name
+        try:
+            return self._coro.throw(*args)
+        finally:
+            self._profiler._current_task = None
+
+    def close(self):
+        return self._coro.close()
+
+    def __await__(self):
+        return self._coro.__await__()
+
+# Frame pembungkus di atas tidak ikut dicatat dalam stack
+_WRAPPER_CODES = {_TrackedCoroutine.send.__code__, _TrackedCoroutine.throw.__code__}
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler for the live process. A background thread
+    samples the event-loop thread's stack every PROFILE_INTERVAL; samples
+    where the loop sits in the selector are counted as idle. While a
+    profile runs, a task factory on the loop records which task is
+    stepping, so time can be attributed per coroutine (tasks started
+    before the window show up as "<loop>"). Other threads (to_thread
+    workers) are recorded in the folded output under their own thread name.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._lock = asyncio.Lock()
+        self._labels = {}
+        self._current_task = None  # ditulis oleh loop, dibaca oleh thread sampler
+
+    @property
+    def running(self) -> bool:
+        return self._lock.locked()
+
+    def _code_label(self, code) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            label = self._labels[code] = _label(code)
+        return label
+
+    def _stack(self, frame) -> List[str]:
+        stack = []
+        while frame is not None:
+            if frame.f_code not in _WRAPPER_CODES:
+                stack.append(self._code_label(frame.f_code))
+            frame = frame.f_back
+        stack.reverse()
+        return stack
+
+    def _is_idle(self, frame) -> bool:
+        return (Path(frame.f_code.co_filename).name, frame.f_code.co_name) in _IDLE_FUNCTIONS
+
+    def _task_factory(self, previous):
+        def factory(loop, coro, **kwargs):
+            tracked = _TrackedCoroutine(coro, self)
+            if previous is not None:
+                return previous(loop, tracked, **kwargs)
+            return asyncio.Task(tracked, loop=loop, **kwargs)
+        return factory
+
+    def _sample(self, result: ProfileResult, loop_thread_id: int, stopping: threading.Event):
+        own_thread = threading.get_ident()
+        thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+        next_sample = time.perf_counter()
+        while not stopping.is_set():
+            frames = sys._current_frames()
+            for thread_id, frame in frames.items():
+                if thread_id == own_thread:
+                    continue
+                if thread_id != loop_thread_id:
+                    if thread_id not in thread_names:
+                        thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+                    if self._is_idle(frame):
+                        continue
+                    stack = [f"thread:{thread_names.get(thread_id, thread_id)}"] + self._stack(frame)
+                    result.stacks[";".join(stack)] += 1
+                    continue
+
+                result.samples += 1
+                if self._is_idle(frame):
+                    result.idle_samples += 1
+                    result.stacks[IDLE_FRAME] += 1
+                    continue
+                task = self._current_task or "<loop>"
+                stack = self._stack(frame)
+                result.task_counts[task] += 1
+                result.self_counts[stack[-1]] += 1
+                for name in set(stack):
+                    result.total_counts[name] += 1
+                result.stacks[";".join([f"task:{task}"] + stack)] += 1
+            del frames, frame
+
+            next_sample += self.interval
+            delay = next_sample - time.perf_counter()
+            if delay > 0:
+                stopping.wait(delay)
+            else:
+                next_sample = time.perf_counter()
+
+    async def profile(self, seconds: float) -> ProfileResult:
+        """Samples the running process for `seconds` without blocking the event loop."""
+        if self.running:
+            raise ProfilerBusy("A profile is already running")
+        # NaN lolos dari min/max dan asyncio.sleep(nan) tidak pernah selesai
+        if not math.isfinite(seconds):
+            raise ValueError("Profile duration must be a finite number of seconds")
+        async with self._lock:
+            seconds = min(max(seconds, 1.0), PROFILE_MAX_SECONDS)
+            result = ProfileResult(seconds=seconds)
+            loop = asyncio.get_running_loop()
+            previous_factory = loop.get_task_factory()
+            loop.set_task_factory(self._task_factory(previous_factory))
+            stopping = threading.Event()
+            thread = threading.Thread(
+                target=self._sample,
+                args=(result, threading.get_ident(), stopping),
+                name="sampling-profiler",
+                daemon=True,
+            )
+            thread.start()
+            try:
+                await asyncio.sleep(seconds)
+            finally:
+                loop.set_task_factory(previous_factory)
+                stopping.set()
+                await asyncio.to_thread(thread.join)
+            return result
+
+profiler = SamplingProfiler(PROFILE_INTERVAL)
@@ -0,0 +1,96 @@
+import asyncio
+import contextvars
+import os
+import time
+from contextlib import contextmanager
+from typing import Awaitable, Optional, TypeVar
+
+T = TypeVar("T")
+
+# --- Konfigurasi Tenggat Permintaan ---
+REPLY_DEADLINE = float(os.getenv("REPLY_DEADLINE", 60.0))                # pesan pribadi, grup, bisnis dan /web
+CALLBACK_DEADLINE = float(os.getenv("CALLBACK_DEADLINE", 15.0))          # tombol inline; Telegram menunggu jawaban callback
+INLINE_WORK_DEADLINE = float(os.getenv("INLINE_WORK_DEADLINE", 25.0))    # termasuk waktu mengisi cache setelah timeout
+SUPABASE_TIMEOUT = float(os.getenv("SUPABASE_TIMEOUT", 5.0))             # batas per panggilan database
+
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("request_deadline", default=None)
+_correlation_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("correlation_id", default=None)
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a stage would start or run past the request deadline."""
+
+
+@contextmanager
+def deadline_scope(seconds: Optional[float], inherit: bool = True):
+    """
+    Sets a deadline `seconds` from now for the current request; None means
+    no deadline. Nested scopes can only shorten an inherited deadline
+    unless `inherit` is False. Tasks created inside inherit it.
+    """
+    deadline = None if seconds is None else time.monotonic() + seconds
+    current = _deadline.get()
+    if inherit and current is not None:
+        deadline = current if deadline is None else min(deadline, current)
+    token = _deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+@contextmanager
+def correlation_scope(correlation_id: str):
+    """Tags every log line of the current update, including its tasks and threads, with `correlation_id`."""
+    token = _correlation_id.set(correlation_id)
+    try:
+        yield
+    finally:
+        _correlation_id.reset(token)
+
+
+def current_correlation_id() -> Optional[str]:
+    return _correlation_id.get()
+
+
+def update_deadline(event_type: str) -> float:
+    """The deadline for handling an update, counted from when it arrives."""
+    if event_type == "inline_query":
+        return INLINE_WORK_DEADLINE
+    if event_type == "callback_query":
+        return CALLBACK_DEADLINE
+    return REPLY_DEADLINE
+
+
+def background_context() -> contextvars.Context:
+    """A copy of the current context without the request deadline, for background tasks."""
+    context = contextvars.copy_context()
+    context.run(_deadline.set, None)
+    return context
+
+
+def time_left() -> Optional[float]:
+    """Seconds until the request deadline, or None when there is none."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def stage_timeout(cap: Optional[float] = None) -> Optional[float]:
+    """The timeout a stage should use: its own cap, shortened by the request deadline."""
+    left = time_left()
+    if left is None:
+        return cap
+    return left if cap is None else min(left, cap)
+
+
+async def run_with_deadline(awaitable: Awaitable[T], cap: Optional[float] = None, stage: str = "stage") -> T:
+    """Awaits a stage under stage_timeout(cap); raises DeadlineExceeded instead of starting late work."""
+    timeout = stage_timeout(cap)
+    if timeout is not None and timeout <= 0:
+        if asyncio.iscoroutine(awaitable):
+            awaitable.close()
+        raise DeadlineExceeded(f"No time left for {stage}")
+    try:
+        return await asyncio.wait_for(awaitable, timeout=timeout)
+    except asyncio.TimeoutError:
+        raise DeadlineExceeded(f"{stage} timed out after {timeout:.1f}s")
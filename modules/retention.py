@@ -0,0 +1,164 @@
+import asyncio
+import json
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from modules.state_backend import get_state_backend
+from modules.storage import Storage
+from modules.supabase_handler import (
+    get_stale_conversations, get_conversation_messages_before, has_messages_since, get_summary_row,
+    delete_conversation_summary, delete_messages_by_ids, count_messages, conversation_key,
+)
+
+logger = logging.getLogger(__name__)
+
+# --- Konfigurasi Retensi ---
+RETENTION_DAYS = int(os.getenv("RETENTION_DAYS", 90))  # 0 = nonaktif
+RETENTION_BATCH = int(os.getenv("RETENTION_BATCH", 500))
+RETENTION_MAX_CONVERSATIONS = int(os.getenv("RETENTION_MAX_CONVERSATIONS", 1000))  # per run; sisanya pada run berikutnya
+RETENTION_INTERVAL_HOURS = float(os.getenv("RETENTION_INTERVAL_HOURS", 24))
+ARCHIVE_DIR = Path(os.getenv("ARCHIVE_DIR", "archive"))
+MANIFEST_FILE = "manifest.json"
+
+
+class RetentionJob:
+    """
+    Moves conversations that have been idle for RETENTION_DAYS into
+    zstd-compressed JSONL archive files, one line per conversation with its
+    messages and summary, and deletes them from the database. Whole
+    conversations are archived so an active chat never loses its oldest
+    turns. Rows are only deleted after their batch is safely written to disk.
+    """
+
+    def __init__(self, archive_dir: Path):
+        self.archive_dir = archive_dir
+        self._task: Optional[asyncio.Task] = None
+
+    def _manifest_path(self) -> Path:
+        return self.archive_dir / MANIFEST_FILE
+
+    def load_manifest(self) -> Dict[str, Any]:
+        try:
+            with open(self._manifest_path(), "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {"rows_archived": 0, "conversations_archived": 0, "raw_bytes": 0, "compressed_bytes": 0, "files": [], "last_run": None}
+
+    def _save_manifest(self, manifest: Dict[str, Any]):
+        tmp_path = self._manifest_path().with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, self._manifest_path())
+
+    def _write_frame(self, archive_path: Path, compressor, conversations: List[Dict[str, Any]]) -> Tuple[int, int]:
+        raw = "".join(json.dumps(conversation, ensure_ascii=False, default=str) + "\n" for conversation in conversations).encode("utf-8")
+        compressed = compressor.compress(raw)
+        # Setiap batch ditulis sebagai frame zstd tersendiri; frame yang digabung tetap bisa didekompresi
+        with open(archive_path, "ab") as f:
+            f.write(compressed)
+            f.flush()
+            os.fsync(f.fileno())
+        return len(raw), len(compressed)
+
+    def archive_once(self, supabase: Storage, retention_days: int) -> int:
+        """
+        Archives and deletes every conversation whose newest message is older
+        than the retention period, each as one JSON line with its messages and
+        summary. Active conversations are never cut. Blocking; run it in a thread.
+        """
+        import zstandard
+
+        self.archive_dir.mkdir(parents=True, exist_ok=True)
+        cutoff = (datetime.now(timezone.utc) - timedelta(days=retention_days)).isoformat()
+        run_started = datetime.now(timezone.utc)
+        archive_path = self.archive_dir / f"conversations-{run_started.strftime('%Y%m%d-%H%M%S')}.jsonl.zst"
+        manifest = self.load_manifest()
+        manifest.setdefault("conversations_archived", 0)
+        compressor = zstandard.ZstdCompressor(level=10)
+        archived = 0
+
+        def flush(batch: List[Dict[str, Any]]):
+            nonlocal archived
+            # Pesan baru bisa masuk sejak daftar dibuat; percakapan yang aktif lagi dibiarkan utuh
+            batch = [c for c in batch if not has_messages_since(supabase, c["user_id"], c["business_connection_id"], cutoff)]
+            if not batch:
+                return
+            raw_bytes, compressed_bytes = self._write_frame(archive_path, compressor, batch)
+            for conversation in batch:
+                ids = [row["id"] for row in conversation["messages"]]
+                for start in range(0, len(ids), RETENTION_BATCH):
+                    delete_messages_by_ids(supabase, ids[start:start + RETENTION_BATCH])
+                if conversation["summary"]:
+                    delete_conversation_summary(supabase, conversation["user_id"], conversation["business_connection_id"])
+                archived += len(ids)
+                manifest["rows_archived"] += len(ids)
+            manifest["conversations_archived"] += len(batch)
+            manifest["raw_bytes"] += raw_bytes
+            manifest["compressed_bytes"] += compressed_bytes
+            if archive_path.name not in manifest["files"]:
+                manifest["files"].append(archive_path.name)
+            self._save_manifest(manifest)
+
+        batch: List[Dict[str, Any]] = []
+        batch_rows = 0
+        for user_id, business_connection_id in get_stale_conversations(supabase, cutoff, RETENTION_MAX_CONVERSATIONS):
+            messages = get_conversation_messages_before(supabase, user_id, business_connection_id, cutoff)
+            if not messages:
+                continue
+            batch.append({
+                "conversation_key": conversation_key(user_id, business_connection_id),
+                "user_id": user_id,
+                "business_connection_id": business_connection_id,
+                "summary": get_summary_row(supabase, user_id, business_connection_id),
+                "messages": messages,
+            })
+            batch_rows += len(messages)
+            if batch_rows >= RETENTION_BATCH:
+                flush(batch)
+                batch, batch_rows = [], 0
+        flush(batch)
+
+        manifest["last_run"] = run_started.isoformat()
+        self._save_manifest(manifest)
+        if archived:
+            logger.info("Retention: archived %s messages of conversations idle for %s days to %s", archived, retention_days, archive_path)
+        return archived
+
+    async def _run(self, supabase: Storage):
+        interval = RETENTION_INTERVAL_HOURS * 3600
+        while True:
+            # Hanya satu worker yang menjalankan retensi per interval
+            if await get_state_backend().set_nx("retention:lock", "1", ttl=interval):
+                try:
+                    await asyncio.to_thread(self.archive_once, supabase, RETENTION_DAYS)
+                except Exception as e:
+                    logger.error("Error in retention job: %s", e)
+            await asyncio.sleep(interval)
+
+    async def start(self, supabase: Storage):
+        if RETENTION_DAYS <= 0:
+            return
+        self._task = asyncio.create_task(self._run(supabase))
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def report(self, supabase: Storage) -> Dict[str, Any]:
+        manifest = self.load_manifest()
+        return {
+            "rows_in_table": await asyncio.to_thread(count_messages, supabase),
+            "retention_days": RETENTION_DAYS,
+            "conversations_archived": 0,
+            **manifest,
+        }
+
+retention_job = RetentionJob(ARCHIVE_DIR)
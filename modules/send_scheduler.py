@@ -0,0 +1,213 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import time
+from collections import deque
+from typing import Any, Dict
+from weakref import WeakValueDictionary
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import Response, TelegramMethod
+from aiogram.methods.base import TelegramType
+from cachetools import TTLCache
+
+from modules.metrics import TELEGRAM_SECONDS, TELEGRAM_RETRY_AFTER
+
+logger = logging.getLogger(__name__)
+
+# --- Konfigurasi Batas Kirim Telegram ---
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except (ValueError, TypeError):
+        return default
+
+GLOBAL_RATE = _env_float("SEND_GLOBAL_RATE", 30.0)             # pesan per detik untuk seluruh bot
+PRIVATE_RATE = _env_float("SEND_PRIVATE_RATE", 1.0)           # pesan per detik per chat pribadi
+GROUP_PER_MINUTE = _env_float("SEND_GROUP_PER_MINUTE", 20.0)  # pesan per menit per grup/channel
+MAX_RETRIES = int(_env_float("SEND_MAX_RETRIES", 3))
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 1
+
+# Hanya metode yang menghasilkan pesan di chat yang dihitung ke batas per chat
+THROTTLED_METHOD_PREFIXES = ("Send", "Edit", "Copy", "Forward")
+# Indikator "mengetik" tidak membuat pesan; jika dihitung, ia menghabiskan token balasan yang ditemaninya
+UNTHROTTLED_METHODS = {"SendChatAction"}
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now: float) -> float:
+        """Returns how many seconds to wait before a token is available."""
+        self._refill(now)
+        wait = max(0.0, self.blocked_until - now)
+        if self.tokens < 1:
+            wait = max(wait, (1 - self.tokens) / self.rate)
+        return wait
+
+    def consume(self):
+        self.tokens -= 1
+
+    def block(self, seconds: float):
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+
+class SendScheduler(BaseRequestMiddleware):
+    """
+    Central outbound scheduler for every Bot API call.
+    Applies per-chat and global token buckets, retries on flood control
+    and serves interactive replies ahead of log-channel traffic.
+    """
+
+    def __init__(self):
+        self.global_bucket = TokenBucket(GLOBAL_RATE, GLOBAL_RATE)
+        self.chat_buckets: TTLCache = TTLCache(maxsize=20000, ttl=600)
+        # Kunci hidup selama ada pengirim yang memegang atau menunggunya; TTL bisa mengganti kunci yang sedang dipakai
+        self.chat_locks: WeakValueDictionary = WeakValueDictionary()
+        self._waiters = []
+        self._sequence = itertools.count()
+        self._dispatcher_task = None
+
+        # --- Metrik ---
+        self.chat_waiting = 0
+        self.sent_total = 0
+        self.retry_after_total = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+        self.recent_waits = deque(maxlen=500)
+
+    def _log_channel_id(self):
+        return os.getenv("LOG_CHANNEL_ID")
+
+    def _priority_for(self, chat_id: Any) -> int:
+        log_channel_id = self._log_channel_id()
+        if log_channel_id and str(chat_id) == log_channel_id:
+            return PRIORITY_BACKGROUND
+        return PRIORITY_INTERACTIVE
+
+    def _chat_bucket(self, chat_id: Any) -> TokenBucket:
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            is_private = isinstance(chat_id, int) and chat_id > 0
+            if is_private:
+                bucket = TokenBucket(PRIVATE_RATE, 3)
+            else:
+                bucket = TokenBucket(GROUP_PER_MINUTE / 60.0, 3)
+            self.chat_buckets[chat_id] = bucket
+        return bucket
+
+    def _chat_lock(self, chat_id: Any) -> asyncio.Lock:
+        lock = self.chat_locks.get(chat_id)
+        if lock is None:
+            lock = asyncio.Lock()
+            self.chat_locks[chat_id] = lock
+        return lock
+
+    async def _dispatch_global(self):
+        while self._waiters:
+            wait = self.global_bucket.delay(time.monotonic())
+            if wait > 0:
+                await asyncio.sleep(wait)
+                continue
+            _, _, future = heapq.heappop(self._waiters)
+            if future.done():
+                continue
+            self.global_bucket.consume()
+            future.set_result(None)
+        self._dispatcher_task = None
+
+    async def _acquire_global(self, priority: int):
+        if not self._waiters and self.global_bucket.delay(time.monotonic()) == 0:
+            self.global_bucket.consume()
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), future))
+        if self._dispatcher_task is None:
+            self._dispatcher_task = asyncio.create_task(self._dispatch_global())
+        await future
+
+    async def acquire(self, chat_id: Any, priority: int = PRIORITY_INTERACTIVE):
+        """Waits until both the chat bucket and the global bucket allow one more message."""
+        started = time.monotonic()
+        self.chat_waiting += 1
+        try:
+            async with self._chat_lock(chat_id):
+                bucket = self._chat_bucket(chat_id)
+                while (wait := bucket.delay(time.monotonic())) > 0:
+                    await asyncio.sleep(wait)
+                await self._acquire_global(priority)
+                bucket.consume()
+        finally:
+            self.chat_waiting -= 1
+
+        waited = time.monotonic() - started
+        self.wait_time_total += waited
+        self.wait_time_max = max(self.wait_time_max, waited)
+        self.recent_waits.append(waited)
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        chat_id = getattr(method, "chat_id", None)
+        method_name = type(method).__name__
+        throttled = chat_id is not None and method_name.startswith(THROTTLED_METHOD_PREFIXES) and method_name not in UNTHROTTLED_METHODS
+
+        for attempt in range(MAX_RETRIES + 1):
+            if throttled:
+                await self.acquire(chat_id, self._priority_for(chat_id))
+            started = time.perf_counter()
+            try:
+                response = await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                TELEGRAM_SECONDS.observe(time.perf_counter() - started, method=type(method).__name__)
+                TELEGRAM_RETRY_AFTER.inc(method=type(method).__name__)
+                self.retry_after_total += 1
+                if attempt == MAX_RETRIES:
+                    raise
+                logger.warning("Flood control on %s (chat %s), retrying in %ss", type(method).__name__, chat_id, e.retry_after)
+                if throttled:
+                    self._chat_bucket(chat_id).block(e.retry_after)
+                else:
+                    await asyncio.sleep(e.retry_after)
+                continue
+            except Exception:
+                TELEGRAM_SECONDS.observe(time.perf_counter() - started, method=type(method).__name__)
+                raise
+
+            TELEGRAM_SECONDS.observe(time.perf_counter() - started, method=type(method).__name__)
+            if throttled:
+                self.sent_total += 1
+            return response
+
+    def stats(self) -> Dict[str, Any]:
+        waits = sorted(self.recent_waits)
+        p95 = waits[int(len(waits) * 0.95) - 1] if waits else 0.0
+        return {
+            "queue_depth": len(self._waiters) + self.chat_waiting,
+            "global_queue_depth": len(self._waiters),
+            "sent_total": self.sent_total,
+            "retry_after_total": self.retry_after_total,
+            "wait_time_total": self.wait_time_total,
+            "wait_time_max": self.wait_time_max,
+            "wait_time_p95": p95,
+        }
+
+send_scheduler = SendScheduler()
@@ -0,0 +1,116 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiogram import Bot
+from modules.storage import Storage
+
+from modules.groq_handler import get_models_config, preload_scraper_modules, warm_groq_clients, groq_api_keys
+from modules.supabase_handler import ping
+from modules.translator import translator_instance
+
+logger = logging.getLogger(__name__)
+
+# --- Konfigurasi Startup ---
+STARTUP_PREWARM = os.getenv("STARTUP_PREWARM", "1") == "1"
+STARTUP_PREWARM_TIMEOUT = float(os.getenv("STARTUP_PREWARM_TIMEOUT", 10.0))  # batas seluruh pemanasan
+
+
+class StartupTimeline:
+    """
+    Times the startup phases (imports, pre-warm steps) until the bot is
+    ready to take updates. The bot is ready once polling begins; pre-warm
+    steps then run in parallel in the background, and a failed or slow
+    step is only reported, the first update then pays for it instead.
+    """
+
+    def __init__(self, prewarm_enabled: bool, prewarm_timeout: float):
+        self.prewarm_enabled = prewarm_enabled
+        self.prewarm_timeout = prewarm_timeout
+        self.phases: Dict[str, float] = {}
+        self.prewarm_steps: Dict[str, float] = {}
+        self.prewarm_errors: Dict[str, str] = {}
+        self.ready_after: Optional[float] = None
+        self._started: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def begin(self, started: float):
+        """Sets the perf_counter() value at which startup began (the top of main.py)."""
+        self._started = started
+
+    def record(self, phase: str, seconds: float):
+        self.phases[phase] = seconds
+
+    async def _step(self, name: str, step: Callable[[], Awaitable[Any]]):
+        started = time.perf_counter()
+        try:
+            await step()
+        except Exception as e:
+            self.prewarm_errors[name] = f"{type(e).__name__}: {e}"
+        finally:
+            self.prewarm_steps[name] = time.perf_counter() - started
+
+    async def start(self, bot: Bot, supabase: Storage):
+        """Startup handler, registered last: marks the bot ready and starts the pre-warm without waiting for it."""
+        if self._started is not None:
+            self.ready_after = time.perf_counter() - self._started
+        logger.info("Startup: %s", self.summary())
+        if self.prewarm_enabled:
+            # Pemanasan tidak menunda polling; update pertama yang datang lebih dulu menanggung biayanya sendiri
+            self._task = asyncio.create_task(self._prewarm(bot, supabase))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _prewarm(self, bot: Bot, supabase: Storage):
+        """Loads config and heavy modules and opens HTTP connections in parallel."""
+        started = time.perf_counter()
+        steps = {
+            "config": lambda: asyncio.to_thread(lambda: (get_models_config(), translator_instance.translations)),
+            "scraper_modules": lambda: asyncio.to_thread(preload_scraper_modules),
+            "telegram": bot.me,
+            "storage": lambda: ping(supabase),
+        }
+        if groq_api_keys:
+            steps["groq"] = warm_groq_clients
+        tasks = [asyncio.create_task(self._step(name, step)) for name, step in steps.items()]
+        try:
+            await asyncio.wait(tasks, timeout=self.prewarm_timeout)
+        finally:
+            for task in tasks:
+                task.cancel()
+        for name in steps:
+            if name not in self.prewarm_steps:
+                self.prewarm_errors[name] = f"timed out after {self.prewarm_timeout:.0f}s"
+        self.record("prewarm", time.perf_counter() - started)
+
+        logger.info("Startup pre-warm finished in %.2fs: %s", self.phases["prewarm"], self._steps_summary())
+        for name, error in self.prewarm_errors.items():
+            logger.warning("Pre-warm step %s failed: %s", name, error)
+
+    def _steps_summary(self) -> str:
+        return ", ".join(f"{name} {seconds * 1000:.0f}ms" for name, seconds in self.prewarm_steps.items())
+
+    def summary(self) -> str:
+        parts = [f"{phase} {seconds:.2f}s" for phase, seconds in self.phases.items()]
+        steps = self._steps_summary()
+        line = f"ready in {self.ready_after:.2f}s" if self.ready_after is not None else "ready"
+        if parts:
+            line += f" ({', '.join(parts)})"
+        if steps:
+            line += f"; pre-warm: {steps}"
+        return line
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "ready_seconds": self.ready_after or 0.0,
+            "phase_seconds": dict(self.phases),
+            "prewarm_seconds": dict(self.prewarm_steps),
+            "prewarm_failures": len(self.prewarm_errors),
+        }
+
+startup_timeline = StartupTimeline(STARTUP_PREWARM, STARTUP_PREWARM_TIMEOUT)
@@ -0,0 +1,160 @@
+import logging
+import os
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Tuple
+
+from aiogram.fsm.storage.base import BaseStorage
+from aiogram.fsm.storage.memory import MemoryStorage
+
+logger = logging.getLogger(__name__)
+
+
+class StateBackend(ABC):
+    """
+    Minimal Redis-style key/value and list operations shared by every
+    bot worker: FSM storage, inline cache/debounce markers and album parts.
+    """
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[str]:
+        ...
+
+    @abstractmethod
+    async def set(self, key: str, value: str, ttl: Optional[float] = None):
+        ...
+
+    @abstractmethod
+    async def set_nx(self, key: str, value: str, ttl: Optional[float] = None) -> bool:
+        """Sets the key only if it does not exist. Returns True when it was set."""
+
+    @abstractmethod
+    async def delete(self, key: str):
+        ...
+
+    @abstractmethod
+    async def rpush(self, key: str, value: str, ttl: Optional[float] = None) -> int:
+        ...
+
+    @abstractmethod
+    async def pop_all(self, key: str) -> List[str]:
+        """Atomically returns and removes every item of a list."""
+
+    @abstractmethod
+    def fsm_storage(self) -> BaseStorage:
+        ...
+
+    async def close(self):
+        pass
+
+
+class LocalStateBackend(StateBackend):
+    """In-process stand-in used for a single worker and for tests."""
+
+    def __init__(self):
+        self._values: Dict[str, Tuple[object, Optional[float]]] = {}
+
+    def _alive(self, key: str):
+        item = self._values.get(key)
+        if item is None:
+            return None
+        value, expires_at = item
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._values[key]
+            return None
+        return value
+
+    def _expiry(self, ttl: Optional[float]) -> Optional[float]:
+        return time.monotonic() + ttl if ttl else None
+
+    async def get(self, key: str) -> Optional[str]:
+        value = self._alive(key)
+        return value if isinstance(value, str) else None
+
+    async def set(self, key: str, value: str, ttl: Optional[float] = None):
+        self._values[key] = (value, self._expiry(ttl))
+
+    async def set_nx(self, key: str, value: str, ttl: Optional[float] = None) -> bool:
+        if self._alive(key) is not None:
+            return False
+        self._values[key] = (value, self._expiry(ttl))
+        return True
+
+    async def delete(self, key: str):
+        self._values.pop(key, None)
+
+    async def rpush(self, key: str, value: str, ttl: Optional[float] = None) -> int:
+        items = self._alive(key)
+        if not isinstance(items, list):
+            items = []
+        items.append(value)
+        self._values[key] = (items, self._expiry(ttl))
+        return len(items)
+
+    async def pop_all(self, key: str) -> List[str]:
+        items = self._alive(key)
+        self._values.pop(key, None)
+        return items if isinstance(items, list) else []
+
+    def fsm_storage(self) -> BaseStorage:
+        return MemoryStorage()
+
+
+class RedisStateBackend(StateBackend):
+    def __init__(self, url: str):
+        from redis.asyncio import Redis
+
+        self.url = url
+        self.redis = Redis.from_url(url, decode_responses=True)
+
+    async def get(self, key: str) -> Optional[str]:
+        return await self.redis.get(key)
+
+    async def set(self, key: str, value: str, ttl: Optional[float] = None):
+        await self.redis.set(key, value, px=int(ttl * 1000) if ttl else None)
+
+    async def set_nx(self, key: str, value: str, ttl: Optional[float] = None) -> bool:
+        return bool(await self.redis.set(key, value, nx=True, px=int(ttl * 1000) if ttl else None))
+
+    async def delete(self, key: str):
+        await self.redis.delete(key)
+
+    async def rpush(self, key: str, value: str, ttl: Optional[float] = None) -> int:
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.rpush(key, value)
+            if ttl:
+                pipe.pexpire(key, int(ttl * 1000))
+            results = await pipe.execute()
+        return results[0]
+
+    async def pop_all(self, key: str) -> List[str]:
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.lrange(key, 0, -1)
+            pipe.delete(key)
+            items, _ = await pipe.execute()
+        return items
+
+    def fsm_storage(self) -> BaseStorage:
+        from aiogram.fsm.storage.redis import RedisStorage
+        from redis.asyncio import Redis
+
+        # FSM memakai koneksi terpisah karena RedisStorage mengharapkan respons bytes
+        return RedisStorage(redis=Redis.from_url(self.url))
+
+    async def close(self):
+        await self.redis.aclose()
+
+
+_state_backend: Optional[StateBackend] = None
+
+def get_state_backend() -> StateBackend:
+    """Returns the shared backend: Redis when REDIS_URL is set, otherwise in-process."""
+    global _state_backend
+    if _state_backend is None:
+        redis_url = os.getenv("REDIS_URL")
+        if redis_url:
+            _state_backend = RedisStateBackend(redis_url)
+            logger.info("Using Redis shared state backend.")
+        else:
+            _state_backend = LocalStateBackend()
+    return _state_backend
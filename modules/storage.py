@@ -0,0 +1,619 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from functools import partial
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from modules.request_context import run_with_deadline, SUPABASE_TIMEOUT
+from modules.metrics import SUPABASE_SECONDS, SUPABASE_ERRORS, SQLITE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+# --- Konfigurasi Penyimpanan ---
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "supabase").strip().lower()  # supabase | sqlite
+SQLITE_PATH = Path(os.getenv("SQLITE_PATH", "state/bot.db"))
+SQLITE_BUSY_TIMEOUT = float(os.getenv("SQLITE_BUSY_TIMEOUT", 5.0))  # detik menunggu kunci tulis proses lain
+SUPABASE_MAX_WORKERS = int(os.getenv("SUPABASE_MAX_WORKERS", 16))  # thread khusus query Supabase dari handler
+SUPABASE_BULK_TIMEOUT = float(os.getenv("SUPABASE_BULK_TIMEOUT", 60.0))  # detik HTTP untuk penulis, ledger dan retensi
+
+MESSAGE_COLUMNS = "role, content, created_at"
+SUPABASE_PAGE_SIZE = 1000  # batas baris per respons PostgREST bawaan Supabase
+
+
+class Storage(ABC):
+    """
+    Persistence operations behind the functions of supabase_handler:
+    users, conversation messages, summaries, business connections and LLM
+    usage. Async methods serve handlers; the plain methods are bulk jobs
+    (message writer, usage ledger, retention) that already run in a thread.
+    Methods raise on failure; callers decide what to log and return.
+    """
+
+    name = "storage"
+
+    @abstractmethod
+    async def ping(self):
+        ...
+
+    # --- users ---
+    @abstractmethod
+    async def get_user(self, user_id: int, columns: str) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    async def insert_user(self, row: Dict[str, Any]):
+        ...
+
+    @abstractmethod
+    async def update_user(self, user_id: int, fields: Dict[str, Any], follow_deadline: bool = True):
+        ...
+
+    @abstractmethod
+    async def increment_chat_count(self, user_id: int, amount: int):
+        ...
+
+    # --- messages ---
+    @abstractmethod
+    async def list_messages(self, user_id: int, business_connection_id: Optional[str], after: Optional[str] = None,
+                            limit: Optional[int] = None, latest: bool = False) -> List[Dict[str, Any]]:
+        """Oldest-first role, content and created_at; `latest` keeps the newest `limit` rows instead of the oldest."""
+
+    @abstractmethod
+    async def add_message(self, row: Dict[str, Any]) -> Optional[Any]:
+        """Inserts one message and returns its id."""
+
+    @abstractmethod
+    async def get_reasoning_text(self, message_id: Any) -> Optional[str]:
+        ...
+
+    @abstractmethod
+    async def delete_conversations(self, user_id: int):
+        """Deletes every message and summary of a user."""
+
+    # --- ringkasan percakapan ---
+    @abstractmethod
+    async def get_summary(self, key: str) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    async def upsert_summary(self, row: Dict[str, Any]):
+        ...
+
+    # --- koneksi bisnis ---
+    @abstractmethod
+    async def get_business_owner_id(self, connection_id: str) -> Optional[int]:
+        ...
+
+    @abstractmethod
+    async def upsert_business_connection(self, row: Dict[str, Any]):
+        ...
+
+    @abstractmethod
+    async def deactivate_business_connection(self, connection_id: str):
+        ...
+
+    # --- operasi massal (blocking) ---
+    @abstractmethod
+    def insert_messages(self, rows: List[Dict[str, Any]]):
+        ...
+
+    @abstractmethod
+    def insert_usage_rows(self, rows: List[Dict[str, Any]]):
+        ...
+
+    @abstractmethod
+    def stale_conversations(self, cutoff: str, limit: int) -> List[Tuple[int, Optional[str]]]:
+        """(user_id, business_connection_id) of up to `limit` conversations whose newest message is older than `cutoff`, longest idle first."""
+
+    @abstractmethod
+    def conversation_messages_before(self, user_id: int, business_connection_id: Optional[str], cutoff: str) -> List[Dict[str, Any]]:
+        """Full rows of one conversation older than `cutoff`, oldest first."""
+
+    @abstractmethod
+    def has_messages_since(self, user_id: int, business_connection_id: Optional[str], cutoff: str) -> bool:
+        ...
+
+    @abstractmethod
+    def summary_row(self, key: str) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    def delete_summary(self, key: str):
+        ...
+
+    @abstractmethod
+    def delete_messages(self, ids: List[Any]):
+        ...
+
+    @abstractmethod
+    def count_messages(self) -> Optional[int]:
+        ...
+
+    async def close(self):
+        pass
+
+
+# --- Supabase ---
+# Query yang ditinggalkan karena tenggat tetap berjalan sampai timeout HTTP-nya; pool terpisah ini
+# mencegahnya memenuhi executor bawaan yang juga dipakai scraping, ledger dan retensi
+_supabase_executor = ThreadPoolExecutor(max_workers=SUPABASE_MAX_WORKERS, thread_name_prefix="supabase")
+
+async def _in_supabase_thread(query):
+    return await asyncio.get_running_loop().run_in_executor(_supabase_executor, query.execute)
+
+async def _execute(query, follow_deadline: bool = True):
+    """
+    Runs a blocking Supabase query on the Supabase thread pool, bounded by
+    SUPABASE_TIMEOUT and, unless follow_deadline is False, by the current
+    request deadline. Writes that record finished work opt out of the latter.
+    """
+    labels = {"table": getattr(query, "path", "").lstrip("/"), "method": getattr(query, "http_method", "")}
+    started = time.perf_counter()
+    try:
+        if not follow_deadline:
+            return await asyncio.wait_for(_in_supabase_thread(query), timeout=SUPABASE_TIMEOUT)
+        return await run_with_deadline(_in_supabase_thread(query), cap=SUPABASE_TIMEOUT, stage="supabase")
+    except Exception:
+        SUPABASE_ERRORS.inc(**labels)
+        raise
+    finally:
+        SUPABASE_SECONDS.observe(time.perf_counter() - started, **labels)
+
+
+# Fungsi Postgres untuk retensi; jalankan sekali di SQL editor Supabase.
+# PostgREST tidak bisa GROUP BY, jadi pengelompokan per percakapan dilakukan di database.
+SUPABASE_FUNCTIONS = """
+CREATE INDEX IF NOT EXISTS messages_conversation ON messages (user_id, business_connection_id, created_at);
+
+CREATE OR REPLACE FUNCTION stale_conversations(cutoff timestamptz, max_conversations integer)
+RETURNS TABLE (user_id bigint, business_connection_id text)
+LANGUAGE sql STABLE AS $$
+    SELECT m.user_id, m.business_connection_id
+    FROM messages m
+    GROUP BY m.user_id, m.business_connection_id
+    HAVING MAX(m.created_at) < cutoff
+    ORDER BY MAX(m.created_at)
+    LIMIT max_conversations
+$$;
+"""
+
+
+class SupabaseStorage(Storage):
+    """Hosted Postgres through supabase-py (PostgREST over HTTP)."""
+
+    name = "supabase"
+
+    def __init__(self, url: str, key: str):
+        from supabase import ClientOptions, create_client
+
+        # Timeout HTTP sama dengan batas tunggu, jadi thread dari query yang ditinggalkan ikut selesai
+        self.client = create_client(url, key, options=ClientOptions(postgrest_client_timeout=SUPABASE_TIMEOUT))
+        # Operasi massal tidak mengikuti tenggat handler; batch yang lambat tidak boleh gagal karena batas 5 detik
+        self.bulk_client = create_client(url, key, options=ClientOptions(postgrest_client_timeout=SUPABASE_BULK_TIMEOUT))
+
+    def _conversation(self, columns: str, user_id: int, business_connection_id: Optional[str], client=None):
+        query = (client or self.client).table('messages').select(columns).eq('user_id', user_id)
+        if business_connection_id:
+            return query.eq('business_connection_id', business_connection_id)
+        return query.is_('business_connection_id', None)
+
+    async def ping(self):
+        await _execute(self.client.table('users').select('id').limit(1), follow_deadline=False)
+
+    async def get_user(self, user_id: int, columns: str) -> Optional[Dict[str, Any]]:
+        response = await _execute(self.client.table('users').select(columns).eq('id', user_id).limit(1))
+        return response.data[0] if response.data else None
+
+    async def insert_user(self, row: Dict[str, Any]):
+        await _execute(self.client.table('users').insert(row))
+
+    async def update_user(self, user_id: int, fields: Dict[str, Any], follow_deadline: bool = True):
+        await _execute(self.client.table('users').update(fields).eq('id', user_id), follow_deadline=follow_deadline)
+
+    async def increment_chat_count(self, user_id: int, amount: int):
+        # PostgREST tidak punya UPDATE relatif tanpa fungsi RPC, jadi baca lalu tulis
+        response = await _execute(self.client.table('users').select('chat_count').eq('id', user_id).limit(1), follow_deadline=False)
+        if response.data:
+            new_count = (response.data[0].get('chat_count') or 0) + amount
+            await self.update_user(user_id, {'chat_count': new_count}, follow_deadline=False)
+
+    async def list_messages(self, user_id: int, business_connection_id: Optional[str], after: Optional[str] = None,
+                            limit: Optional[int] = None, latest: bool = False) -> List[Dict[str, Any]]:
+        query = self._conversation(MESSAGE_COLUMNS, user_id, business_connection_id)
+        if after:
+            query = query.gt('created_at', after)
+        query = query.order('created_at', desc=latest)
+        if limit:
+            query = query.limit(limit)
+        response = await _execute(query)
+        return list(reversed(response.data)) if latest else response.data
+
+    async def add_message(self, row: Dict[str, Any]) -> Optional[Any]:
+        response = await _execute(self.client.table('messages').insert(row))
+        return response.data[0]['id'] if response.data else None
+
+    async def get_reasoning_text(self, message_id: Any) -> Optional[str]:
+        response = await _execute(self.client.table('messages').select('reasoning_text').eq('id', message_id).limit(1))
+        return response.data[0].get('reasoning_text') if response.data else None
+
+    async def delete_conversations(self, user_id: int):
+        await _execute(self.client.table('messages').delete().eq('user_id', user_id))
+        await _execute(self.client.table('conversation_summaries').delete().eq('user_id', user_id))
+
+    async def get_summary(self, key: str) -> Optional[Dict[str, Any]]:
+        response = await _execute(self.client.table('conversation_summaries').select('summary, summarized_until').eq('conversation_key', key).limit(1))
+        return response.data[0] if response.data else None
+
+    async def upsert_summary(self, row: Dict[str, Any]):
+        await _execute(self.client.table('conversation_summaries').upsert(row))
+
+    async def get_business_owner_id(self, connection_id: str) -> Optional[int]:
+        response = await _execute(self.client.table('business_connections').select('user_id').eq('id', connection_id).limit(1))
+        return response.data[0].get('user_id') if response.data else None
+
+    async def upsert_business_connection(self, row: Dict[str, Any]):
+        await _execute(self.client.table('business_connections').upsert(row))
+
+    async def deactivate_business_connection(self, connection_id: str):
+        await _execute(self.client.table('business_connections').update({'is_active': False}).eq('id', connection_id))
+
+    def insert_messages(self, rows: List[Dict[str, Any]]):
+        self.bulk_client.table('messages').insert(rows).execute()
+
+    def insert_usage_rows(self, rows: List[Dict[str, Any]]):
+        self.bulk_client.table('llm_usage').insert(rows).execute()
+
+    def _pages(self, build_query: Callable[[], Any]) -> List[Dict[str, Any]]:
+        """All rows of a query, read in PostgREST-sized pages; builders are mutable, so one is built per page."""
+        rows: List[Dict[str, Any]] = []
+        while True:
+            page = build_query().range(len(rows), len(rows) + SUPABASE_PAGE_SIZE - 1).execute().data
+            rows += page
+            if len(page) < SUPABASE_PAGE_SIZE:
+                return rows
+
+    def stale_conversations(self, cutoff: str, limit: int) -> List[Tuple[int, Optional[str]]]:
+        # Fungsi stale_conversations dari SUPABASE_FUNCTIONS
+        rows = self.bulk_client.rpc('stale_conversations', {'cutoff': cutoff, 'max_conversations': limit}).execute().data
+        return [(row['user_id'], row['business_connection_id']) for row in rows]
+
+    def conversation_messages_before(self, user_id: int, business_connection_id: Optional[str], cutoff: str) -> List[Dict[str, Any]]:
+        return self._pages(lambda: self._conversation('*', user_id, business_connection_id, self.bulk_client)
+                           .lt('created_at', cutoff).order('created_at', desc=False).order('id', desc=False))
+
+    def has_messages_since(self, user_id: int, business_connection_id: Optional[str], cutoff: str) -> bool:
+        return bool(self._conversation('id', user_id, business_connection_id, self.bulk_client).gte('created_at', cutoff).limit(1).execute().data)
+
+    def summary_row(self, key: str) -> Optional[Dict[str, Any]]:
+        data = self.bulk_client.table('conversation_summaries').select('*').eq('conversation_key', key).limit(1).execute().data
+        return data[0] if data else None
+
+    def delete_summary(self, key: str):
+        self.bulk_client.table('conversation_summaries').delete().eq('conversation_key', key).execute()
+
+    def delete_messages(self, ids: List[Any]):
+        self.bulk_client.table('messages').delete().in_('id', ids).execute()
+
+    def count_messages(self) -> Optional[int]:
+        return self.bulk_client.table('messages').select('id', count='exact').limit(1).execute().count
+
+
+# --- SQLite ---
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY,
+    username TEXT,
+    language_code TEXT,
+    active_model TEXT,
+    chat_count INTEGER NOT NULL DEFAULT 0,
+    last_chat_date TEXT,
+    custom_prompt TEXT
+);
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT,
+    reasoning_text TEXT,
+    business_connection_id TEXT,
+    created_at TEXT NOT NULL
+);
+-- Riwayat per percakapan dibaca dengan (user_id, business_connection_id) dan diurutkan menurut waktu
+CREATE INDEX IF NOT EXISTS messages_conversation ON messages (user_id, business_connection_id, created_at);
+-- Retensi memindai pesan tertua
+CREATE INDEX IF NOT EXISTS messages_created_at ON messages (created_at);
+CREATE TABLE IF NOT EXISTS conversation_summaries (
+    conversation_key TEXT PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    business_connection_id TEXT,
+    summary TEXT,
+    summarized_until TEXT,
+    updated_at TEXT
+);
+CREATE INDEX IF NOT EXISTS conversation_summaries_user ON conversation_summaries (user_id);
+CREATE TABLE IF NOT EXISTS business_connections (
+    id TEXT PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    is_active INTEGER NOT NULL DEFAULT 1
+);
+CREATE TABLE IF NOT EXISTS llm_usage (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    period_start TEXT,
+    period_end TEXT,
+    model TEXT,
+    api_key TEXT,
+    feature TEXT,
+    user_id INTEGER,
+    requests INTEGER,
+    prompt_tokens INTEGER,
+    completion_tokens INTEGER,
+    queue_time REAL,
+    total_time REAL
+);
+"""
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _insert_sql(verb: str, table: str, columns: List[str]) -> str:
+    return f"{verb} INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})"
+
+
+class SqliteStorage(Storage):
+    """
+    Embedded database file for single-worker deployments, tests and the
+    load harness. Runs in WAL mode so readers never wait for the writer;
+    one connection is shared and every statement runs on a single
+    database thread, so handlers never block the event loop and see their
+    own writes in order. Bulk inserts are one transaction per batch.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: Path, busy_timeout: float = SQLITE_BUSY_TIMEOUT):
+        self.path = path
+        if str(path) != ":memory:":
+            path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(path), timeout=busy_timeout, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite")
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")  # aman dengan WAL; fsync hanya saat checkpoint
+            self._conn.execute("PRAGMA temp_store=MEMORY")
+            self._conn.executescript(SQLITE_SCHEMA)
+        self._columns = {table: self._table_columns(table) for table in ("users", "messages", "llm_usage")}
+
+    def _table_columns(self, table: str) -> List[str]:
+        return [row["name"] for row in self._conn.execute(f"PRAGMA table_info({table})")]
+
+    def _run(self, op: str, fn: Callable[[sqlite3.Connection], Any]) -> Any:
+        started = time.perf_counter()
+        try:
+            with self._lock:
+                return fn(self._conn)
+        finally:
+            SQLITE_SECONDS.observe(time.perf_counter() - started, op=op)
+
+    def _run_blocking(self, op: str, fn: Callable[[sqlite3.Connection], Any]) -> Any:
+        """For the bulk methods, called from worker threads: queues the statement on the database thread and waits."""
+        return self._executor.submit(self._run, op, fn).result()
+
+    async def _in_thread(self, op: str, fn: Callable[[sqlite3.Connection], Any]) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(self._executor, partial(self._run, op, fn))
+
+    async def _call(self, op: str, fn: Callable[[sqlite3.Connection], Any], follow_deadline: bool = True) -> Any:
+        """
+        Same bounds as the Supabase _execute: SUPABASE_TIMEOUT and, unless
+        follow_deadline is False, the request deadline, so a checkpoint or a
+        queue behind the database thread cannot hold a handler past it.
+        Statements still waiting in the queue are dropped when abandoned.
+        """
+        if not follow_deadline:
+            return await asyncio.wait_for(self._in_thread(op, fn), timeout=SUPABASE_TIMEOUT)
+        return await run_with_deadline(self._in_thread(op, fn), cap=SUPABASE_TIMEOUT, stage="sqlite")
+
+    @staticmethod
+    def _transaction(sql: str, params=()) -> Callable[[sqlite3.Connection], sqlite3.Cursor]:
+        def write(conn: sqlite3.Connection) -> sqlite3.Cursor:
+            with conn:
+                return conn.execute(sql, params)
+        return write
+
+    def _insert_many(self, op: str, table: str, rows: List[Dict[str, Any]], defaults: Dict[str, Callable[[], Any]]):
+        """One transaction for the whole batch; unknown keys are ignored like extra JSON fields."""
+        if not rows:
+            return
+        columns = [column for column in self._columns[table] if column in defaults or any(column in row for row in rows)]
+        values = [
+            tuple(defaults[column]() if column in defaults and column not in row else row.get(column) for column in columns)
+            for row in rows
+        ]
+        sql = _insert_sql("INSERT", table, columns)
+
+        def insert(conn: sqlite3.Connection):
+            with conn:
+                conn.executemany(sql, values)
+        self._run_blocking(op, insert)
+
+    async def ping(self):
+        await self._call("ping", lambda conn: conn.execute("SELECT 1").fetchone(), follow_deadline=False)
+
+    async def get_user(self, user_id: int, columns: str) -> Optional[Dict[str, Any]]:
+        selected = [column.strip() for column in columns.split(",")]
+        unknown = set(selected) - set(self._columns["users"])
+        if unknown:
+            raise ValueError(f"Unknown users columns: {', '.join(sorted(unknown))}")
+        row = await self._call("get_user", lambda conn: conn.execute(
+            f"SELECT {', '.join(selected)} FROM users WHERE id = ?", (user_id,)).fetchone())
+        return dict(row) if row else None
+
+    async def insert_user(self, row: Dict[str, Any]):
+        columns = [column for column in self._columns["users"] if column in row]
+        await self._call("insert_user", self._transaction(
+            _insert_sql("INSERT OR IGNORE", "users", columns),
+            [row[column] for column in columns]))
+
+    async def update_user(self, user_id: int, fields: Dict[str, Any], follow_deadline: bool = True):
+        unknown = set(fields) - set(self._columns["users"])
+        if unknown:
+            raise ValueError(f"Unknown users columns: {', '.join(sorted(unknown))}")
+        assignments = ", ".join(f"{column} = ?" for column in fields)
+        await self._call("update_user", self._transaction(
+            f"UPDATE users SET {assignments} WHERE id = ?", [*fields.values(), user_id]), follow_deadline=follow_deadline)
+
+    async def increment_chat_count(self, user_id: int, amount: int):
+        await self._call("increment_chat_count", self._transaction(
+            "UPDATE users SET chat_count = chat_count + ? WHERE id = ?", (amount, user_id)), follow_deadline=False)
+
+    async def list_messages(self, user_id: int, business_connection_id: Optional[str], after: Optional[str] = None,
+                            limit: Optional[int] = None, latest: bool = False) -> List[Dict[str, Any]]:
+        # "IS ?" cocok untuk NULL maupun nilai, dan tetap memakai indeks messages_conversation
+        sql = f"SELECT {MESSAGE_COLUMNS} FROM messages WHERE user_id = ? AND business_connection_id IS ?"
+        params: List[Any] = [user_id, business_connection_id or None]
+        if after:
+            sql += " AND created_at > ?"
+            params.append(after)
+        sql += f" ORDER BY created_at {'DESC' if latest else 'ASC'}, id {'DESC' if latest else 'ASC'}"
+        if limit:
+            sql += " LIMIT ?"
+            params.append(limit)
+        rows = await self._call("list_messages", lambda conn: conn.execute(sql, params).fetchall())
+        messages = [dict(row) for row in rows]
+        return list(reversed(messages)) if latest else messages
+
+    async def add_message(self, row: Dict[str, Any]) -> Optional[Any]:
+        row = {'created_at': _now(), **row}
+        columns = [column for column in self._columns["messages"] if column in row]
+        cursor = await self._call("add_message", self._transaction(
+            _insert_sql("INSERT", "messages", columns),
+            [row[column] for column in columns]))
+        return cursor.lastrowid
+
+    async def get_reasoning_text(self, message_id: Any) -> Optional[str]:
+        row = await self._call("get_reasoning_text", lambda conn: conn.execute(
+            "SELECT reasoning_text FROM messages WHERE id = ?", (message_id,)).fetchone())
+        return row["reasoning_text"] if row else None
+
+    async def delete_conversations(self, user_id: int):
+        def delete(conn: sqlite3.Connection):
+            with conn:
+                conn.execute("DELETE FROM messages WHERE user_id = ?", (user_id,))
+                conn.execute("DELETE FROM conversation_summaries WHERE user_id = ?", (user_id,))
+        await self._call("delete_conversations", delete)
+
+    async def get_summary(self, key: str) -> Optional[Dict[str, Any]]:
+        row = await self._call("get_summary", lambda conn: conn.execute(
+            "SELECT summary, summarized_until FROM conversation_summaries WHERE conversation_key = ?", (key,)).fetchone())
+        return dict(row) if row else None
+
+    async def upsert_summary(self, row: Dict[str, Any]):
+        await self._call("upsert_summary", self._transaction(
+            "INSERT INTO conversation_summaries (conversation_key, user_id, business_connection_id, summary, summarized_until, updated_at) "
+            "VALUES (:conversation_key, :user_id, :business_connection_id, :summary, :summarized_until, :updated_at) "
+            "ON CONFLICT (conversation_key) DO UPDATE SET summary = excluded.summary, "
+            "summarized_until = excluded.summarized_until, updated_at = excluded.updated_at",
+            row))
+
+    async def get_business_owner_id(self, connection_id: str) -> Optional[int]:
+        row = await self._call("get_business_owner_id", lambda conn: conn.execute(
+            "SELECT user_id FROM business_connections WHERE id = ?", (connection_id,)).fetchone())
+        return row["user_id"] if row else None
+
+    async def upsert_business_connection(self, row: Dict[str, Any]):
+        await self._call("upsert_business_connection", self._transaction(
+            "INSERT INTO business_connections (id, user_id, is_active) VALUES (:id, :user_id, :is_active) "
+            "ON CONFLICT (id) DO UPDATE SET user_id = excluded.user_id, is_active = excluded.is_active",
+            row))
+
+    async def deactivate_business_connection(self, connection_id: str):
+        await self._call("deactivate_business_connection", self._transaction(
+            "UPDATE business_connections SET is_active = 0 WHERE id = ?", (connection_id,)))
+
+    def insert_messages(self, rows: List[Dict[str, Any]]):
+        self._insert_many("insert_messages", "messages", rows, {"created_at": _now})
+
+    def insert_usage_rows(self, rows: List[Dict[str, Any]]):
+        self._insert_many("insert_usage_rows", "llm_usage", rows, {})
+
+    def stale_conversations(self, cutoff: str, limit: int) -> List[Tuple[int, Optional[str]]]:
+        rows = self._run_blocking("stale_conversations", lambda conn: conn.execute(
+            "SELECT user_id, business_connection_id FROM messages GROUP BY user_id, business_connection_id "
+            "HAVING MAX(created_at) < ? ORDER BY MAX(created_at) LIMIT ?", (cutoff, limit)).fetchall())
+        return [(row["user_id"], row["business_connection_id"]) for row in rows]
+
+    def conversation_messages_before(self, user_id: int, business_connection_id: Optional[str], cutoff: str) -> List[Dict[str, Any]]:
+        rows = self._run_blocking("conversation_messages_before", lambda conn: conn.execute(
+            "SELECT * FROM messages WHERE user_id = ? AND business_connection_id IS ? AND created_at < ? ORDER BY created_at, id",
+            (user_id, business_connection_id or None, cutoff)).fetchall())
+        return [dict(row) for row in rows]
+
+    def has_messages_since(self, user_id: int, business_connection_id: Optional[str], cutoff: str) -> bool:
+        return self._run_blocking("has_messages_since", lambda conn: conn.execute(
+            "SELECT 1 FROM messages WHERE user_id = ? AND business_connection_id IS ? AND created_at >= ? LIMIT 1",
+            (user_id, business_connection_id or None, cutoff)).fetchone()) is not None
+
+    def summary_row(self, key: str) -> Optional[Dict[str, Any]]:
+        row = self._run_blocking("summary_row", lambda conn: conn.execute(
+            "SELECT * FROM conversation_summaries WHERE conversation_key = ?", (key,)).fetchone())
+        return dict(row) if row else None
+
+    def delete_summary(self, key: str):
+        self._run_blocking("delete_summary", self._transaction("DELETE FROM conversation_summaries WHERE conversation_key = ?", (key,)))
+
+    def delete_messages(self, ids: List[Any]):
+        def delete(conn: sqlite3.Connection):
+            with conn:
+                conn.executemany("DELETE FROM messages WHERE id = ?", [(message_id,) for message_id in ids])
+        self._run_blocking("delete_messages", delete)
+
+    def count_messages(self) -> Optional[int]:
+        return self._run_blocking("count_messages", lambda conn: conn.execute("SELECT COUNT(*) FROM messages").fetchone()[0])
+
+    def upsert_users(self, rows: List[Dict[str, Any]]):
+        """Seeds or overwrites user rows; used by tools/loadtest."""
+        for row in rows:
+            columns = [column for column in self._columns["users"] if column in row]
+            self._run_blocking("upsert_users", self._transaction(_insert_sql("INSERT OR REPLACE", "users", columns), [row[column] for column in columns]))
+
+    def row_counts(self) -> Dict[str, int]:
+        tables = ("users", "messages", "conversation_summaries", "business_connections", "llm_usage")
+        return self._run_blocking("row_counts", lambda conn: {
+            table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] for table in tables
+        })
+
+    async def close(self):
+        # shutdown menunggu statement yang masih antre; jangan sampai menahan event loop
+        await asyncio.to_thread(self._executor.shutdown, wait=True)
+        with self._lock:
+            self._conn.close()
+
+
+def init_storage() -> Optional[Storage]:
+    """Creates the backend selected by STORAGE_BACKEND; returns None when it is not configured."""
+    if STORAGE_BACKEND == "sqlite":
+        logger.info("Using SQLite storage at %s", SQLITE_PATH)
+        return SqliteStorage(SQLITE_PATH)
+    if STORAGE_BACKEND != "supabase":
+        logger.error("Unknown STORAGE_BACKEND %r (expected supabase or sqlite).", STORAGE_BACKEND)
+        return None
+    url = os.environ.get("SUPABASE_URL")
+    key = os.environ.get("SUPABASE_KEY")
+    if not url or not key:
+        logger.error("Supabase URL or Key not found in .env file.")
+        return None
+    return SupabaseStorage(url, key)
@@ -0,0 +1,86 @@
+import asyncio
+import logging
+import os
+from typing import Set
+
+from cachetools import TTLCache
+from modules.storage import Storage
+
+from modules.groq_handler import HISTORY_WINDOW, summarize_conversation
+from modules.request_context import background_context
+from modules.supabase_handler import get_conversation_summary, get_messages_after, save_conversation_summary, conversation_key
+
+logger = logging.getLogger(__name__)
+
+# --- Konfigurasi Ringkasan Bergulir ---
+SUMMARY_EVERY_TURNS = int(os.getenv("SUMMARY_EVERY_TURNS", 6))   # cek ringkasan setiap N giliran
+SUMMARY_MIN_MESSAGES = int(os.getenv("SUMMARY_MIN_MESSAGES", 8))  # minimal pesan lama sebelum diringkas
+SUMMARY_BATCH = 40
+SUMMARY_MAX_CHARS_PER_MESSAGE = 1500
+SUMMARY_CONCURRENCY = 2
+
+
+class ConversationSummarizer:
+    """
+    Compresses turns that fell out of the prompt window into a stored
+    rolling summary per conversation. Runs as background tasks so the
+    reply path never waits for it.
+    """
+
+    def __init__(self):
+        self._turns = TTLCache(maxsize=50000, ttl=24 * 3600)
+        self._running: Set[str] = set()
+        self._tasks: Set[asyncio.Task] = set()
+        self._semaphore = asyncio.Semaphore(SUMMARY_CONCURRENCY)
+        self.summaries_written = 0
+
+    def schedule(self, supabase: Storage, user_id: int, business_connection_id: str = None):
+        """Counts a finished turn and starts a summary pass every SUMMARY_EVERY_TURNS turns."""
+        key = conversation_key(user_id, business_connection_id)
+        turns = self._turns.get(key, 0) + 1
+        self._turns[key] = turns
+        if turns % SUMMARY_EVERY_TURNS or key in self._running:
+            return
+
+        self._running.add(key)
+        # Ringkasan berjalan di luar tenggat pesan yang memicunya
+        task = asyncio.create_task(self._summarize(supabase, user_id, business_connection_id, key), context=background_context())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _summarize(self, supabase: Storage, user_id: int, business_connection_id: str, key: str):
+        try:
+            async with self._semaphore:
+                existing = await get_conversation_summary(supabase, user_id, business_connection_id) or {}
+                messages = await get_messages_after(
+                    supabase, user_id, business_connection_id,
+                    after=existing.get("summarized_until"),
+                    limit=SUMMARY_BATCH + HISTORY_WINDOW,
+                )
+                # Pesan dalam jendela prompt tetap dikirim utuh, jadi tidak perlu diringkas
+                older = messages[:-HISTORY_WINDOW]
+                if len(older) < SUMMARY_MIN_MESSAGES:
+                    return
+
+                trimmed = [
+                    {"role": m["role"], "content": (m["content"] or "")[:SUMMARY_MAX_CHARS_PER_MESSAGE]}
+                    for m in older
+                ]
+                summary = await summarize_conversation(existing.get("summary"), trimmed, user_id)
+                if not summary:
+                    return
+
+                if await save_conversation_summary(supabase, user_id, business_connection_id, summary, older[-1]["created_at"]):
+                    self.summaries_written += 1
+        except Exception as e:
+            logger.error("Error in background summarizer for %s: %s", key, e)
+        finally:
+            self._running.discard(key)
+
+    async def stop(self):
+        for task in list(self._tasks):
+            task.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+summarizer = ConversationSummarizer()
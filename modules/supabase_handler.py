@@ -1,53 +1,50 @@
 import os
-from datetime import date
-from supabase import create_client, Client
+import logging
+from datetime import date, datetime, timezone
 from dotenv import load_dotenv
 
+from modules.storage import Storage
+
+logger = logging.getLogger(__name__)
+
 load_dotenv()
 
-def init_supabase_client():
-    url: str = os.environ.get("SUPABASE_URL")
-    key: str = os.environ.get("SUPABASE_KEY")
-    if not url or not key:
-        print("Error: Supabase URL or Key not found in .env file.")
-        return None
-    return create_client(url, key)
+# Model bawaan untuk pengguna baru dan saat model pengguna tidak bisa dibaca
+DEFAULT_MODEL = os.getenv("DEFAULT_MODEL", "llama-3.3-70b-versatile")
+
+async def ping(supabase: Storage):
+    """Cheap query that opens the database connection before the first update."""
+    await supabase.ping()
 
-async def get_or_create_user(supabase: Client, user_id: int, username: str):
+async def get_or_create_user(supabase: Storage, user_id: int, username: str):
     try:
-        response = supabase.table('users').select('id').eq('id', user_id).execute()
-        if not response.data:
+        if not await supabase.get_user(user_id, 'id'):
             user_data = {
                 'id': user_id,
                 'username': username,
                 'language_code': 'en',
-                'active_model': 'llama3-8b-8192',
+                'active_model': DEFAULT_MODEL,
                 'chat_count': 0,
                 'last_chat_date': str(date.today())
             }
-            supabase.table('users').insert(user_data).execute()
-            print(f"New user created: {username} ({user_id})")
+            await supabase.insert_user(user_data)
+            logger.info("New user created: %s (%s)", username, user_id)
         return user_id
     except Exception as e:
-        print(f"Error in get_or_create_user: {e}")
+        logger.error("Error in get_or_create_user: %s", e)
         return None
 
 # ... (fungsi-fungsi lain tetap sama) ...
-async def get_user_messages(supabase: Client, user_id: int, business_connection_id: str = None):
-    try:
-        query = supabase.table('messages').select('role, content').eq('user_id', user_id)
-        if business_connection_id:
-            query = query.eq('business_connection_id', business_connection_id)
-        else:
-            query = query.is_('business_connection_id', None)
-        
-        response = query.order('created_at', desc=False).execute()
-        return response.data
-    except Exception as e:
-        print(f"Error fetching messages for user {user_id}: {e}")
+async def get_user_messages(supabase: Storage, user_id: int, business_connection_id: str = None, limit: int = None):
+    """Returns the conversation in chronological order; with `limit`, only the most recent messages."""
+    try:
+        messages = await supabase.list_messages(user_id, business_connection_id, limit=limit, latest=bool(limit))
+        return [{'role': m['role'], 'content': m['content']} for m in messages]
+    except Exception as e:
+        logger.error("Error fetching messages for user %s: %s", user_id, e)
         return []
 
-async def save_message(supabase: Client, user_id: int, role: str, content: str, business_connection_id: str = None, reasoning: str = None):
+async def save_message(supabase: Storage, user_id: int, role: str, content: str, business_connection_id: str = None, reasoning: str = None):
     try:
         message_data = {
             'user_id': user_id,
@@ -56,126 +53,218 @@ async def save_message(supabase: Client, user_id: int, role: str, content: str,
             'reasoning_text': reasoning,
             'business_connection_id': business_connection_id
         }
-        response = supabase.table('messages').insert(message_data).execute()
-        if response.data:
-            return response.data[0]['id']
+        return await supabase.add_message(message_data)
+    except Exception as e:
+        logger.error("Error saving message for user %s: %s", user_id, e)
+    return None
+
+def insert_messages(supabase: Storage, rows: list) -> bool:
+    """Bulk insert used by the background message writer. Returns True on success."""
+    try:
+        supabase.insert_messages(rows)
+        return True
+    except Exception as e:
+        logger.error("Error inserting %s messages: %s", len(rows), e)
+        return False
+
+# --- PEMAKAIAN LLM ---
+# Tabel llm_usage: period_start, period_end, model, api_key (label, bukan kunci), feature, user_id,
+# requests, prompt_tokens, completion_tokens, queue_time, total_time
+def insert_usage_rows(supabase: Storage, rows: list) -> bool:
+    """Bulk insert used by the usage ledger flush. Returns True on success."""
+    try:
+        supabase.insert_usage_rows(rows)
+        return True
     except Exception as e:
-        print(f"Error saving message for user {user_id}: {e}")
+        logger.error("Error inserting %s usage rows: %s", len(rows), e)
+        return False
+
+# --- RINGKASAN PERCAKAPAN ---
+# Tabel conversation_summaries: conversation_key (PK), user_id, business_connection_id,
+# summary, summarized_until (created_at pesan terakhir yang sudah diringkas), updated_at
+def conversation_key(user_id: int, business_connection_id: str = None) -> str:
+    return f"{user_id}:{business_connection_id or 'private'}"
+
+async def get_conversation_summary(supabase: Storage, user_id: int, business_connection_id: str = None):
+    try:
+        return await supabase.get_summary(conversation_key(user_id, business_connection_id))
+    except Exception as e:
+        logger.error("Error fetching conversation summary for user %s: %s", user_id, e)
     return None
 
-async def get_business_owner_id(supabase: Client, connection_id: str) -> int | None:
+async def save_conversation_summary(supabase: Storage, user_id: int, business_connection_id: str, summary: str, summarized_until: str):
+    try:
+        await supabase.upsert_summary({
+            'conversation_key': conversation_key(user_id, business_connection_id),
+            'user_id': user_id,
+            'business_connection_id': business_connection_id,
+            'summary': summary,
+            'summarized_until': summarized_until,
+            'updated_at': datetime.now(timezone.utc).isoformat()
+        })
+        return True
+    except Exception as e:
+        logger.error("Error saving conversation summary for user %s: %s", user_id, e)
+        return False
+
+async def get_messages_after(supabase: Storage, user_id: int, business_connection_id: str = None, after: str = None, limit: int = 200):
+    """Oldest-first messages created after `after`, including their created_at."""
+    try:
+        return await supabase.list_messages(user_id, business_connection_id, after=after, limit=limit)
+    except Exception as e:
+        logger.error("Error fetching messages after %s for user %s: %s", after, user_id, e)
+        return []
+
+# --- RETENSI & ARSIP ---
+# Fungsi retensi berjalan di thread dan melempar exception saat gagal
+def get_stale_conversations(supabase: Storage, cutoff: str, limit: int):
+    """Up to `limit` conversations whose newest message is older than `cutoff`, as (user_id, business_connection_id)."""
+    return supabase.stale_conversations(cutoff, limit)
+
+def get_conversation_messages_before(supabase: Storage, user_id: int, business_connection_id: str, cutoff: str):
+    return supabase.conversation_messages_before(user_id, business_connection_id, cutoff)
+
+def has_messages_since(supabase: Storage, user_id: int, business_connection_id: str, cutoff: str) -> bool:
+    return supabase.has_messages_since(user_id, business_connection_id, cutoff)
+
+def get_summary_row(supabase: Storage, user_id: int, business_connection_id: str = None):
+    return supabase.summary_row(conversation_key(user_id, business_connection_id))
+
+def delete_conversation_summary(supabase: Storage, user_id: int, business_connection_id: str = None):
+    supabase.delete_summary(conversation_key(user_id, business_connection_id))
+
+def delete_messages_by_ids(supabase: Storage, ids: list):
+    supabase.delete_messages(ids)
+
+def count_messages(supabase: Storage):
+    try:
+        return supabase.count_messages()
+    except Exception as e:
+        logger.error("Error counting messages: %s", e)
+        return None
+
+# --- KONEKSI BISNIS ---
+# Tabel business_connections: id (PK), user_id, is_active
+async def save_business_connection(supabase: Storage, connection_id: str, user_id: int):
+    try:
+        await supabase.upsert_business_connection({'id': connection_id, 'user_id': user_id, 'is_active': True})
+        return True
+    except Exception as e:
+        logger.error("Error saving business connection %s: %s", connection_id, e)
+        return False
+
+async def deactivate_business_connection(supabase: Storage, connection_id: str):
+    try:
+        await supabase.deactivate_business_connection(connection_id)
+        return True
+    except Exception as e:
+        logger.error("Error deactivating business connection %s: %s", connection_id, e)
+        return False
+
+async def get_business_owner_id(supabase: Storage, connection_id: str) -> int | None:
     """Mendapatkan ID pengguna pemilik koneksi bisnis."""
     try:
-        response = supabase.table('business_connections').select('user_id').eq('id', connection_id).single().execute()
-        if response.data:
-            return response.data.get('user_id')
+        return await supabase.get_business_owner_id(connection_id)
     except Exception as e:
-        print(f"Error fetching business owner ID: {e}")
+        logger.error("Error fetching business owner ID: %s", e)
     return None
 
-async def get_reasoning_text(supabase: Client, message_id: str):
+async def get_reasoning_text(supabase: Storage, message_id: str):
     try:
-        response = supabase.table('messages').select('reasoning_text').eq('id', message_id).single().execute()
-        if response.data:
-            return response.data.get('reasoning_text')
+        return await supabase.get_reasoning_text(message_id)
     except Exception as e:
-        print(f"Error fetching reasoning for message {message_id}: {e}")
+        logger.error("Error fetching reasoning for message %s: %s", message_id, e)
     return None
 
-async def delete_user_messages(supabase: Client, user_id: int):
+async def delete_user_messages(supabase: Storage, user_id: int):
     try:
-        supabase.table('messages').delete().eq('user_id', user_id).execute()
-        print(f"Message history deleted for user {user_id}")
+        await supabase.delete_conversations(user_id)
+        logger.info("Message history deleted for user %s", user_id)
         return True
     except Exception as e:
-        print(f"Error deleting messages for user {user_id}: {e}")
+        logger.error("Error deleting messages for user %s: %s", user_id, e)
         return False
 
-async def update_user_language(supabase: Client, user_id: int, lang_code: str):
+async def update_user_language(supabase: Storage, user_id: int, lang_code: str):
     try:
-        supabase.table('users').update({'language_code': lang_code}).eq('id', user_id).execute()
-        print(f"Language for user {user_id} updated to {lang_code}")
+        await supabase.update_user(user_id, {'language_code': lang_code})
+        logger.info("Language for user %s updated to %s", user_id, lang_code)
         return True
     except Exception as e:
-        print(f"Error updating language for user {user_id}: {e}")
+        logger.error("Error updating language for user %s: %s", user_id, e)
         return False
 
-async def get_user_language(supabase: Client, user_id: int):
+async def get_user_language(supabase: Storage, user_id: int):
     try:
-        response = supabase.table('users').select('language_code').eq('id', user_id).single().execute()
-        if response.data:
-            return response.data.get('language_code')
+        user = await supabase.get_user(user_id, 'language_code')
+        if user and user.get('language_code'):
+            return user['language_code']
     except Exception as e:
-        print(f"Error fetching language for user {user_id}: {e}")
+        logger.error("Error fetching language for user %s: %s", user_id, e)
     return 'en'
 
-async def get_user_model(supabase: Client, user_id: int):
+async def get_user_model(supabase: Storage, user_id: int):
     try:
-        response = supabase.table('users').select('active_model').eq('id', user_id).single().execute()
-        if response.data and response.data.get('active_model'):
-            return response.data.get('active_model')
+        user = await supabase.get_user(user_id, 'active_model')
+        if user and user.get('active_model'):
+            return user['active_model']
     except Exception as e:
-        print(f"Error fetching model for user {user_id}: {e}")
-    return 'llama3-8b-8192'
+        logger.error("Error fetching model for user %s: %s", user_id, e)
+    return DEFAULT_MODEL
 
-async def update_user_model(supabase: Client, user_id: int, model_value: str):
+async def update_user_model(supabase: Storage, user_id: int, model_value: str):
     try:
-        supabase.table('users').update({'active_model': model_value}).eq('id', user_id).execute()
-        print(f"Model for user {user_id} updated to {model_value}")
+        await supabase.update_user(user_id, {'active_model': model_value})
+        logger.info("Model for user %s updated to %s", user_id, model_value)
         return True
     except Exception as e:
-        print(f"Error updating model for user {user_id}: {e}")
+        logger.error("Error updating model for user %s: %s", user_id, e)
         return False
 
 # --- FUNGSI BARU UNTUK LIMIT ---
-async def get_user_chat_info(supabase: Client, user_id: int):
+async def get_user_chat_info(supabase: Storage, user_id: int):
     try:
-        response = supabase.table('users').select('chat_count, last_chat_date').eq('id', user_id).single().execute()
-        return response.data
+        return await supabase.get_user(user_id, 'chat_count, last_chat_date')
     except Exception as e:
-        print(f"Error fetching chat info for user {user_id}: {e}")
+        logger.error("Error fetching chat info for user %s: %s", user_id, e)
         return None
 
-async def reset_user_chat_count(supabase: Client, user_id: int, today_date: date):
+async def reset_user_chat_count(supabase: Storage, user_id: int, today_date: date):
     try:
-        supabase.table('users').update({'chat_count': 0, 'last_chat_date': str(today_date)}).eq('id', user_id).execute()
+        await supabase.update_user(user_id, {'chat_count': 0, 'last_chat_date': str(today_date)})
     except Exception as e:
-        print(f"Error resetting chat count for user {user_id}: {e}")
+        logger.error("Error resetting chat count for user %s: %s", user_id, e)
 
-async def increment_user_chat_count(supabase: Client, user_id: int):
+async def increment_user_chat_count(supabase: Storage, user_id: int, amount: int = 1):
     try:
-        response = supabase.table('users').select('chat_count').eq('id', user_id).single().execute()
-        if response.data:
-            current_count = response.data.get('chat_count', 0)
-            new_count = current_count + 1
-            supabase.table('users').update({'chat_count': new_count}).eq('id', user_id).execute()
+        await supabase.increment_chat_count(user_id, amount)
     except Exception as e:
-        print(f"Error incrementing chat count for user {user_id}: {e}")
+        logger.error("Error incrementing chat count for user %s: %s", user_id, e)
 
-async def get_user_prompt(supabase: Client, user_id: int):
+async def get_user_prompt(supabase: Storage, user_id: int):
     try:
-        response = supabase.table('users').select('custom_prompt').eq('id', user_id).single().execute()
-        if response.data and response.data.get('custom_prompt'):
-            return response.data.get('custom_prompt')
+        user = await supabase.get_user(user_id, 'custom_prompt')
+        if user and user.get('custom_prompt'):
+            return user['custom_prompt']
     except Exception as e:
-        print(f"Error fetching custom prompt for user {user_id}: {e}")
+        logger.error("Error fetching custom prompt for user %s: %s", user_id, e)
     return None
 
-async def update_user_prompt(supabase: Client, user_id: int, prompt: str):
+async def update_user_prompt(supabase: Storage, user_id: int, prompt: str):
     try:
-        supabase.table('users').update({'custom_prompt': prompt}).eq('id', user_id).execute()
-        print(f"Custom prompt for user {user_id} updated.")
+        await supabase.update_user(user_id, {'custom_prompt': prompt})
+        logger.info("Custom prompt for user %s updated.", user_id)
         return True
     except Exception as e:
-        print(f"Error updating custom prompt for user {user_id}: {e}")
+        logger.error("Error updating custom prompt for user %s: %s", user_id, e)
         return False
 
-async def delete_user_prompt(supabase: Client, user_id: int):
+async def delete_user_prompt(supabase: Storage, user_id: int):
     try:
         # Mengatur nilai kolom menjadi NULL
-        supabase.table('users').update({'custom_prompt': None}).eq('id', user_id).execute()
-        print(f"Custom prompt for user {user_id} deleted.")
+        await supabase.update_user(user_id, {'custom_prompt': None})
+        logger.info("Custom prompt for user %s deleted.", user_id)
         return True
     except Exception as e:
-        print(f"Error deleting custom prompt for user {user_id}: {e}")
+        logger.error("Error deleting custom prompt for user %s: %s", user_id, e)
         return False
@@ -1,30 +1,47 @@
 import json
+import logging
 from pathlib import Path
 
+logger = logging.getLogger(__name__)
+
 class Translator:
+    """Locale strings from `path`/*.json, read on first use."""
+
     def __init__(self, path: str):
-        self.translations = {}
-        locales_path = Path(path)
+        self.path = path
+        self._translations = None
+
+    @property
+    def translations(self) -> dict:
+        if self._translations is None:
+            self._translations = self._load()
+        return self._translations
+
+    def _load(self) -> dict:
+        translations = {}
+        locales_path = Path(self.path)
         if not locales_path.is_dir():
-            print(f"Error: Locales directory not found at '{path}'")
-            return
+            logger.error("Locales directory not found at '%s'", self.path)
+            return translations
             
         for file in locales_path.glob("*.json"):
             lang_code = file.stem
             with open(file, "r", encoding="utf-8") as f:
-                self.translations[lang_code] = json.load(f)
+                translations[lang_code] = json.load(f)
         
-        if self.translations:
-            print(f"Loaded languages: {list(self.translations.keys())}")
+        if translations:
+            logger.info("Loaded languages: %s", list(translations.keys()))
         else:
-            print("Warning: No language files were loaded.")
+            logger.warning("No language files were loaded.")
+        return translations
 
     def get_text(self, key: str, lang_code: str = "en"):
+        translations = self.translations
         # Fallback to English if the user's language isn't loaded
-        effective_lang_code = lang_code if lang_code in self.translations else "en"
+        effective_lang_code = lang_code if lang_code in translations else "en"
         
         # Get the dictionary for the effective language, or the English one as a fallback
-        lang_dict = self.translations.get(effective_lang_code, self.translations.get("en", {}))
+        lang_dict = translations.get(effective_lang_code, translations.get("en", {}))
         
         return lang_dict.get(key, f"<{key}>")
 
@@ -0,0 +1,279 @@
+import asyncio
+import json
+import logging
+import os
+import signal
+import time
+from contextlib import suppress
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set
+
+from aiogram import Bot, Dispatcher
+from aiogram.methods import GetUpdates
+from aiogram.types import Update
+
+logger = logging.getLogger(__name__)
+
+# --- Konfigurasi Polling Tanpa Kehilangan Update ---
+UPDATE_JOURNAL_PATH = Path(os.getenv("UPDATE_JOURNAL_PATH", "state/update_journal.json"))
+DROP_PENDING_UPDATES = os.getenv("DROP_PENDING_UPDATES", "0") == "1"  # perilaku lama: buang antrean saat boot
+POLL_TIMEOUT = int(os.getenv("POLL_TIMEOUT", 30))                       # detik long polling getUpdates
+POLL_MAX_CONCURRENCY = int(os.getenv("POLL_MAX_CONCURRENCY", 64))
+BACKLOG_RATE = float(os.getenv("BACKLOG_RATE", 10.0))                  # update backlog per detik setelah restart
+BACKLOG_SKIP_TYPES = {t.strip() for t in os.getenv("BACKLOG_SKIP_TYPES", "inline_query,callback_query").split(",") if t.strip()}
+BACKLOG_MAX_AGE = float(os.getenv("BACKLOG_MAX_AGE", 0))               # detik; pesan backlog yang lebih tua dilewati (0 = tidak pernah)
+DRAIN_TIMEOUT = float(os.getenv("DRAIN_TIMEOUT", 30.0))                # batas menunggu update yang sedang berjalan saat SIGTERM
+POLL_BATCH = 100  # batas getUpdates dari Telegram
+JOURNAL_FLUSH_INTERVAL = 1.0
+MAX_BACKOFF = 30.0
+
+
+class UpdateJournal:
+    """
+    Local record of the next getUpdates offset and of every update that was
+    fetched but has not finished. Telegram forgets an update once the next
+    getUpdates confirms it, so each batch is written here first and an
+    update stays until its handler returns; whatever is left is replayed
+    on the next start.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.offset: Optional[int] = None
+        self.pending: Dict[int, Dict[str, Any]] = {}
+        self.dirty = False
+        self._lock = asyncio.Lock()
+
+    def load(self):
+        try:
+            data = json.loads(self.path.read_text())
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.error("Could not read update journal %s: %s", self.path, e)
+            return
+        self.offset = data.get("offset")
+        self.pending = {int(update_id): raw for update_id, raw in data.get("pending", {}).items()}
+
+    def _write(self, snapshot: Dict[str, Any]):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temporary = self.path.with_suffix(".tmp")
+        temporary.write_text(json.dumps(snapshot))
+        os.replace(temporary, self.path)  # atomik: crash di tengah penulisan tidak merusak journal
+
+    async def save(self):
+        async with self._lock:
+            snapshot = {"offset": self.offset, "pending": {str(update_id): raw for update_id, raw in self.pending.items()}}
+            self.dirty = False
+            await asyncio.to_thread(self._write, snapshot)
+
+
+class ResumablePoller:
+    """
+    Long-polling loop that replaces Dispatcher.start_polling. It resumes
+    from the journal instead of dropping pending updates, feeds the
+    backlog at a bounded rate while skipping update types that are useless
+    once old, and on SIGTERM stops polling and drains in-flight updates.
+    The backlog is what was queued before this process started: journal
+    replays, then Telegram's queue up to the first update dated after boot
+    or the first batch that is not full. Updates after that boundary are
+    never paced or skipped, however busy the bot stays.
+    """
+
+    def __init__(self, journal: UpdateJournal, max_concurrency: int, backlog_rate: float, skip_types: Set[str], max_age: float, drain_timeout: float):
+        self.journal = journal
+        self.max_concurrency = max_concurrency
+        self.backlog_interval = 1.0 / backlog_rate if backlog_rate > 0 else 0.0
+        self.skip_types = skip_types
+        self.max_age = max_age
+        self.drain_timeout = drain_timeout
+        self._tasks: Set[asyncio.Task] = set()
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._stop: Optional[asyncio.Event] = None
+        self._next_backlog_at = 0.0
+        self._started_at = 0.0
+        self._catching_up = True
+
+        # --- Metrik ---
+        self.processed = 0
+        self.replayed = 0
+        self.backlog = 0
+        self.skipped_stale = 0
+
+    def stop(self):
+        if self._stop is not None:
+            self._stop.set()
+
+    def _is_backlog(self, update: Update) -> bool:
+        """True while the update belongs to the queue left from before boot; the boundary only moves forward."""
+        if not self._catching_up:
+            return False
+        # Pesan yang diedit membawa tanggal aslinya; yang menentukan adalah kapan update ini dibuat
+        date = getattr(update.event, "edit_date", None) or getattr(update.event, "date", None)
+        if isinstance(date, datetime):
+            date = date.timestamp()
+        if date is not None and date >= self._started_at:
+            self._catching_up = False
+        return self._catching_up
+
+    def _is_stale(self, update: Update) -> bool:
+        if update.event_type in self.skip_types:
+            return True
+        date = getattr(update.event, "date", None)
+        return bool(self.max_age and date and time.time() - date.timestamp() > self.max_age)
+
+    async def _pace_backlog(self):
+        slot = max(self._next_backlog_at, time.monotonic())
+        self._next_backlog_at = slot + self.backlog_interval
+        delay = slot - time.monotonic()
+        if delay > 0:
+            with suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._stop.wait(), timeout=delay)
+
+    async def _dispatch(self, dispatcher: Dispatcher, bot: Bot, update: Update, data: Dict[str, Any], backlog: bool):
+        if backlog:
+            if self._is_stale(update):
+                self.skipped_stale += 1
+                self._finish(update.update_id)
+                return
+            await self._pace_backlog()
+            self.backlog += 1
+        # Semaphore penuh menahan polling, jadi antrean tetap di Telegram/journal, bukan di memori
+        await self._semaphore.acquire()
+        task = asyncio.create_task(self._process(dispatcher, bot, update, data))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _process(self, dispatcher: Dispatcher, bot: Bot, update: Update, data: Dict[str, Any]):
+        try:
+            try:
+                await dispatcher.feed_update(bot, update, **data)
+            except Exception as e:
+                logger.error("Error processing update %s: %s", update.update_id, e)
+            # Pembatalan setelah batas drain melewati baris ini, jadi update tetap di journal untuk diputar ulang
+            self._finish(update.update_id)
+            self.processed += 1
+        finally:
+            self._semaphore.release()
+
+    def _finish(self, update_id: int):
+        self.journal.pending.pop(update_id, None)
+        self.journal.dirty = True
+
+    async def _get_updates(self, bot: Bot, allowed_updates: List[str]) -> List[Update]:
+        """One long poll; returns [] as soon as stop() is called."""
+        method = GetUpdates(offset=self.journal.offset, limit=POLL_BATCH, timeout=POLL_TIMEOUT, allowed_updates=allowed_updates)
+        request = asyncio.ensure_future(bot(method, request_timeout=int(bot.session.timeout + POLL_TIMEOUT)))
+        stopped = asyncio.ensure_future(self._stop.wait())
+        await asyncio.wait({request, stopped}, return_when=asyncio.FIRST_COMPLETED)
+        stopped.cancel()
+        if not request.done():
+            request.cancel()
+            return []
+        return request.result()
+
+    async def _flush_journal(self):
+        while True:
+            await asyncio.sleep(JOURNAL_FLUSH_INTERVAL)
+            if self.journal.dirty:
+                try:
+                    await self.journal.save()
+                except Exception as e:
+                    logger.error("Error saving update journal: %s", e)
+
+    async def _poll(self, dispatcher: Dispatcher, bot: Bot, data: Dict[str, Any]):
+        # 1. Update yang belum selesai sebelum restart
+        replay = sorted(self.journal.pending.items())
+        if replay:
+            logger.info("Replaying %s unfinished updates from the journal", len(replay))
+        for update_id, raw in replay:
+            if self._stop.is_set():
+                return
+            self.replayed += 1
+            await self._dispatch(dispatcher, bot, Update.model_validate(raw, context={"bot": bot}), data, backlog=True)
+
+        # 2. Backlog di Telegram, lalu update baru. Batch yang tidak penuh berarti antrean sudah habis.
+        allowed_updates = dispatcher.resolve_used_update_types()
+        failures = 0
+        while not self._stop.is_set():
+            try:
+                updates = await self._get_updates(bot, allowed_updates)
+            except Exception as e:
+                failures += 1
+                delay = min(MAX_BACKOFF, 2 ** failures)
+                logger.warning("getUpdates failed (%s), retrying in %ss", e, delay)
+                with suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(self._stop.wait(), timeout=delay)
+                continue
+            failures = 0
+            if not updates:
+                self._catching_up = False
+                continue
+
+            for update in updates:
+                self.journal.pending[update.update_id] = update.model_dump(mode="json", exclude_none=True)
+            self.journal.offset = updates[-1].update_id + 1
+            # Disimpan sebelum getUpdates berikutnya mengonfirmasi batch ini ke Telegram
+            await self.journal.save()
+
+            for update in updates:
+                if self._stop.is_set():
+                    return
+                await self._dispatch(dispatcher, bot, update, data, backlog=self._is_backlog(update))
+            if len(updates) < POLL_BATCH:
+                self._catching_up = False
+
+    async def run(self, dispatcher: Dispatcher, bot: Bot, **data: Any):
+        self._stop = asyncio.Event()
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        # Tanggal Telegram berpresisi detik; update pada detik boot dianggap baru
+        self._started_at = float(int(time.time()))
+        self._catching_up = True
+        self.journal.load()
+        if DROP_PENDING_UPDATES:
+            self.journal.offset, self.journal.pending = None, {}
+        await bot.delete_webhook(drop_pending_updates=DROP_PENDING_UPDATES)
+
+        workflow_data = {"dispatcher": dispatcher, "bots": [bot], **dispatcher.workflow_data, **data}
+        await dispatcher.emit_startup(bot=bot, **workflow_data)
+
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            with suppress(NotImplementedError):
+                loop.add_signal_handler(sig, self.stop)
+        flusher = asyncio.create_task(self._flush_journal())
+        try:
+            await self._poll(dispatcher, bot, data)
+        finally:
+            logger.info("Stopping polling, draining %s in-flight updates...", len(self._tasks))
+            if self._tasks:
+                await asyncio.wait(set(self._tasks), timeout=self.drain_timeout)
+            if self._tasks:
+                logger.warning("%s updates still running after %ss; they will be replayed on next start",
+                               len(self._tasks), self.drain_timeout)
+                for task in self._tasks:
+                    task.cancel()
+            flusher.cancel()
+            await self.journal.save()
+            for sig in (signal.SIGTERM, signal.SIGINT):
+                with suppress(NotImplementedError):
+                    loop.remove_signal_handler(sig)
+            try:
+                await dispatcher.emit_shutdown(bot=bot, **workflow_data)
+            finally:
+                await bot.session.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": len(self._tasks),
+            "journal_pending": len(self.journal.pending),
+            "processed": self.processed,
+            "replayed": self.replayed,
+            "backlog": self.backlog,
+            "skipped_stale": self.skipped_stale,
+        }
+
+update_poller = ResumablePoller(
+    UpdateJournal(UPDATE_JOURNAL_PATH), POLL_MAX_CONCURRENCY, BACKLOG_RATE, BACKLOG_SKIP_TYPES, BACKLOG_MAX_AGE, DRAIN_TIMEOUT,
+)
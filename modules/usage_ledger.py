@@ -0,0 +1,210 @@
+import asyncio
+import logging
+import os
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from modules.storage import Storage
+
+from modules.metrics import LLM_TOKENS
+from modules.supabase_handler import insert_usage_rows
+
+logger = logging.getLogger(__name__)
+
+# --- Konfigurasi Buku Besar Pemakaian ---
+USAGE_FLUSH_INTERVAL = float(os.getenv("USAGE_FLUSH_INTERVAL", 300))  # detik antar penulisan agregat ke tabel llm_usage
+USAGE_MAX_PENDING = 10000  # batas baris agregat yang ditahan saat penulisan terus gagal
+USAGE_MAX_USERS = int(os.getenv("USAGE_MAX_USERS", 5000))  # pengguna yang dilacak untuk peringkat /usage
+HEDGE_FEATURE_SUFFIX = ":hedge"  # fitur untuk percobaan hedging yang kalah
+
+UsageKey = Tuple[str, str, str, Optional[int]]  # (model, kunci, fitur, pengguna)
+
+
+class UsageTotals:
+    __slots__ = ("requests", "prompt_tokens", "completion_tokens", "queue_time", "total_time", "completion_time")
+
+    def __init__(self):
+        self.requests = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.queue_time = 0.0
+        self.total_time = 0.0
+        self.completion_time = 0.0
+
+    def add(self, prompt_tokens: int, completion_tokens: int, queue_time: float, total_time: float, completion_time: float):
+        self.requests += 1
+        self.prompt_tokens += prompt_tokens
+        self.completion_tokens += completion_tokens
+        self.queue_time += queue_time
+        self.total_time += total_time
+        self.completion_time += completion_time
+
+    @property
+    def tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    @property
+    def tokens_per_second(self) -> float:
+        """Output speed of the model: completion tokens per second of generation time."""
+        return self.completion_tokens / self.completion_time if self.completion_time else 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "queue_time": round(self.queue_time, 3),
+            "total_time": round(self.total_time, 3),
+        }
+
+
+class UsageLedger:
+    """
+    Records token usage and timing of every completion, including hedged
+    duplicates, tagged by model, API key, feature and user. Totals are aggregated in memory for the
+    /usage report and flushed as one row per (model, key, feature, user)
+    to the llm_usage table every USAGE_FLUSH_INTERVAL seconds.
+    """
+
+    def __init__(self, flush_interval: float):
+        self.flush_interval = flush_interval
+        self.started_at = datetime.now(timezone.utc)
+        self._pending: Dict[UsageKey, UsageTotals] = {}
+        self._period_start = self.started_at
+        self._supabase: Optional[Storage] = None
+        self._task: Optional[asyncio.Task] = None
+
+        # --- Agregat sejak proses dimulai ---
+        self.by_model: Dict[str, UsageTotals] = {}
+        self.by_feature: Dict[str, UsageTotals] = {}
+        self.by_key: Dict[str, UsageTotals] = {}
+        self.by_user: Dict[int, UsageTotals] = {}
+        self.users_evicted = 0
+        self.rows_flushed = 0
+        self.flush_failures = 0
+
+    def record(self, model: str, key: str, feature: str, user_id: Optional[int], usage: Any, queue_time: float, total_time: float):
+        """
+        Adds one completion. `usage` is the response's usage object; Groq's
+        server-side queue time is added to the local admission wait, and
+        its completion_time is used for tokens per second.
+        """
+        prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+        completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+        queue_time += getattr(usage, "queue_time", 0.0) or 0.0
+        completion_time = getattr(usage, "completion_time", None) or total_time
+        self._add(model, key, feature, user_id, (prompt_tokens, completion_tokens, queue_time, total_time, completion_time))
+
+    def record_hedge(self, model: str, key: str, feature: str, user_id: Optional[int], usage: Any, prompt_tokens: int, total_time: float):
+        """
+        Adds a hedged attempt that lost the race, under feature
+        "<feature>:hedge". `usage` is None when the attempt was cancelled
+        in flight; `prompt_tokens` is then the estimate that is counted.
+        """
+        if usage is not None:
+            self.record(model, key, feature + HEDGE_FEATURE_SUFFIX, user_id, usage, 0.0, total_time)
+            return
+        self._add(model, key, feature + HEDGE_FEATURE_SUFFIX, user_id, (prompt_tokens, 0, 0.0, total_time, 0.0))
+
+    def _add(self, model: str, key: str, feature: str, user_id: Optional[int], values: Tuple[int, int, float, float, float]):
+        prompt_tokens, completion_tokens = values[0], values[1]
+        for totals in (
+            self._pending.setdefault((model, key, feature, user_id), UsageTotals()),
+            self.by_model.setdefault(model, UsageTotals()),
+            self.by_feature.setdefault(feature, UsageTotals()),
+            self.by_key.setdefault(key, UsageTotals()),
+        ):
+            totals.add(*values)
+        if user_id is not None:
+            self.by_user.setdefault(user_id, UsageTotals()).add(*values)
+            if len(self.by_user) > USAGE_MAX_USERS:
+                self._evict_users()
+
+        LLM_TOKENS.inc(prompt_tokens, model=model, kind="prompt")
+        LLM_TOKENS.inc(completion_tokens, model=model, kind="completion")
+
+    def _evict_users(self):
+        # Separuh dengan pemakaian terkecil dibuang; peringkat teratas tetap, total per pengguna tetap ada di llm_usage
+        kept = sorted(self.by_user.items(), key=lambda item: item[1].tokens, reverse=True)[:USAGE_MAX_USERS // 2]
+        self.users_evicted += len(self.by_user) - len(kept)
+        self.by_user = dict(kept)
+
+    def _take_rows(self) -> List[Dict[str, Any]]:
+        period_end = datetime.now(timezone.utc)
+        rows = [
+            {
+                "period_start": self._period_start.isoformat(),
+                "period_end": period_end.isoformat(),
+                "model": model,
+                "api_key": key,
+                "feature": feature,
+                "user_id": user_id,
+                **totals.as_dict(),
+            }
+            for (model, key, feature, user_id), totals in self._pending.items()
+        ]
+        self._pending = {}
+        self._period_start = period_end
+        return rows
+
+    async def flush(self):
+        if not self._pending or self._supabase is None:
+            return
+        rows = self._take_rows()
+        if await asyncio.to_thread(insert_usage_rows, self._supabase, rows):
+            self.rows_flushed += len(rows)
+            return
+
+        self.flush_failures += 1
+        # Baris yang gagal ditulis digabung kembali ke periode berikutnya
+        for row in rows[:USAGE_MAX_PENDING]:
+            totals = self._pending.setdefault((row["model"], row["api_key"], row["feature"], row["user_id"]), UsageTotals())
+            totals.requests += row["requests"]
+            totals.prompt_tokens += row["prompt_tokens"]
+            totals.completion_tokens += row["completion_tokens"]
+            totals.queue_time += row["queue_time"]
+            totals.total_time += row["total_time"]
+        self._period_start = datetime.fromisoformat(rows[0]["period_start"])
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error("Error flushing usage ledger: %s", e)
+
+    async def start(self, supabase: Storage):
+        self._supabase = supabase
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stops the periodic flush and writes what is still aggregated."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error("Error flushing usage ledger on shutdown: %s", e)
+
+    def top_users(self, n: int = 10) -> List[Tuple[int, UsageTotals]]:
+        return sorted(self.by_user.items(), key=lambda item: item[1].tokens, reverse=True)[:n]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pending_rows": len(self._pending),
+            "rows_flushed": self.rows_flushed,
+            "flush_failures": self.flush_failures,
+            "users_tracked": len(self.by_user),
+            "users_evicted": self.users_evicted,
+            "requests": {model: totals.requests for model, totals in self.by_model.items()},
+            "tokens_per_second": {model: totals.tokens_per_second for model, totals in self.by_model.items()},
+        }
+
+usage_ledger = UsageLedger(USAGE_FLUSH_INTERVAL)
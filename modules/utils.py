@@ -1,13 +1,28 @@
+import base64
 import json
+import os
 import re
+from typing import List
 from aiogram import Bot
 from aiogram.types import Message, InlineKeyboardMarkup
 from aiogram.enums import ParseMode
 from aiogram.exceptions import TelegramBadRequest
-import asyncio
 
 from modules.html_parser import escape_html
 
+def get_admin_ids() -> set:
+    admin_ids_str = os.environ.get("ADMIN_IDS", "")
+    return {int(x) for x in admin_ids_str.split(',') if x.strip().lstrip('-').isdigit()}
+
+def is_admin(user_id: int) -> bool:
+    return user_id in get_admin_ids()
+
+def format_bytes(size: int) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.1f} {unit}" if unit != "B" else f"{size} B"
+        size /= 1024
+
 def load_models():
     try:
         with open("models.json", "r") as f:
@@ -15,42 +30,63 @@ def load_models():
     except FileNotFoundError:
         return []
 
-async def send_long_message(message: Message, text: str, parse_mode: str = ParseMode.HTML, reply_markup: InlineKeyboardMarkup = None):
-    MAX_LENGTH = 4096
-    if len(text) <= MAX_LENGTH:
-        try:
-            if message.from_user.id == message.chat.id:
-                 await message.answer(text, parse_mode=parse_mode, reply_markup=reply_markup, disable_web_page_preview=True)
-            else:
-                 await message.reply(text, parse_mode=parse_mode, reply_markup=reply_markup, disable_web_page_preview=True)
-        except TelegramBadRequest:
-            await message.reply(escape_html(text), parse_mode=None, reply_markup=reply_markup, disable_web_page_preview=True)
-        return
+TAG_PATTERN = re.compile(r"<(/)?([a-zA-Z0-9_-]+)[^>]*>")
 
-    parts, open_tags = [], []
+def split_html_message(text: str, max_length: int, chunk_length: int = None, split_on_space: bool = False) -> List[str]:
+    """
+    Splits Telegram HTML into parts of at most `max_length` characters.
+    Long text is cut into chunks of `chunk_length` at the last newline
+    (or space), closing tags left open at the end of a part and reopening
+    them at the start of the next.
+    """
+    chunk_length = chunk_length or max_length
+    parts = []
     while len(text) > 0:
-        if len(text) <= MAX_LENGTH:
+        if len(text) <= max_length:
             parts.append(text)
             break
-        part = text[:MAX_LENGTH]
-        last_newline = part.rfind('\n')
-        split_pos = last_newline if last_newline != -1 else MAX_LENGTH
+        # Tag yang dibuka ulang ada di awal potongan, jadi dihitung lagi dari nol
+        open_tags = []
+        part = text[:chunk_length]
+        split_pos = part.rfind('\n')
+        if split_pos == -1 and split_on_space:
+            split_pos = part.rfind(' ')
+        if split_pos == -1:
+            split_pos = chunk_length
         part_to_send = text[:split_pos]
-        
-        for tag_match in re.finditer(r"<(/)?([a-zA-Z0-9_-]+)[^>]*>", part_to_send):
+
+        for tag_match in TAG_PATTERN.finditer(part_to_send):
             is_closing, tag_name = tag_match.groups()
             tag_name = tag_name.lower()
             if is_closing:
                 if open_tags and open_tags[-1] == tag_name: open_tags.pop()
             elif not tag_match.group(0).endswith("/>"):
                 open_tags.append(tag_name)
-        
+
         closing_tags = "".join([f"</{tag}>" for tag in reversed(open_tags)])
-        part_to_send += closing_tags
-        parts.append(part_to_send)
-        
+        parts.append(part_to_send + closing_tags)
+
         opening_tags = "".join([f"<{tag}>" for tag in open_tags])
         text = opening_tags + text[split_pos:].lstrip()
+    return parts
+
+def encode_image_base64(data: bytes) -> str:
+    """Base64 text of an image for the vision API's data URLs."""
+    return base64.b64encode(data).decode('utf-8')
+
+async def send_long_message(message: Message, text: str, parse_mode: str = ParseMode.HTML, reply_markup: InlineKeyboardMarkup = None):
+    MAX_LENGTH = 4096
+    if len(text) <= MAX_LENGTH:
+        try:
+            if message.from_user.id == message.chat.id:
+                 await message.answer(text, parse_mode=parse_mode, reply_markup=reply_markup, disable_web_page_preview=True)
+            else:
+                 await message.reply(text, parse_mode=parse_mode, reply_markup=reply_markup, disable_web_page_preview=True)
+        except TelegramBadRequest:
+            await message.reply(escape_html(text), parse_mode=None, reply_markup=reply_markup, disable_web_page_preview=True)
+        return
+
+    parts = split_html_message(text, MAX_LENGTH)
 
     for i, part in enumerate(parts):
         is_last_part = (i == len(parts) - 1)
@@ -66,7 +102,6 @@ async def send_long_message(message: Message, text: str, parse_mode: str = Parse
                 await message.reply(safe_part, parse_mode=None, reply_markup=current_markup, disable_web_page_preview=True)
             else:
                 await message.answer(safe_part, parse_mode=None, reply_markup=current_markup, disable_web_page_preview=True)
-        await asyncio.sleep(0.5)
 
 async def send_long_business_message(bot: Bot, user_id: int, connection_id: str, text: str, parse_mode: str = ParseMode.HTML):
     MAX_LENGTH = 3000
@@ -77,42 +112,12 @@ async def send_long_business_message(bot: Bot, user_id: int, connection_id: str,
             await bot.send_message(user_id, escape_html(text), parse_mode=None, business_connection_id=connection_id, disable_web_page_preview=True)
         return
 
-    parts, open_tags = [], []
-    while len(text) > 0:
-        if len(text) <= MAX_LENGTH:
-            parts.append(text)
-            break
-
-        safe_max_len = MAX_LENGTH - 100
-        part = text[:safe_max_len]
-
-        last_newline = part.rfind('\n')
-        last_space = part.rfind(' ')
-        
-        # Prioritaskan pemotongan di baris baru, lalu spasi, atau potong paksa jika tidak ada
-        split_pos = last_newline if last_newline != -1 else (last_space if last_space != -1 else safe_max_len)
-        
-        part_to_send = text[:split_pos]
-        
-        for tag_match in re.finditer(r"<(/)?([a-zA-Z0-9_-]+)[^>]*>", part_to_send):
-            is_closing, tag_name = tag_match.groups()
-            tag_name = tag_name.lower()
-            if is_closing:
-                if open_tags and open_tags[-1] == tag_name: open_tags.pop()
-            elif not tag_match.group(0).endswith("/>"):
-                open_tags.append(tag_name)
-        
-        closing_tags = "".join([f"</{tag}>" for tag in reversed(open_tags)])
-        part_to_send += closing_tags
-        parts.append(part_to_send)
-        
-        opening_tags = "".join([f"<{tag}>" for tag in open_tags])
-        text = opening_tags + text[split_pos:].lstrip()
+    # Potong dengan sisa ruang untuk tag penutup; utamakan baris baru, lalu spasi
+    parts = split_html_message(text, MAX_LENGTH, chunk_length=MAX_LENGTH - 100, split_on_space=True)
 
     for part in parts:
         try:
             await bot.send_message(user_id, part, parse_mode=parse_mode, business_connection_id=connection_id, disable_web_page_preview=True)
         except TelegramBadRequest:
             safe_part = escape_html(part)
-            await bot.send_message(user_id, safe_part, parse_mode=None, business_connection_id=connection_id, disable_web_page_preview=True)
-        await asyncio.sleep(0.5)
\ No newline at end of file
+            await bot.send_message(user_id, safe_part, parse_mode=None, business_connection_id=connection_id, disable_web_page_preview=True)
\ No newline at end of file
@@ -1,18 +1,19 @@
 import asyncio
-from typing import Dict, List
 
 from aiogram import Router, F, Bot
 from aiogram.types import Message
-from supabase import Client
+from modules.storage import Storage
 
 from modules.translator import Translator
 from modules.core_logic import process_photo_message
+from modules.state_backend import get_state_backend
 
 router = Router()
-album_data: Dict[str, List[Message]] = {}
+ALBUM_WAIT = 1.5
+ALBUM_TTL = 60
 
 @router.message(F.photo)
-async def handle_photo_message(message: Message, bot: Bot, supabase: Client, translator: Translator, lang_code: str):
+async def handle_photo_message(message: Message, bot: Bot, supabase: Storage, translator: Translator, lang_code: str):
     is_group = message.chat.type in ['group', 'supergroup']
     caption = message.caption or ""
     
@@ -30,23 +31,37 @@ async def handle_photo_message(message: Message, bot: Bot, supabase: Client, tra
         prompt = prompt.replace(cmd, "").strip()
 
     if message.media_group_id:
-        if message.media_group_id not in album_data:
-            album_data[message.media_group_id] = []
-        
-        if not any(m.message_id == message.message_id for m in album_data[message.media_group_id]):
-            album_data[message.media_group_id].append(message)
+        # Bagian album dikumpulkan di state backend bersama; worker pertama yang
+        # menerima bagian album menjadi pemimpin dan memproses semuanya.
+        state = get_state_backend()
+        album_key = f"album:{message.media_group_id}"
+        await state.rpush(album_key, message.model_dump_json(exclude_none=True), ttl=ALBUM_TTL)
+        is_leader = await state.set_nx(f"{album_key}:leader", str(message.message_id), ttl=ALBUM_TTL)
+        if not is_leader:
+            return
+
+        await asyncio.sleep(ALBUM_WAIT)
 
-        await asyncio.sleep(1.5)
+        parts = await state.pop_all(album_key)
+        # Bagian yang terlambat harus menjadi pemimpin baru, bukan tertahan di daftar sampai TTL;
+        # bagian yang masuk di antara pop dan delete masih melihat pemimpin lama, jadi diambil sekali lagi
+        await state.delete(f"{album_key}:leader")
+        parts += await state.pop_all(album_key)
 
-        if message.media_group_id in album_data:
-            messages = album_data.pop(message.media_group_id)
-            messages.sort(key=lambda m: m.message_id)
-            first_message = messages[0]
-            
-            # Gunakan caption asli dari pesan pertama jika prompt kosong setelah dibersihkan
-            final_prompt = prompt or (first_message.caption or "")
+        messages = {}
+        for raw in parts:
+            album_message = Message.model_validate_json(raw, context={"bot": bot})
+            messages[album_message.message_id] = album_message
+        if not messages:
+            return
+
+        messages = sorted(messages.values(), key=lambda m: m.message_id)
+        first_message = messages[0]
+        
+        # Gunakan caption asli dari pesan pertama jika prompt kosong setelah dibersihkan
+        final_prompt = prompt or (first_message.caption or "")
 
-            await process_photo_message(first_message, messages, final_prompt, bot, supabase, translator, lang_code)
+        await process_photo_message(first_message, messages, final_prompt, bot, supabase, translator, lang_code)
     else:
         # Menangani foto tunggal
         await process_photo_message(message, [message], prompt, bot, supabase, translator, lang_code)
\ No newline at end of file
@@ -0,0 +1,136 @@
+import asyncio
+import logging
+import os
+import secrets
+import signal
+from contextlib import suppress
+from typing import Any, Set
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+
+from modules.update_poller import DROP_PENDING_UPDATES
+
+logger = logging.getLogger(__name__)
+
+# --- Konfigurasi Webhook ---
+WEBHOOK_BASE_URL = os.getenv("WEBHOOK_BASE_URL", "")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBAPP_HOST = os.getenv("WEBAPP_HOST", "0.0.0.0")
+WEBAPP_PORT = int(os.getenv("WEBAPP_PORT", 8080))
+WEBHOOK_MAX_CONCURRENCY = int(os.getenv("WEBHOOK_MAX_CONCURRENCY", 64))
+WEBHOOK_MAX_PENDING = int(os.getenv("WEBHOOK_MAX_PENDING", 1000))
+
+
+class WebhookUpdateHandler:
+    """
+    Acknowledges Telegram webhook calls immediately and processes the
+    updates as background tasks, at most `max_concurrency` at a time.
+    """
+
+    def __init__(self, dispatcher: Dispatcher, bot: Bot, secret_token: str, max_concurrency: int, max_pending: int, **data: Any):
+        self.dispatcher = dispatcher
+        self.bot = bot
+        self.secret_token = secret_token
+        self.max_pending = max_pending
+        self.data = data
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._tasks: Set[asyncio.Task] = set()
+
+    @property
+    def pending(self) -> int:
+        return len(self._tasks)
+
+    def _verify_secret(self, request: web.Request) -> bool:
+        if not self.secret_token:
+            return True
+        received = request.headers.get("X-Telegram-Bot-Api-Secret-Token", "")
+        return secrets.compare_digest(received, self.secret_token)
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if not self._verify_secret(request):
+            return web.Response(status=401, text="Unauthorized")
+
+        # Jika antrean penuh, biarkan Telegram mengirim ulang update ini nanti
+        if self.pending >= self.max_pending:
+            return web.Response(status=503, text="Busy")
+
+        try:
+            update = Update.model_validate(await request.json(), context={"bot": self.bot})
+        except Exception as e:
+            logger.warning("Rejected malformed webhook update: %s", e)
+            return web.Response(status=400, text="Bad Request")
+
+        task = asyncio.create_task(self._process_update(update))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return web.Response()
+
+    async def _process_update(self, update: Update):
+        async with self._semaphore:
+            try:
+                await self.dispatcher.feed_update(self.bot, update, **self.data)
+            except Exception as e:
+                logger.error("Error processing update %s: %s", update.update_id, e)
+
+    async def drain(self, timeout: float = 30.0):
+        """Waits for in-flight updates to finish before shutting down."""
+        if self._tasks:
+            await asyncio.wait(set(self._tasks), timeout=timeout)
+
+    def register(self, app: web.Application, path: str):
+        app.router.add_post(path, self.handle)
+
+
+async def run_webhook(dispatcher: Dispatcher, bot: Bot, **data: Any):
+    if not WEBHOOK_BASE_URL:
+        logger.error("WEBHOOK_BASE_URL is required when BOT_MODE=webhook.")
+        return
+
+    secret_token = os.getenv("WEBHOOK_SECRET", "")
+    if not secret_token:
+        logger.warning("WEBHOOK_SECRET is not set, webhook requests will not be verified.")
+
+    handler = WebhookUpdateHandler(
+        dispatcher, bot, secret_token,
+        max_concurrency=WEBHOOK_MAX_CONCURRENCY,
+        max_pending=WEBHOOK_MAX_PENDING,
+        **data,
+    )
+    app = web.Application()
+    handler.register(app, WEBHOOK_PATH)
+
+    workflow_data = {"dispatcher": dispatcher, **dispatcher.workflow_data, **data}
+    await dispatcher.emit_startup(bot=bot, **workflow_data)
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, host=WEBAPP_HOST, port=WEBAPP_PORT)
+    await site.start()
+
+    await bot.set_webhook(
+        url=WEBHOOK_BASE_URL.rstrip("/") + WEBHOOK_PATH,
+        secret_token=secret_token or None,
+        allowed_updates=dispatcher.resolve_used_update_types(),
+        drop_pending_updates=DROP_PENDING_UPDATES,  # Telegram mengirim ulang update yang tertunda
+    )
+    logger.info("Webhook server listening on %s:%s%s", WEBAPP_HOST, WEBAPP_PORT, WEBHOOK_PATH)
+
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        with suppress(NotImplementedError):
+            loop.add_signal_handler(sig, stop_event.set)
+
+    try:
+        await stop_event.wait()
+    finally:
+        logger.info("Stopping webhook server...")
+        await site.stop()
+        await handler.drain()
+        await runner.cleanup()
+        try:
+            await dispatcher.emit_shutdown(bot=bot, **workflow_data)
+        finally:
+            await bot.session.close()
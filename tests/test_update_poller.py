@@ -0,0 +1,99 @@
+import asyncio
+import json
+import time
+
+from aiogram.types import Update
+
+from modules.update_poller import POLL_BATCH, ResumablePoller, UpdateJournal
+
+
+def message_update(update_id: int, date: float) -> dict:
+    return {
+        "update_id": update_id,
+        "message": {"message_id": update_id, "date": int(date), "chat": {"id": 1, "type": "private"}, "text": "hi"},
+    }
+
+
+def callback_update(update_id: int) -> dict:
+    return {
+        "update_id": update_id,
+        "callback_query": {"id": str(update_id), "from": {"id": 1, "is_bot": False, "first_name": "A"}, "chat_instance": "1"},
+    }
+
+
+class FakeSession:
+    timeout = 1
+
+    async def close(self):
+        pass
+
+
+class FakeBot:
+    session = FakeSession()
+
+    async def delete_webhook(self, drop_pending_updates: bool = False):
+        pass
+
+
+class FakeDispatcher:
+    workflow_data = {}
+
+    def __init__(self):
+        self.fed = []
+
+    def resolve_used_update_types(self):
+        return ["message", "callback_query"]
+
+    async def emit_startup(self, **kwargs):
+        pass
+
+    async def emit_shutdown(self, **kwargs):
+        pass
+
+    async def feed_update(self, bot, update, **kwargs):
+        self.fed.append(update.update_id)
+
+
+def run_poller(tmp_path, batches, pending=None):
+    journal = UpdateJournal(tmp_path / "journal.json")
+    if pending:
+        journal.path.write_text(json.dumps({"offset": None, "pending": {str(raw["update_id"]): raw for raw in pending}}))
+    poller = ResumablePoller(journal, max_concurrency=8, backlog_rate=0, skip_types={"callback_query"}, max_age=0, drain_timeout=1)
+    batches = list(batches)
+
+    async def get_updates(bot, allowed_updates):
+        if not batches:
+            poller.stop()
+            return []
+        return [Update.model_validate(raw) for raw in batches.pop(0)]
+
+    poller._get_updates = get_updates
+    dispatcher = FakeDispatcher()
+    asyncio.run(poller.run(dispatcher, FakeBot()))
+    return poller, dispatcher
+
+
+def test_journal_pending_updates_are_replayed_and_cleared(tmp_path):
+    old = time.time() - 3600
+    poller, dispatcher = run_poller(tmp_path, [], pending=[message_update(5, old), message_update(6, old)])
+
+    assert dispatcher.fed == [5, 6]
+    assert poller.replayed == 2
+    assert json.loads((tmp_path / "journal.json").read_text())["pending"] == {}
+
+
+def test_catch_up_ends_at_first_update_after_boot_while_batches_stay_full(tmp_path):
+    old, new = time.time() - 3600, time.time() + 5
+    first = [message_update(i, old) for i in range(1, POLL_BATCH)] + [callback_update(POLL_BATCH)]
+    # Batch kedua tetap penuh: backlog habis di tengah, lalu lalu lintas baru yang ramai
+    second = [message_update(POLL_BATCH + 1, old), message_update(POLL_BATCH + 2, new)]
+    second += [callback_update(i) for i in range(POLL_BATCH + 3, 2 * POLL_BATCH + 1)]
+    third = [callback_update(i) for i in range(2 * POLL_BATCH + 1, 3 * POLL_BATCH + 1)]
+    poller, dispatcher = run_poller(tmp_path, [first, second, third])
+
+    # Hanya tombol dari antrean lama yang dilewati; semua setelah batas boot diproses
+    assert poller.skipped_stale == 1
+    assert POLL_BATCH not in dispatcher.fed
+    assert poller.backlog == POLL_BATCH
+    assert set(range(POLL_BATCH + 2, 3 * POLL_BATCH + 1)) <= set(dispatcher.fed)
+    assert poller.journal.pending == {}
@@ -0,0 +1,170 @@
+"""
+Microbenchmarks for the CPU hot paths of the reply pipeline, run over the
+real-sized LLM outputs in tools/bench/fixtures.
+
+Run from the repository root:
+
+    python -m tools.bench                       # bandingkan dengan tools/bench/baseline.json
+    python -m tools.bench --update-baseline     # simpan hasil sebagai baseline baru
+    python -m tools.bench --filter html --threshold 0.25
+
+A benchmark regresses when its best time per call is slower than the
+baseline by more than --threshold (and by more than --noise-floor in
+absolute terms); the exit status is then 1. Timings depend on the
+machine, so record the baseline on the machine (or CI runner) that
+compares against it.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import timeit
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+BENCH_DIR = Path(__file__).resolve().parent
+PROJECT_ROOT = BENCH_DIR.parents[1]
+FIXTURES_DIR = BENCH_DIR / "fixtures"
+DEFAULT_BASELINE = BENCH_DIR / "baseline.json"
+
+Benchmark = Tuple[str, Callable[[], object]]
+
+
+def load_fixtures() -> Dict[str, str]:
+    return {path.stem: path.read_text(encoding="utf-8") for path in sorted(FIXTURES_DIR.glob("*.md"))}
+
+
+def build_benchmarks() -> List[Benchmark]:
+    from modules.html_parser import (
+        process_telegram_html, sanitize_html_v2, convert_common_markdown_to_html, convert_markdown_code_to_html,
+    )
+    from modules.utils import split_html_message, encode_image_base64
+    from modules.groq_handler import split_reasoning
+    from modules.translator import Translator
+
+    fixtures = load_fixtures()
+    benchmarks: List[Benchmark] = []
+
+    for name, text in fixtures.items():
+        converted = convert_markdown_code_to_html(convert_common_markdown_to_html(text))
+        rendered = process_telegram_html(text)
+        benchmarks += [
+            (f"process_telegram_html[{name}]", lambda text=text: process_telegram_html(text)),
+            (f"sanitize_html_v2[{name}]", lambda converted=converted: sanitize_html_v2(converted)),
+        ]
+        if len(rendered) > 3000:  # balasan pendek tidak pernah dipotong
+            benchmarks += [
+                (f"split_html_message.private[{name}]", lambda rendered=rendered: split_html_message(rendered, 4096)),
+                (f"split_html_message.business[{name}]",
+                 lambda rendered=rendered: split_html_message(rendered, 3000, chunk_length=2900, split_on_space=True)),
+            ]
+
+    benchmarks += [
+        ("split_reasoning[reasoning]", lambda text=fixtures["reasoning"]: split_reasoning(text)),
+        ("split_reasoning[no_think]", lambda text=fixtures["long_20kb"]: split_reasoning(text)),
+    ]
+
+    translator = Translator(path=str(PROJECT_ROOT / "locales"))
+    benchmarks += [
+        ("translator.get_text[hit]", lambda: translator.get_text("stream_error", "id")),
+        ("translator.get_text[fallback_lang]", lambda: translator.get_text("stream_error", "xx")),
+        ("translator.get_text[missing_key]", lambda: translator.get_text("no_such_key", "en")),
+    ]
+
+    # Ukuran foto Telegram terbesar biasanya 100-400 KB
+    rng = random.Random(0)
+    for size_kb in (100, 400):
+        image = rng.randbytes(size_kb * 1024)
+        benchmarks.append((f"encode_image_base64[{size_kb}kb]", lambda image=image: encode_image_base64(image)))
+    return benchmarks
+
+
+def measure(fn: Callable[[], object], repeat: int, min_time: float) -> Dict[str, float]:
+    timer = timeit.Timer(fn)
+    fn()  # pemanasan: cache regex dan impor malas tidak ikut terukur
+    number = 1
+    while timer.timeit(number) < min_time:
+        number *= 2
+    per_call = [total / number for total in timer.repeat(repeat=repeat, number=number)]
+    return {"min": min(per_call), "median": statistics.median(per_call), "number": number}
+
+
+def format_time(seconds: float) -> str:
+    if seconds < 1e-3:
+        return f"{seconds * 1e6:8.1f} µs"
+    return f"{seconds * 1e3:8.2f} ms"
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]], threshold: float, noise_floor: float) -> List[str]:
+    regressions = []
+    print(f"{'benchmark':<48} {'time':>11} {'baseline':>11} {'change':>8}")
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base:
+            print(f"{name:<48} {format_time(result['min'])} {'-':>11} {'new':>8}")
+            continue
+        change = result["min"] / base["min"] - 1
+        flag = ""
+        # Selisih di bawah noise floor (misalnya pada fungsi sub-mikrodetik) bukan regresi
+        if abs(result["min"] - base["min"]) < noise_floor:
+            pass
+        elif change > threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        elif change < -threshold:
+            flag = "  faster"
+        print(f"{name:<48} {format_time(result['min'])} {format_time(base['min'])} {change * 100:>+7.1f}%{flag}")
+    return regressions
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="CPU hot-path microbenchmarks with a regression gate.")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--update-baseline", action="store_true", help="write the results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=float(os.getenv("BENCH_THRESHOLD", 0.15)),
+                        help="allowed slowdown before failing, as a fraction (default 0.15)")
+    parser.add_argument("--noise-floor", type=float, default=1e-6,
+                        help="absolute difference in seconds below which changes are ignored (default 1 µs)")
+    parser.add_argument("--filter", default="", help="only run benchmarks whose name contains this text")
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("--min-time", type=float, default=0.1, help="minimum seconds per timing run")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    os.chdir(PROJECT_ROOT)
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+    results = {}
+    for name, fn in build_benchmarks():
+        if args.filter in name:
+            results[name] = measure(fn, args.repeat, args.min_time)
+
+    if args.update_baseline:
+        previous = json.loads(args.baseline.read_text()) if args.baseline.exists() else {}
+        benchmarks = {**previous.get("benchmarks", {}), **results}
+        args.baseline.write_text(json.dumps({
+            "recorded_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "machine": f"{platform.system()} {platform.machine()} {platform.processor()}".strip(),
+            "benchmarks": benchmarks,
+        }, indent=2, sort_keys=True) + "\n")
+        print(f"Baseline with {len(results)} result(s) written to {args.baseline}")
+        return
+
+    baseline = json.loads(args.baseline.read_text())["benchmarks"] if args.baseline.exists() else {}
+    regressions = compare(results, baseline, args.threshold, args.noise_floor)
+    if regressions:
+        print(f"\n{len(regressions)} benchmark(s) slower than baseline by more than {args.threshold:.0%}:")
+        for name in regressions:
+            print(f"  {name}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
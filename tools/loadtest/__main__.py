@@ -0,0 +1,317 @@
+"""
+Offline end-to-end load test. Synthetic updates go through the real
+Dispatcher from main.py via feed_update, while Telegram, Groq, SerpApi
+and Supabase are replaced by local stand-ins, so no quota is spent.
+
+Run from the repository root, for example:
+
+    python -m tools.loadtest --scenarios private,inline,web --updates 200 --rate 25
+    python -m tools.loadtest --rate-limit 0.1 --llm-latency 1.5 --json report.json
+    python -m tools.loadtest --storage sqlite   # database SQLite sungguhan, bukan FakeSupabase
+    LOOP_LAG_STRICT=1 python -m tools.loadtest   # gagal jika event loop terblokir
+
+For every scenario the sustained updates per second, p50/p95/p99 reply
+latency (update fed -> last message, edit or inline answer for it) and
+the error rate are reported.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import date
+from pathlib import Path
+from typing import Any, Dict, List
+
+from aiohttp import web
+
+from tools.loadtest.fake_groq import FakeGroq, FakeWeb
+from tools.loadtest.fake_supabase import FakeSupabase
+from tools.loadtest.fake_telegram import FakeTelegramSession
+from tools.loadtest.scenarios import SCENARIOS, Scenario
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+BOT_TOKEN = "123456789:LOADTEST"
+ERROR_TEXT_KEYS = ("stream_error", "no_response", "all_services_busy", "inline_timeout_text", "api_key_not_configured")
+
+
+class ServiceThread(threading.Thread):
+    """Serves the fake HTTP services from their own event loop so they do not share the bot's loop."""
+
+    def __init__(self, apps: Dict[str, web.Application]):
+        super().__init__(name="loadtest-services", daemon=True)
+        self.apps = apps
+        self.urls: Dict[str, str] = {}
+        self._ready = threading.Event()
+        self._loop = None
+        self._runners: List[web.AppRunner] = []
+
+    async def _start(self):
+        for name, app in self.apps.items():
+            runner = web.AppRunner(app, access_log=None)
+            await runner.setup()
+            await web.TCPSite(runner, "127.0.0.1", 0).start()
+            self._runners.append(runner)
+            host, port = runner.addresses[0][:2]
+            self.urls[name] = f"http://{host}:{port}"
+
+    def run(self):
+        self._loop = asyncio.new_event_loop()
+        self._loop.run_until_complete(self._start())
+        self._ready.set()
+        self._loop.run_forever()
+        for runner in self._runners:
+            self._loop.run_until_complete(runner.cleanup())
+        self._loop.close()
+
+    def start_and_wait(self) -> Dict[str, str]:
+        self.start()
+        self._ready.wait()
+        return self.urls
+
+    def stop(self):
+        if self._loop:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+        self.join(timeout=5)
+
+
+def configure_environment(args, urls: Dict[str, str]):
+    """Points every external dependency at the stand-ins; must run before the bot modules are imported."""
+    os.environ.update({
+        "GROQ_API_KEYS": ",".join(f"gsk_loadtest_{n}" for n in range(args.keys)),
+        "GROQ_BASE_URL": urls["groq"],
+        "SERPAPI_API_KEYS": "loadtest",
+        "SERPAPI_BASE_URL": urls["web"],
+        "SUPABASE_URL": urls["supabase"],
+        "SUPABASE_KEY": "loadtest.fake.key",
+        "NO_PROXY": "127.0.0.1,localhost",
+        "no_proxy": "127.0.0.1,localhost",
+        # Semua layanan tambahan dimatikan agar hanya jalur permintaan yang diukur
+        "REDIS_URL": "",
+        "REQUIRED_CHANNELS": "",
+        "LOG_CHANNEL_ID": "",
+        "METRICS_PORT": "0",
+        "DAILY_CHAT_LIMIT": str(10 ** 9),
+        "STORAGE_BACKEND": args.storage,
+    })
+    if args.storage == "sqlite":
+        os.environ["SQLITE_PATH"] = str(Path(tempfile.mkdtemp(prefix="loadtest-")) / "bot.db")
+    os.environ.setdefault("RETENTION_DAYS", "0")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")  # log per update hanya menenggelamkan laporan
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class LoadTest:
+    def __init__(self, args, fake_db: FakeSupabase):
+        self.args = args
+        self.fake_db = fake_db
+        self.rng = random.Random(args.seed)
+        self.next_update_id = 1
+
+        # Modul bot baru diimpor setelah lingkungan diarahkan ke layanan tiruan
+        import main as bot_main
+        from aiogram import Bot
+        from aiogram.client.default import DefaultBotProperties
+        from aiogram.enums import ParseMode
+        from modules.send_scheduler import send_scheduler
+        from modules.supabase_handler import DEFAULT_MODEL
+        from modules.storage import init_storage
+        from modules.translator import translator_instance
+        from modules.loop_monitor import loop_monitor
+        from modules.log_pipeline import log_pipeline
+
+        self.log_pipeline = log_pipeline
+        self.log_pipeline.start()
+        self.session = FakeTelegramSession(latency=args.telegram_latency)
+        self.bot = Bot(token=BOT_TOKEN, session=self.session, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+        self.bot.session.middleware(send_scheduler)
+        self.dp = bot_main.create_dispatcher()
+        self.supabase = init_storage()
+        self.default_model = DEFAULT_MODEL
+        self.loop_monitor = loop_monitor
+        self.error_texts = {
+            translator_instance.get_text(key, lang).strip()
+            for key in ERROR_TEXT_KEYS
+            for lang in translator_instance.translations
+        }
+
+    def _update_id(self) -> int:
+        update_id = self.next_update_id
+        self.next_update_id += 1
+        return update_id
+
+    async def _feed(self, raw: Dict[str, Any]):
+        from aiogram.types import Update
+        update = Update.model_validate(raw, context={"bot": self.bot})
+        await self.dp.feed_update(self.bot, update, supabase=self.supabase)
+
+    def _seed_users(self, scenario: Scenario, user_ids: List[int]):
+        today = str(date.today())
+        rows = [
+            {"id": user_id, "username": f"load{user_id}", "language_code": "en", "active_model": self.default_model,
+             "chat_count": 0, "last_chat_date": today, "custom_prompt": None, **scenario.user_row}
+            for user_id in user_ids
+        ]
+        if self.args.storage == "sqlite":
+            self.supabase.upsert_users(rows)
+        else:
+            self.fake_db.seed("users", rows)
+
+    def db_summary(self) -> Dict[str, Any]:
+        if self.args.storage == "sqlite":
+            from modules.metrics import SQLITE_SECONDS
+            mean_ms = {op: f"{mean * 1000:.3f}ms x{count}" for (op,), (count, mean) in sorted(SQLITE_SECONDS.means().items())}
+            return {"db_backend": "sqlite", "db_rows": self.supabase.row_counts(), "db_mean": mean_ms}
+        return {"db_backend": "supabase (fake)", "db_requests": self.fake_db.requests, "db_rows": self.fake_db.row_counts()}
+
+    async def _drain(self, sent: Dict[str, float], baseline_tasks: int):
+        """Waits until every update has a reply and the handlers' background tasks have finished."""
+        deadline = time.perf_counter() + self.args.timeout
+        while time.perf_counter() < deadline:
+            missing = [key for key, at in sent.items() if not any(t >= at for t, _, _ in self.session.replies.get(key, ()))]
+            if not missing and len(asyncio.all_tasks()) <= baseline_tasks:
+                return
+            await asyncio.sleep(0.1)
+
+    async def run_scenario(self, index: int, scenario: Scenario) -> Dict[str, Any]:
+        args = self.args
+        user_ids = [(index + 1) * 10_000_000 + n for n in range(args.updates)]
+        self._seed_users(scenario, user_ids)
+        if scenario.setup:
+            for user_id in user_ids:
+                await self._feed(scenario.setup(self._update_id(), user_id))
+
+        baseline_tasks = len(asyncio.all_tasks())
+        sent: Dict[str, float] = {}
+        tasks = []
+        started = time.perf_counter()
+        for n, user_id in enumerate(user_ids):
+            delay = started + n / args.rate - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            raw = scenario.build(self.rng, self._update_id(), user_id)
+            sent[scenario.reply_key(raw)] = time.perf_counter()
+            tasks.append(asyncio.create_task(self._feed(raw)))  # seperti polling: satu task per update
+
+        outcomes = await asyncio.gather(*tasks, return_exceptions=True)
+        await self._drain(sent, baseline_tasks)
+
+        latencies, errors, finished = [], sum(isinstance(outcome, Exception) for outcome in outcomes), started
+        for key, at in sent.items():
+            replies = [(t, text) for t, _, text in self.session.replies.get(key, ()) if t >= at]
+            if not replies:
+                errors += 1
+                continue
+            last_at, last_text = replies[-1]
+            finished = max(finished, last_at)
+            latencies.append(last_at - at)
+            if any(error and error in last_text for error in self.error_texts):
+                errors += 1
+
+        elapsed = max(finished - started, 1e-9)
+        return {
+            "scenario": scenario.name,
+            "updates": len(sent),
+            "errors": min(errors, len(sent)),
+            "error_rate": min(errors, len(sent)) / len(sent) if sent else 0.0,
+            "updates_per_second": len(latencies) / elapsed,
+            "p50": percentile(latencies, 0.50),
+            "p95": percentile(latencies, 0.95),
+            "p99": percentile(latencies, 0.99),
+        }
+
+    async def run(self, scenario_names: List[str]) -> List[Dict[str, Any]]:
+        await self.dp.emit_startup(bot=self.bot, dispatcher=self.dp, supabase=self.supabase)
+        try:
+            return [await self.run_scenario(index, SCENARIOS[name]) for index, name in enumerate(scenario_names)]
+        finally:
+            # Mode ketat loop_monitor melempar LoopBlockedError di sini
+            await self.dp.emit_shutdown(bot=self.bot, dispatcher=self.dp, supabase=self.supabase)
+            self.db_stats = self.db_summary()  # setelah flush penulis latar belakang, sebelum koneksi ditutup
+            await self.supabase.close()
+
+
+def print_report(results: List[Dict[str, Any]], services: Dict[str, Any]):
+    print()
+    print(f"{'scenario':<10} {'updates':>7} {'errors':>7} {'err%':>6} {'upd/s':>7} {'p50':>7} {'p95':>7} {'p99':>7}")
+    for row in results:
+        print(f"{row['scenario']:<10} {row['updates']:>7} {row['errors']:>7} {row['error_rate'] * 100:>5.1f}% "
+              f"{row['updates_per_second']:>7.2f} {row['p50']:>6.2f}s {row['p95']:>6.2f}s {row['p99']:>6.2f}s")
+    print()
+    for name, value in services.items():
+        print(f"{name}: {value}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Offline end-to-end load test for the bot.")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help=f"comma separated, from: {', '.join(SCENARIOS)}")
+    parser.add_argument("--updates", type=int, default=100, help="updates per scenario")
+    parser.add_argument("--rate", type=float, default=20.0, help="offered updates per second")
+    parser.add_argument("--timeout", type=float, default=120.0, help="seconds to wait for replies after the last update")
+    parser.add_argument("--keys", type=int, default=3, help="fake Groq API keys in rotation")
+    parser.add_argument("--llm-latency", type=float, default=0.8)
+    parser.add_argument("--llm-jitter", type=float, default=0.3)
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="share of LLM requests answered with 429")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After of injected 429s (seconds)")
+    parser.add_argument("--storage", choices=("supabase", "sqlite"), default="supabase",
+                        help="supabase: fake PostgREST over HTTP; sqlite: real embedded database in a temp dir")
+    parser.add_argument("--db-latency", type=float, default=0.01)
+    parser.add_argument("--telegram-latency", type=float, default=0.03)
+    parser.add_argument("--search-latency", type=float, default=0.3)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="also write the report to this file")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    scenario_names = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = [name for name in scenario_names if name not in SCENARIOS]
+    if unknown:
+        sys.exit(f"Unknown scenario(s): {', '.join(unknown)}")
+
+    os.chdir(PROJECT_ROOT)  # models.json dan locales dibaca relatif terhadap root
+    fake_groq = FakeGroq(args.llm_latency, args.llm_jitter, args.rate_limit, args.retry_after, seed=args.seed)
+    fake_web = FakeWeb(latency=args.search_latency, seed=args.seed)
+    fake_db = FakeSupabase(latency=args.db_latency, jitter=args.db_latency / 2, seed=args.seed)
+    services = ServiceThread({"groq": fake_groq.app(), "web": fake_web.app(), "supabase": fake_db.app()})
+    urls = services.start_and_wait()
+    fake_web.base_url = urls["web"]
+    configure_environment(args, urls)
+
+    try:
+        load_test = LoadTest(args, fake_db)
+        results = asyncio.run(load_test.run(scenario_names))
+        load_test.log_pipeline.stop()
+    finally:
+        services.stop()
+
+    summary = {
+        "llm_requests": sum(fake_groq.requests.values()),
+        "llm_429_injected": sum(fake_groq.rate_limited.values()),
+        "searches": fake_web.searches,
+        "pages_scraped": fake_web.pages,
+        **load_test.db_stats,
+        "telegram_calls": dict(load_test.session.calls),
+        "event_loop": {key: value for key, value in load_test.loop_monitor.stats().items() if key != "blocking_sites"},
+        "blocking_sites": load_test.loop_monitor.stats()["blocking_sites"],
+        "logging": load_test.log_pipeline.stats(),
+    }
+    print_report(results, summary)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "scenarios": results, "services": summary}, f, indent=2, default=str)
+
+
+if __name__ == "__main__":
+    main()
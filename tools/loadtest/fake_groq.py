@@ -0,0 +1,141 @@
+"""
+OpenAI-compatible stand-in for the Groq API (point GROQ_BASE_URL at it),
+plus a SerpApi search endpoint and the pages its results link to
+(point SERPAPI_BASE_URL at it) so /web can scrape without the internet.
+"""
+import asyncio
+import random
+import time
+import uuid
+from collections import Counter
+from typing import Optional
+
+from aiohttp import web
+
+REPLY_TEMPLATE = """## Answer
+
+Here is a **synthetic** reply for load testing. It mixes the markdown the
+parser has to handle:
+
+- first point with `inline code`
+- second point with a [link](https://example.com)
+
+```python
+def answer(question):
+    return {echo!r}
+```
+
+> Quoted note number {number}.
+"""
+
+PAGE_TEMPLATE = """<html><head><title>Result {number}</title><style>body {{}}</style></head>
+<body><nav>menu</nav><article><h1>Result {number}</h1>{paragraphs}</article><footer>footer</footer></body></html>"""
+
+
+class FakeGroq:
+    """
+    Answers chat completions after `latency` (± jitter) seconds; a
+    `rate_limit_ratio` share of requests get a 429 with Retry-After so
+    key rotation and backoff are exercised.
+    """
+
+    def __init__(self, latency: float = 0.8, jitter: float = 0.3, rate_limit_ratio: float = 0.0,
+                 retry_after: float = 1.0, reply_repeat: int = 2, seed: Optional[int] = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit_ratio = rate_limit_ratio
+        self.retry_after = retry_after
+        self.reply_repeat = reply_repeat
+        self.random = random.Random(seed)
+
+        # --- Metrik ---
+        self.requests = Counter()
+        self.rate_limited = Counter()
+
+    async def handle_completion(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        model = body.get("model", "unknown")
+        key = request.headers.get("Authorization", "").rsplit(" ", 1)[-1]
+        self.requests[model] += 1
+
+        if self.random.random() < self.rate_limit_ratio:
+            self.rate_limited[key] += 1
+            return web.json_response(
+                {"error": {"message": f"Rate limit reached for model `{model}`", "type": "tokens", "code": "rate_limit_exceeded"}},
+                status=429,
+                headers={"retry-after": str(self.retry_after)},
+            )
+
+        await asyncio.sleep(max(0.0, self.random.gauss(self.latency, self.jitter)))
+        messages = body.get("messages") or [{}]
+        prompt = messages[-1].get("content")
+        echo = prompt if isinstance(prompt, str) else "image question"
+        content = "\n".join(REPLY_TEMPLATE.format(echo=echo[:80], number=n) for n in range(self.reply_repeat))
+        prompt_tokens = sum(len(str(message.get("content", ""))) for message in messages) // 4
+        completion_tokens = len(content) // 4
+        return web.json_response({
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        })
+
+    async def handle_models(self, request: web.Request) -> web.Response:
+        return web.json_response({"object": "list", "data": [
+            {"id": "llama-3.3-70b-versatile", "object": "model", "created": 0, "owned_by": "loadtest"},
+        ]})
+
+    def app(self) -> web.Application:
+        app = web.Application(client_max_size=16 * 1024 * 1024)
+        app.router.add_post("/openai/v1/chat/completions", self.handle_completion)
+        app.router.add_get("/openai/v1/models", self.handle_models)
+        return app
+
+
+class FakeWeb:
+    """SerpApi-shaped search results whose links point back at this server's own pages."""
+
+    def __init__(self, latency: float = 0.3, page_latency: float = 0.2, results: int = 5, seed: Optional[int] = None):
+        self.latency = latency
+        self.page_latency = page_latency
+        self.results = results
+        self.random = random.Random(seed)
+        self.base_url = ""
+        self.searches = 0
+        self.pages = 0
+
+    async def handle_search(self, request: web.Request) -> web.Response:
+        self.searches += 1
+        await asyncio.sleep(self.latency)
+        query = request.query.get("q", "")
+        return web.json_response({
+            "search_metadata": {"status": "Success"},
+            "organic_results": [
+                {
+                    "position": n + 1,
+                    "title": f"{query} - result {n + 1}",
+                    "link": f"{self.base_url}/page/{n + 1}",
+                    "snippet": f"Snippet {n + 1} about {query}",
+                }
+                for n in range(self.results)
+            ],
+        })
+
+    async def handle_page(self, request: web.Request) -> web.Response:
+        self.pages += 1
+        await asyncio.sleep(max(0.0, self.random.gauss(self.page_latency, self.page_latency / 3)))
+        number = request.match_info["number"]
+        paragraphs = "".join(f"<p>Paragraph {n} of page {number}. " + "Lorem ipsum dolor sit amet. " * 20 + "</p>" for n in range(30))
+        return web.Response(text=PAGE_TEMPLATE.format(number=number, paragraphs=paragraphs), content_type="text/html")
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/search", self.handle_search)
+        app.router.add_get("/page/{number}", self.handle_page)
+        return app
@@ -0,0 +1,206 @@
+"""
+In-memory emulator for the subset of PostgREST the bot uses through
+supabase-py: select with eq/neq/gt/gte/lt/lte/is/in filters, order,
+limit, exact counts and single-object responses, plus insert, upsert,
+update and delete.
+"""
+import asyncio
+import itertools
+import random
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from aiohttp import web
+
+PRIMARY_KEYS = {
+    "users": "id",
+    "business_connections": "id",
+    "conversation_summaries": "conversation_key",
+    "messages": "id",
+}
+RESERVED_PARAMS = {"select", "order", "limit", "offset", "on_conflict", "columns"}
+SINGLE_OBJECT = "application/vnd.pgrst.object+json"
+
+
+def _coerce(raw: str, current: Any) -> Any:
+    if raw == "null":
+        return None
+    if isinstance(current, bool):
+        return raw == "true"
+    if isinstance(current, int):
+        try:
+            return int(raw)
+        except ValueError:
+            return raw
+    if isinstance(current, float):
+        try:
+            return float(raw)
+        except ValueError:
+            return raw
+    return raw
+
+
+def _matches(row: Dict[str, Any], column: str, expression: str) -> bool:
+    operator, _, raw = expression.partition(".")
+    value = row.get(column)
+    if operator == "is":
+        return value is None if raw == "null" else value is (raw == "true")
+    if operator == "in":
+        options = [option.strip().strip('"') for option in raw.strip("()").split(",")]
+        return value in [_coerce(option, value) for option in options]
+    if value is None:
+        return False
+    expected = _coerce(raw, value)
+    try:
+        return {
+            "eq": lambda: value == expected,
+            "neq": lambda: value != expected,
+            "gt": lambda: value > expected,
+            "gte": lambda: value >= expected,
+            "lt": lambda: value < expected,
+            "lte": lambda: value <= expected,
+        }[operator]()
+    except (KeyError, TypeError):
+        return False
+
+
+class FakeSupabase:
+    """Tables live in memory; every request waits `latency` (± jitter) like a remote database."""
+
+    def __init__(self, latency: float = 0.01, jitter: float = 0.005, seed: Optional[int] = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.random = random.Random(seed)
+        self.tables: Dict[str, List[Dict[str, Any]]] = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self.requests = 0
+
+    # --- Data uji ---
+    def seed(self, table: str, rows: List[Dict[str, Any]]):
+        with self._lock:
+            for row in rows:
+                self._upsert(table, dict(row), PRIMARY_KEYS.get(table, "id"))
+
+    def row_counts(self) -> Dict[str, int]:
+        with self._lock:
+            return {table: len(rows) for table, rows in self.tables.items()}
+
+    def _with_defaults(self, table: str, row: Dict[str, Any]) -> Dict[str, Any]:
+        if table == "messages":
+            row.setdefault("id", next(self._ids))
+            row.setdefault("created_at", datetime.now(timezone.utc).isoformat())
+        return row
+
+    def _upsert(self, table: str, row: Dict[str, Any], key: str) -> Dict[str, Any]:
+        rows = self.tables.setdefault(table, [])
+        for existing in rows:
+            if key in row and existing.get(key) == row[key]:
+                existing.update(row)
+                return existing
+        row = self._with_defaults(table, row)
+        rows.append(row)
+        return row
+
+    # --- PostgREST ---
+    def _filtered(self, table: str, query) -> List[Dict[str, Any]]:
+        rows = self.tables.get(table, [])
+        for column, expression in query.items():
+            if column in RESERVED_PARAMS:
+                continue
+            rows = [row for row in rows if _matches(row, column, expression)]
+        return rows
+
+    def _shape(self, rows: List[Dict[str, Any]], query) -> List[Dict[str, Any]]:
+        order = query.get("order")
+        if order:
+            column, _, direction = order.partition(".")
+            rows = sorted(rows, key=lambda row: (row.get(column) is None, row.get(column) or ""),
+                          reverse=direction.startswith("desc"))
+        if "offset" in query:
+            rows = rows[int(query["offset"]):]
+        if "limit" in query:
+            rows = rows[:int(query["limit"])]
+        columns = query.get("select", "*")
+        if columns != "*":
+            names = [name.strip() for name in columns.split(",")]
+            rows = [{name: row.get(name) for name in names} for row in rows]
+        return [dict(row) for row in rows]
+
+    def _respond(self, request: web.Request, rows: List[Dict[str, Any]], total: int, status: int = 200) -> web.Response:
+        headers = {"Content-Range": f"0-{max(len(rows) - 1, 0)}/{total if 'count=' in request.headers.get('Prefer', '') else '*'}"}
+        if SINGLE_OBJECT in request.headers.get("Accept", ""):
+            if len(rows) != 1:
+                return web.json_response({
+                    "code": "PGRST116",
+                    "details": f"The result contains {len(rows)} rows",
+                    "hint": None,
+                    "message": "JSON object requested, multiple (or no) rows returned",
+                }, status=406)
+            return web.json_response(rows[0], status=status, headers=headers)
+        return web.json_response(rows, status=status, headers=headers)
+
+    async def handle(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        await asyncio.sleep(max(0.0, self.random.gauss(self.latency, self.jitter)))
+        table = request.match_info["table"]
+        query = request.query
+        body = await request.json() if request.method in ("POST", "PATCH") else None
+
+        with self._lock:
+            if request.method == "GET":
+                matched = self._filtered(table, query)
+                return self._respond(request, self._shape(matched, query), len(matched))
+
+            if request.method == "POST":
+                prefer = request.headers.get("Prefer", "")
+                key = query.get("on_conflict") or PRIMARY_KEYS.get(table, "id")
+                written = []
+                for row in body if isinstance(body, list) else [body]:
+                    if "resolution=merge-duplicates" in prefer:
+                        written.append(dict(self._upsert(table, dict(row), key)))
+                    else:
+                        row = self._with_defaults(table, dict(row))
+                        self.tables.setdefault(table, []).append(row)
+                        written.append(dict(row))
+                return self._respond(request, written, len(written), status=201)
+
+            if request.method == "PATCH":
+                matched = self._filtered(table, query)
+                for row in matched:
+                    row.update(body)
+                return self._respond(request, [dict(row) for row in matched], len(matched))
+
+            if request.method == "DELETE":
+                matched = self._filtered(table, query)
+                doomed = {id(row) for row in matched}
+                self.tables[table] = [row for row in self.tables.get(table, []) if id(row) not in doomed]
+                return self._respond(request, [dict(row) for row in matched], len(matched))
+
+        return web.json_response({"message": f"Unsupported method {request.method}"}, status=405)
+
+    async def handle_rpc(self, request: web.Request) -> web.Response:
+        """Postgres functions from storage.SUPABASE_FUNCTIONS, computed over the in-memory tables."""
+        self.requests += 1
+        await asyncio.sleep(max(0.0, self.random.gauss(self.latency, self.jitter)))
+        function = request.match_info["function"]
+        params = await request.json()
+        if function != "stale_conversations":
+            return web.json_response({"message": f"Unknown function {function}"}, status=404)
+
+        with self._lock:
+            newest: Dict[tuple, str] = {}
+            for row in self.tables.get("messages", []):
+                key = (row.get("user_id"), row.get("business_connection_id"))
+                newest[key] = max(newest.get(key, ""), row.get("created_at") or "")
+        stale = sorted(((created_at, key) for key, created_at in newest.items() if created_at < params["cutoff"]), key=lambda item: item[0])
+        rows = [{"user_id": user_id, "business_connection_id": business_connection_id}
+                for _, (user_id, business_connection_id) in stale[:params["max_conversations"]]]
+        return web.json_response(rows)
+
+    def app(self) -> web.Application:
+        app = web.Application(client_max_size=16 * 1024 * 1024)
+        app.router.add_route("POST", "/rest/v1/rpc/{function}", self.handle_rpc)
+        app.router.add_route("*", "/rest/v1/{table}", self.handle)
+        return app
@@ -0,0 +1,99 @@
+"""
+Bot API session that never leaves the process: every method answers
+after `latency` seconds with a plausible result, and every outgoing
+message, edit or inline answer is recorded with its time so the harness
+can measure reply latency per chat or inline query.
+"""
+import asyncio
+import itertools
+import json
+import time
+from collections import Counter, defaultdict
+from typing import Any, AsyncGenerator, Dict, List, Optional, Tuple
+
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import TelegramMethod
+from aiogram.methods.base import TelegramType
+
+# Isi gambar tidak pernah didekode, cukup byte berukuran wajar dengan penanda JPEG
+FAKE_JPEG = b"\xff\xd8\xff\xe0" + bytes(32 * 1024) + b"\xff\xd9"
+
+MESSAGE_METHODS = {"sendMessage", "sendPhoto", "sendDocument", "editMessageText", "editMessageCaption", "editMessageReplyMarkup"}
+REPLY_METHODS = MESSAGE_METHODS | {"answerInlineQuery"}
+
+
+class FakeTelegramSession(BaseSession):
+    def __init__(self, latency: float = 0.03, bot_username: str = "loadtest_bot"):
+        super().__init__()
+        self.latency = latency
+        self.bot_username = bot_username
+        self._message_ids = itertools.count(1_000_000)
+
+        # --- Rekaman ---
+        self.calls = Counter()
+        self.replies: Dict[str, List[Tuple[float, str, str]]] = defaultdict(list)  # kunci -> (waktu, metode, teks)
+
+    def _bot_user(self, bot: Bot) -> Dict[str, Any]:
+        return {"id": bot.id, "is_bot": True, "first_name": "Load Test", "username": self.bot_username}
+
+    def _message(self, bot: Bot, method: TelegramMethod) -> Dict[str, Any]:
+        chat_id = getattr(method, "chat_id", None) or 0
+        message = {
+            "message_id": getattr(method, "message_id", None) or next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private" if isinstance(chat_id, int) and chat_id > 0 else "supergroup"},
+            "from": self._bot_user(bot),
+        }
+        text = getattr(method, "text", None)
+        if text is not None:
+            message["text"] = text
+        if getattr(method, "business_connection_id", None):
+            message["business_connection_id"] = method.business_connection_id
+        if getattr(method, "document", None) is not None:
+            message["document"] = {"file_id": "doc", "file_unique_id": "doc"}
+            message["caption"] = getattr(method, "caption", None) or ""
+        return message
+
+    def _result(self, bot: Bot, method: TelegramMethod, api_method: str) -> Any:
+        if api_method in MESSAGE_METHODS:
+            if getattr(method, "inline_message_id", None):
+                return True
+            return self._message(bot, method)
+        if api_method == "getMe":
+            return self._bot_user(bot)
+        if api_method == "getFile":
+            return {"file_id": method.file_id, "file_unique_id": method.file_id, "file_size": len(FAKE_JPEG), "file_path": f"photos/{method.file_id}.jpg"}
+        if api_method == "getChatMember":
+            return {"status": "member", "user": {"id": method.user_id, "is_bot": False, "first_name": "Load"}}
+        return True
+
+    def _record(self, method: TelegramMethod, api_method: str):
+        if api_method not in REPLY_METHODS:
+            return
+        if api_method == "answerInlineQuery":
+            key = f"inline:{method.inline_query_id}"
+            text = " ".join(
+                getattr(result.input_message_content, "message_text", "") or "" for result in method.results
+            )
+        else:
+            key = f"chat:{getattr(method, 'chat_id', None)}"
+            text = getattr(method, "text", None) or getattr(method, "caption", None) or ""
+        self.replies[key].append((time.perf_counter(), api_method, text))
+
+    async def make_request(self, bot: Bot, method: TelegramMethod[TelegramType], timeout: Optional[int] = None) -> TelegramType:
+        api_method = method.__api_method__
+        self.calls[api_method] += 1
+        await asyncio.sleep(self.latency)
+        result = self._result(bot, method, api_method)
+        self._record(method, api_method)
+        response = self.check_response(bot=bot, method=method, status_code=200, content=json.dumps({"ok": True, "result": result}))
+        return response.result
+
+    async def stream_content(self, url: str, headers: Optional[Dict[str, Any]] = None, timeout: int = 30,
+                             chunk_size: int = 65536, raise_for_status: bool = True) -> AsyncGenerator[bytes, None]:
+        await asyncio.sleep(self.latency)
+        yield FAKE_JPEG
+
+    async def close(self):
+        pass
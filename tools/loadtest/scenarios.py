@@ -0,0 +1,122 @@
+"""
+Synthetic updates for each traffic type. Every measured update comes
+from its own user (and chat) so replies can be matched to the update
+that caused them and no two updates are merged by the coalescer.
+"""
+import random
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Optional
+
+QUESTIONS = [
+    "What is the capital of Australia and why was it chosen?",
+    "Explain the difference between TCP and UDP in simple terms.",
+    "Write a python function that checks whether a string is a palindrome.",
+    "Solve for x: 3x + 7 = 22, and show the steps.",
+    "Give me three tips to sleep better.",
+    "Summarize the plot of Romeo and Juliet in two sentences.",
+    "How does a hash map handle collisions? Include a short code example.",
+    "Translate 'good morning, how are you?' into Indonesian and Russian.",
+    "What is the integral of x^2 * sin(x)?",
+    "Why is the sky blue?",
+]
+
+Update = Dict[str, Any]
+
+
+def _user(user_id: int) -> Dict[str, Any]:
+    return {"id": user_id, "is_bot": False, "first_name": "Load", "username": f"load{user_id}", "language_code": "en"}
+
+
+def _question(rng: random.Random, update_id: int) -> str:
+    return f"{rng.choice(QUESTIONS)} (#{update_id})"
+
+
+def _message(update_id: int, user_id: int, chat: Dict[str, Any], **fields) -> Update:
+    return {
+        "update_id": update_id,
+        "message": {"message_id": update_id, "date": int(time.time()), "chat": chat, "from": _user(user_id), **fields},
+    }
+
+
+def _private_chat(user_id: int) -> Dict[str, Any]:
+    return {"id": user_id, "type": "private", "first_name": "Load"}
+
+
+def group_chat_id(user_id: int) -> int:
+    return -(1_000_000_000_000 + user_id)
+
+
+def customer_id(owner_id: int) -> int:
+    return owner_id + 500_000_000
+
+
+@dataclass
+class Scenario:
+    name: str
+    build: Callable[[random.Random, int, int], Update]   # (rng, update_id, user_id) -> update
+    reply_key: Callable[[Update], str]
+    setup: Optional[Callable[[int, int], Update]] = None  # update yang dikirim sebelum pengukuran
+    user_row: Dict[str, Any] = field(default_factory=dict)
+
+
+def build_private(rng, update_id, user_id):
+    return _message(update_id, user_id, _private_chat(user_id), text=_question(rng, update_id))
+
+def build_group(rng, update_id, user_id):
+    chat = {"id": group_chat_id(user_id), "type": "supergroup", "title": f"Load group {user_id}"}
+    return _message(update_id, user_id, chat, text=f"/ai {_question(rng, update_id)}")
+
+def build_inline(rng, update_id, user_id):
+    return {
+        "update_id": update_id,
+        "inline_query": {"id": str(update_id), "from": _user(user_id), "query": _question(rng, update_id), "offset": ""},
+    }
+
+def build_web(rng, update_id, user_id):
+    return _message(update_id, user_id, _private_chat(user_id), text=f"/web {_question(rng, update_id)}")
+
+def build_vision(rng, update_id, user_id):
+    photo = [
+        {"file_id": f"photo-{update_id}-{size}", "file_unique_id": f"p{update_id}{size}", "width": size, "height": size, "file_size": size * 40}
+        for size in (90, 320, 1280)
+    ]
+    return _message(update_id, user_id, _private_chat(user_id), photo=photo, caption="What is in this picture?")
+
+def build_business(rng, update_id, user_id):
+    customer = customer_id(user_id)
+    update = _message(update_id, customer, _private_chat(customer), text=_question(rng, update_id),
+                      business_connection_id=f"loadtest-{user_id}")
+    update["business_message"] = update.pop("message")
+    return update
+
+def setup_business(update_id, user_id):
+    return {
+        "update_id": update_id,
+        "business_connection": {
+            "id": f"loadtest-{user_id}",
+            "user": _user(user_id),
+            "user_chat_id": user_id,
+            "date": int(time.time()),
+            "can_reply": True,
+            "is_enabled": True,
+        },
+    }
+
+
+def _chat_key(update: Update) -> str:
+    message = update.get("message") or update.get("business_message")
+    return f"chat:{message['chat']['id']}"
+
+def _inline_key(update: Update) -> str:
+    return f"inline:{update['inline_query']['id']}"
+
+
+SCENARIOS = {
+    "private": Scenario("private", build_private, _chat_key),
+    "group": Scenario("group", build_group, _chat_key),
+    "inline": Scenario("inline", build_inline, _inline_key),
+    "web": Scenario("web", build_web, _chat_key),
+    "vision": Scenario("vision", build_vision, _chat_key, user_row={"active_model": "auto"}),
+    "business": Scenario("business", build_business, _chat_key, setup=setup_business),
+}
@@ -0,0 +1,104 @@
+"""
+Import-time breakdown of `import main`, measured with `python -X importtime`
+in a fresh interpreter per run.
+
+Run from the repository root:
+
+    python -m tools.startup                  # rincian per paket dan modul proyek
+    python -m tools.startup --budget 1.5     # gagal jika impor lebih lambat dari 1,5 detik
+
+Time is attributed to the top-level package that owns each module (self
+time), so a package imported by several others is counted once. The run
+also fails (exit status 1) when a dependency that should load lazily,
+such as PyMuPDF or the groq SDK, is imported by `import main`.
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+
+# Dimuat saat pertama dipakai atau saat pemanasan startup, bukan saat impor
+LAZY_MODULES = ("fitz", "pymupdf", "groq", "requests", "serpapi")
+
+LINE_PATTERN = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$")
+
+
+def measure_once() -> List[Tuple[str, int, float, float]]:
+    """Returns (module, depth, self seconds, cumulative seconds) for every module `import main` loads."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=PROJECT_ROOT, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        sys.exit(f"`import main` failed:\n{result.stderr[-2000:]}")
+    rows = []
+    for line in result.stderr.splitlines():
+        match = LINE_PATTERN.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            rows.append((name, len(indent) // 2, int(self_us) / 1e6, int(cumulative_us) / 1e6))
+    return rows
+
+
+def summarize(rows: List[Tuple[str, int, float, float]]) -> Dict[str, object]:
+    packages: Dict[str, float] = defaultdict(float)
+    project: Dict[str, float] = {}
+    for name, depth, self_seconds, cumulative in rows:
+        packages[name.split(".")[0]] += self_seconds
+        if name.startswith("modules.") or name == "main":
+            project[name] = cumulative
+    return {
+        "total": next((cumulative for name, _, _, cumulative in rows if name == "main"), 0.0),
+        "packages": dict(packages),
+        "project_modules": project,
+        "lazy_violations": sorted({name.split(".")[0] for name, *_ in rows if name.split(".")[0] in LAZY_MODULES}),
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Import-time breakdown of main.py.")
+    parser.add_argument("--repeat", type=int, default=3, help="fresh interpreters to run; the fastest is reported")
+    parser.add_argument("--top", type=int, default=15, help="packages and modules to list")
+    parser.add_argument("--budget", type=float, default=float(os.getenv("STARTUP_IMPORT_BUDGET", 0)),
+                        help="fail when `import main` takes longer than this many seconds (0 disables)")
+    parser.add_argument("--json", help="also write the report to this file")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    runs = [summarize(measure_once()) for _ in range(max(1, args.repeat))]
+    report = min(runs, key=lambda run: run["total"])
+
+    print(f"import main: {report['total']:.3f}s (fastest of {len(runs)})\n")
+    print(f"{'package':<32} {'self':>9} {'share':>6}")
+    for name, seconds in sorted(report["packages"].items(), key=lambda item: item[1], reverse=True)[:args.top]:
+        print(f"{name:<32} {seconds * 1000:>7.1f}ms {seconds / report['total'] * 100:>5.1f}%")
+    print(f"\n{'project module':<32} {'cumulative':>10}")
+    for name, seconds in sorted(report["project_modules"].items(), key=lambda item: item[1], reverse=True)[:args.top]:
+        print(f"{name:<32} {seconds * 1000:>8.1f}ms")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+    failed = False
+    if report["lazy_violations"]:
+        print(f"\nImported eagerly, should load on first use: {', '.join(report['lazy_violations'])}")
+        failed = True
+    if args.budget and report["total"] > args.budget:
+        print(f"\nImport time {report['total']:.3f}s is over the {args.budget:.3f}s budget")
+        failed = True
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Local load test for the webhook server.
+
+Start the bot with BOT_MODE=webhook, then run for example:
+
+    python tools/webhook_loadtest.py --url http://127.0.0.1:8080/webhook --secret $WEBHOOK_SECRET --updates 5000
+
+Synthetic private-chat text updates are POSTed with bounded concurrency and
+the sustained acknowledged updates per second is reported.
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from aiohttp import ClientSession, TCPConnector
+
+
+def build_update(update_id: int, user_count: int) -> dict:
+    user_id = 100000 + random.randrange(user_count)
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private", "first_name": "Load"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "Load", "username": f"load{user_id}"},
+            "text": f"load test question #{update_id}",
+        },
+    }
+
+
+def percentile(values, fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+async def run(url: str, secret: str, total: int, concurrency: int, user_count: int):
+    headers = {"X-Telegram-Bot-Api-Secret-Token": secret} if secret else {}
+    latencies, statuses = [], {}
+    next_id = iter(range(1, total + 1))
+
+    async with ClientSession(connector=TCPConnector(limit=concurrency)) as session:
+        async def worker():
+            for update_id in next_id:
+                started = time.perf_counter()
+                try:
+                    async with session.post(url, json=build_update(update_id, user_count), headers=headers) as response:
+                        await response.read()
+                        status = response.status
+                except Exception:
+                    status = "error"
+                latencies.append(time.perf_counter() - started)
+                statuses[status] = statuses.get(status, 0) + 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    accepted = statuses.get(200, 0)
+    print(f"Sent {total} updates in {elapsed:.2f}s with concurrency {concurrency}")
+    print(f"Accepted: {accepted} ({accepted / elapsed:.1f} updates/s), statuses: {statuses}")
+    print(
+        f"Ack latency p50={percentile(latencies, 0.50) * 1000:.1f}ms "
+        f"p95={percentile(latencies, 0.95) * 1000:.1f}ms "
+        f"p99={percentile(latencies, 0.99) * 1000:.1f}ms"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="POST synthetic updates to the bot webhook.")
+    parser.add_argument("--url", default="http://127.0.0.1:8080/webhook")
+    parser.add_argument("--secret", default="")
+    parser.add_argument("--updates", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--users", type=int, default=500)
+    args = parser.parse_args()
+    asyncio.run(run(args.url, args.secret, args.updates, args.concurrency, args.users))